@@ -1,30 +1,182 @@
 import asyncio
+import json
 from contextlib import asynccontextmanager
+from typing import Callable, Iterable
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from loguru import logger
 
 from src.config import global_config
+from src.config.routing import Route, RoutingTable, load_routing_table
 from src.ding_talk.ddauto import DDAuto
+from src.utils.capture import CallbackRecorder
+from src.utils.deduplication import DEDUP_STORE, NEAR_DUPLICATES
+from src.utils.fast_filter import json_loads, prefilter_event, prefilter_stats
 from src.utils.file_cleaner import FileCleaner
+from src.utils.idempotency import RecentKeySet
+from src.utils.journal import MessageJournal
 from src.utils.logger import setup_logger
+from src.utils.url_canonical import RESOLVER
 from src.utils.video_manager import video_manager
-from src.wechat.msg_handler import async_process_message
+from src.utils.work_queue import WorkQueue
+from src.wechat.message import NormalizedMessage, normalize_message
+from src.wechat.msg_handler import (
+    DECISION_PLAN, IP_CHECK_FLIGHTS, IP_VERDICTS, SCREENSHOT_FLIGHTS, STALE_STATS, VIDEO_FLIGHTS,
+    async_process_message,
+)
+from src.wechat.text_rules import RULE_MEMO, classify_message
 
 
 setup_logger(level=global_config.LOG_LEVEL)
 
 
-def build_dd_sender():
+def build_dd_sender(route: Route):
     """
-    根据配置构建钉钉发送器。
+    根据路由配置构建钉钉发送器，hook 模式返回 None (直接调用 send_to_dd)。
     """
-    if global_config.DINGTALK_SEND_METHOD == "local":
-        target = global_config.DINGTALK_LOCAL_SEND_TARGET
-        return DDAuto(target)
+    if route.send_method == "local":
+        return DDAuto(route.target)
     return None
 
 
+def build_dd_senders(routing: RoutingTable) -> dict:
+    """
+    为路由表中的每个本地发送目标构建一个发送器，多个群聊发往同一目标时共用发送器。
+    """
+    senders = {}
+    for route in routing.routes():
+        if route.send_method == "local" and route.target not in senders:
+            senders[route.target] = build_dd_sender(route)
+    return senders
+
+
+def parse_lanes(spec: str, low_concurrency: int) -> dict:
+    """
+    解析优先级通道权重配置，如 "high:6,normal:3,low:1"。
+    返回 {通道名: (权重, 最大并发数)}，只有 low 通道限制并发。
+    """
+    lanes = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition(":")
+        if not name:
+            continue
+        try:
+            weight = int(weight or 1)
+        except ValueError:
+            logger.warning("无效的通道权重配置: {}，使用默认权重 1", item)
+            weight = 1
+        lanes[name] = (weight, low_concurrency if name == "low" else None)
+    return lanes
+
+
+def build_work_queue(app: FastAPI) -> WorkQueue:
+    """
+    构建回调消息的处理队列，worker 从队列中取出消息交给业务逻辑。
+    队列任务格式为 {"id": 消息日志 id, "msg": NormalizedMessage}。
+    """
+    def complete(job: dict):
+        journal = getattr(app.state, "journal", None)
+        if journal and job.get("id"):
+            journal.complete(job["id"])
+
+    async def handle(job: dict):
+        message = job["msg"]
+        route = app.state.routing.match(message.room)
+        if route is None:
+            logger.warning("消息所在群聊 {} 没有匹配的路由，已跳过", message.room)
+            complete(job)
+            return
+        dd_sender = app.state.dd_senders.get(route.target) if route.send_method == "local" else None
+        try:
+            await async_process_message(message=message, chat=None, dd_sender=dd_sender, hook_target=route.target,
+                                        rule_set=route.rule_set)
+        except asyncio.CancelledError:
+            # 关闭时被取消的消息保留在日志中，下次启动重放
+            raise
+        except Exception:
+            complete(job)
+            raise
+        complete(job)
+
+    return WorkQueue(
+        handler=handle,
+        workers=global_config.WORK_QUEUE_WORKERS,
+        max_size=global_config.WORK_QUEUE_MAX_SIZE,
+        policy=global_config.WORK_QUEUE_OVERFLOW_POLICY,
+        spill_dir=global_config.WORK_QUEUE_SPILL_DIR,
+        name="recvMsg",
+        on_drop=complete,
+        encode=lambda job: {"id": job["id"], "msg": job["msg"].to_dict()},
+        decode=lambda data: {"id": data["id"], "msg": NormalizedMessage.from_dict(data["msg"])},
+        lanes=parse_lanes(global_config.WORK_QUEUE_LANE_WEIGHTS, global_config.WORK_QUEUE_LOW_LANE_CONCURRENCY),
+        default_lane="normal",
+    )
+
+
+def classify_for_route(app: FastAPI, message: NormalizedMessage) -> str:
+    """
+    按消息所在群聊路由的规则集判断优先级通道。
+    """
+    route = app.state.routing.match(message.room)
+    return classify_message(message, route.rule_set) if route else "normal"
+
+
+def enqueue_message(app: FastAPI, message: NormalizedMessage) -> str:
+    """
+    将消息写入消息日志并按优先级放入任务队列，返回队列的入队结果。
+    """
+    journal = getattr(app.state, "journal", None)
+    entry_id = journal.append(message.to_dict()) if journal else None
+    status = app.state.work_queue.submit({"id": entry_id, "msg": message}, lane=classify_for_route(app, message))
+    if status == "rejected" and entry_id:
+        journal.complete(entry_id)
+    return status
+
+
+def spill_recovery_filter(pending: list, recovered: set) -> Callable[[dict], bool]:
+    """
+    任务队列接管遗留溢出任务时的过滤条件：溢出的消息同时也在消息日志中，
+    日志中已完成的不再执行；保留的消息 id 记入 recovered，重放日志时跳过，每条消息只执行一次。
+    """
+    pending_ids = {entry_id for entry_id, _ in pending}
+
+    def keep(job: dict) -> bool:
+        entry_id = job.get("id")
+        if not entry_id:
+            return True
+        if entry_id not in pending_ids:
+            return False
+        recovered.add(entry_id)
+        return True
+
+    return keep
+
+
+def replay_journal(app: FastAPI, pending: list, recovered: Iterable[str] = ()):
+    """
+    将上次运行未处理完成的消息重新放入任务队列。
+
+    :param recovered: 已从溢出文件接管的消息 id，不再重复放入
+    """
+    recovered = set(recovered)
+    skipped = 0
+    for entry_id, data in pending:
+        if entry_id in recovered:
+            skipped += 1
+            continue
+        # 兼容旧版本日志中保存的原始回调字典
+        message = NormalizedMessage.from_dict(data) if "msg_type" in data else normalize_message(data)
+        if message is None:
+            app.state.journal.complete(entry_id)
+            continue
+        status = app.state.work_queue.submit({"id": entry_id, "msg": message}, lane=classify_for_route(app, message))
+        if status == "rejected":
+            app.state.journal.complete(entry_id)
+    if pending:
+        logger.info("已重放 {} 条未处理完成的消息 (其中 {} 条已从溢出文件恢复)", len(pending), skipped)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -32,6 +184,12 @@ async def lifespan(app: FastAPI):
     """
     logger.info("starting vxhook fastapi app")
 
+    routing = load_routing_table(global_config.ROUTING_TABLE_FILE)
+    app.state.routing = routing
+
+    # 规则数据文件变化时在后台线程重新编译并替换
+    global_config.RULES.start()
+
     video_manager.init_client()
 
     cleaner = FileCleaner(interval_seconds=60, max_age_seconds=300)
@@ -44,18 +202,64 @@ async def lifespan(app: FastAPI):
     await PlaywrightManager.start(headless=True, check_login=True)
     app.state.playwright_manager = PlaywrightManager
 
-    app.state.dd_sender = build_dd_sender()
+    app.state.dd_senders = build_dd_senders(routing)
+
+    recorder = None
+    if global_config.VXHOOK_CAPTURE_FILE:
+        recorder = CallbackRecorder(global_config.VXHOOK_CAPTURE_FILE)
+        recorder.open()
+        app.state.recorder = recorder
+
+    if global_config.DEDUP_DB_PATH:
+        DEDUP_STORE.open(global_config.DEDUP_DB_PATH, bloom_dir=global_config.DEDUP_BLOOM_DIR)
+        await DEDUP_STORE.start()
+
+    # 消息日志和去重存储都就绪后再启动任务队列，遗留的溢出任务按消息日志过滤后再执行
+    journal = None
+    pending = []
+    recovered = set()
+    spill_filter = None
+    if global_config.JOURNAL_ENABLED:
+        journal = MessageJournal(
+            directory=global_config.JOURNAL_DIR,
+            segment_max_bytes=global_config.JOURNAL_SEGMENT_MAX_BYTES,
+            fsync_interval=global_config.JOURNAL_FSYNC_INTERVAL,
+            fsync_batch=global_config.JOURNAL_FSYNC_BATCH,
+        )
+        pending = journal.open()
+        await journal.start()
+        app.state.journal = journal
+        spill_filter = spill_recovery_filter(pending, recovered)
+
+    work_queue = build_work_queue(app)
+    await work_queue.start(spill_filter=spill_filter)
+    app.state.work_queue = work_queue
+    if journal:
+        replay_journal(app, pending, recovered)
 
     try:
         yield
     finally:
+        await work_queue.stop(timeout=global_config.SHUTDOWN_DRAIN_TIMEOUT)
+        if journal:
+            await journal.close()
+        await DEDUP_STORE.close()
+        if recorder:
+            recorder.close()
         await PlaywrightManager.stop()
         cleaner.stop()
+        global_config.RULES.stop()
         logger.info("vxhook fastapi app stopped")
 
 
 app = FastAPI(lifespan=lifespan)
 
+# vxhook 重试或重复推送的回调，在进入任务队列前按消息 id / 内容哈希去重
+callback_seen = RecentKeySet(
+    window_seconds=global_config.CALLBACK_DEDUP_WINDOW,
+    max_size=global_config.CALLBACK_DEDUP_MAX_SIZE,
+)
+
 
 @app.get("/healthz")
 async def healthz():
@@ -65,68 +269,154 @@ async def healthz():
     return {"code": 1, "msg": "ok"}
 
 
-@app.post("/api/recvMsg")
-@app.put("/api/recvMsg")
-async def receive_message(request: Request):
+@app.get("/api/queue/stats")
+async def queue_stats(request: Request):
     """
-    接收新版 vxhook 推送的 HTTP 消息。
+    查看回调任务队列的深度与排队耗时。
     """
-    try:
-        msg_data = await request.json()
-    except Exception as exc:
-        logger.error("解析 vxhook 回调请求失败: {}", exc)
-        return {"code": -1, "msg": "invalid json"}
+    work_queue = getattr(request.app.state, "work_queue", None)
+    if work_queue is None:
+        return {"code": -1, "msg": "queue not started"}
+    data = work_queue.stats()
+    journal = getattr(request.app.state, "journal", None)
+    if journal:
+        data["journal"] = journal.stats()
+    data["prefilter"] = prefilter_stats()
+    data["callback_dedup"] = callback_seen.stats()
+    data["dedup_store"] = DEDUP_STORE.stats()
+    data["near_dup"] = NEAR_DUPLICATES.stats()
+    data["url_resolver"] = RESOLVER.stats()
+    data["stale_skipped"] = dict(STALE_STATS)
+    data["ip_verdicts"] = IP_VERDICTS.stats()
+    data["single_flight"] = {flights.name: flights.stats() for flights in (SCREENSHOT_FLIGHTS, IP_CHECK_FLIGHTS, VIDEO_FLIGHTS)}
+    data["rule_memo"] = RULE_MEMO.stats()
+    data["decision"] = DECISION_PLAN.stats()
+    return {"code": 0, "msg": "success", "data": data}
+
+
+@app.get("/api/rules")
+async def rules_info():
+    """
+    查看当前生效的关键词规则集版本。
+    """
+    return {"code": 0, "msg": "success", "data": global_config.RULES.stats()}
+
+
+@app.post("/api/rules/reload")
+async def rules_reload(force: bool = False):
+    """
+    立即重新加载有变化的规则集 (force=true 时全部重新加载)，编译在线程中执行，不阻塞回调处理。
+    """
+    changed = await asyncio.to_thread(global_config.RULES.reload, force)
+    return {"code": 0, "msg": "success", "data": {"changed": changed, **global_config.RULES.stats()}}
+
+
+def accept_event(app: FastAPI, msg_data) -> str:
+    """
+    过滤单条 vxhook 回调事件并放入任务队列，返回处理结果:
+    invalid / ignored / empty / filtered / duplicate / queued / dropped_oldest / spilled / rejected
+    """
+    if not isinstance(msg_data, dict):
+        return "invalid"
 
     # 1. 过滤非目标事件 (只处理 2000 和 2004)
     event_type = msg_data.get("event_type")
     if str(event_type) not in ["2000", "2004"] and msg_data.get("msgType") is None:
-        return {"code": 0, "msg": "success"}
-
-    # 2. 获取发送者与房间信息
-    from_user_name = msg_data.get("fromUserName", "")
-    if isinstance(from_user_name, dict):
-        from_user_name = from_user_name.get("String", "")
-    from_user_name = str(from_user_name)
-    
-    room_wxid = from_user_name if from_user_name.endswith("@chatroom") else ""
-
-    # 4. 解析真实内容 (判断引用消息还是普通文本)
-    content_xml = msg_data.get("content_xml") or {}
-    msg_node = content_xml.get("msg") or {}
-    quote_title = msg_node.get("title") or (msg_node.get("appmsg") or {}).get("title")
-    quote_refer_content = (msg_node.get("refermsg") or {}).get("content") or (msg_node.get("appmsg") or {}).get("refermsg", {}).get("content")
-    real_content = msg_data.get("real_content")
-
-    if not quote_title and not real_content:
+        return "ignored"
+
+    # 2. 一次性解析发送者、房间与真实内容 (判断引用消息还是普通文本)
+    message = normalize_message(msg_data)
+    if message is None:
         logger.debug(
             "未提取到有效文本或引用消息, event_type={} msgType={}",
             msg_data.get("event_type"),
             msg_data.get("msgType"),
         )
-        return {"code": 0, "msg": "success"}
-
-    # 5. 组装日志摘要
-    event_desc = str(msg_data.get("event_desc") or msg_data.get("messageType") or "未知事件")
-    sender_profile = msg_data.get("sender_profile", {})
-    nickname = sender_profile.get("nickName", "") if isinstance(sender_profile, dict) else ""
-    if not nickname:
-        nickname = msg_data.get("sender_nick", "")
-    sender = f"{nickname} [{from_user_name}]" if nickname else from_user_name
-
-    if quote_title:
-        summary = str(quote_title).replace("\n", " ")[:80]
-        quoted = str(quote_refer_content or "").replace("\n", " ")[:50]
-        logger.info(f"[收到 {event_desc}] | 发送者: {sender} | 内容: {summary} | 引用: {quoted}")
-    else:
-        summary = str(real_content).replace("\n", " ")[:80]
-        logger.info(f"[收到 {event_desc}] | 发送者: {sender} | 内容: {summary}")
+        return "empty"
+
+    # 3. 输出日志摘要
+    logger.info(message.summary())
+
+    # 4. 按路由表过滤不关注的群聊
+    if app.state.routing.match(message.room) is None:
+        return "filtered"
+
+    # 5. 回调幂等：同一条消息重复推送时只处理一次
+    dedup_key = message.dedup_key()
+    if callback_seen.check_and_add(dedup_key):
+        logger.info("重复的回调消息，已跳过: {}", dedup_key)
+        return "duplicate"
 
-    # 3. 过滤不关注的群聊
-    listen_room = global_config.WECHAT_LISTEN_ROOM_WXID or ""
-    if listen_room and room_wxid != listen_room:
-        return {"code": 0, "msg": "success"}
+    # 6. 将归一化后的消息放入任务队列，由 worker 分发给业务逻辑
+    status = enqueue_message(app, message)
+    if status == "rejected":
+        # 未被接收的消息允许 vxhook 重试
+        callback_seen.discard(dedup_key)
+    return status
 
-    # 6. 将原始字典数据分发给业务逻辑
-    dd_sender = getattr(request.app.state, "dd_sender", None)
-    asyncio.create_task(async_process_message(msg_data=msg_data, chat=None, dd_sender=dd_sender))
+
+def accept_raw_event(app: FastAPI, body: bytes) -> str:
+    """
+    先对原始字节做轻量预过滤，只有可能需要处理的事件才完整解析 JSON。
+    """
+    recorder = getattr(app.state, "recorder", None)
+    if recorder:
+        recorder.record(body)
+    status = prefilter_event(body, app.state.routing.rooms)
+    if status:
+        return status
+    try:
+        msg_data = json_loads(body)
+    except ValueError as exc:
+        logger.error("解析 vxhook 回调请求失败: {}", exc)
+        return "invalid"
+    return accept_event(app, msg_data)
+
+
+@app.post("/api/recvMsg")
+@app.put("/api/recvMsg")
+async def receive_message(request: Request):
+    """
+    接收新版 vxhook 推送的 HTTP 消息。
+    """
+    body = await request.body()
+    status = accept_raw_event(request.app, body)
+    if status == "invalid":
+        return {"code": -1, "msg": "invalid json"}
+    if status == "rejected":
+        return JSONResponse(status_code=503, content={"code": -1, "msg": "queue full"})
     return {"code": 0, "msg": "success"}
+
+
+@app.post("/api/recvMsgBatch")
+async def receive_message_batch(request: Request):
+    """
+    批量接收 vxhook 回调事件 (JSON 数组或 NDJSON)，一次请求处理一批消息。
+    返回每条事件的处理结果，rejected 表示队列已满，上游可稍后重试这些事件。
+    """
+    body = (await request.body()).strip()
+    if body.startswith(b"["):
+        try:
+            events = json_loads(body)
+        except ValueError as exc:
+            logger.error("解析 vxhook 批量回调请求失败: {}", exc)
+            return {"code": -1, "msg": "invalid json"}
+    else:
+        # NDJSON 按行处理，每行先预过滤，避免解析无关事件
+        events = [line for line in body.splitlines() if line.strip()]
+
+    results = []
+    counts = {}
+    for index, item in enumerate(events):
+        if isinstance(item, bytes):
+            status = accept_raw_event(request.app, item)
+        else:
+            recorder = getattr(request.app.state, "recorder", None)
+            if recorder:
+                recorder.record(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+            status = accept_event(request.app, item)
+        results.append({"index": index, "status": status})
+        counts[status] = counts.get(status, 0) + 1
+
+    logger.debug("批量回调处理完成: total={} {}", len(events), counts)
+    return {"code": 0, "msg": "success", "data": {"total": len(events), "counts": counts, "results": results}}
@@ -0,0 +1,120 @@
+import json
+import os
+from typing import Dict, FrozenSet, List, Optional
+
+from loguru import logger
+
+from src.config import global_config
+
+
+SEND_METHODS = ("local", "hook")
+# 匹配所有未单独配置的群聊 (以及私聊) 的默认路由
+DEFAULT_ROOM = "*"
+
+
+class Route:
+    """
+    一个群聊的路由配置：使用哪套关键词规则、通过哪种方式发送到哪个钉钉目标。
+    """
+    __slots__ = ("room", "name", "rule_set", "send_method", "target")
+
+    def __init__(self, room: str, send_method: str, target: str, rule_set: str = "shenyang", name: str = ""):
+        """
+        :param room: 群聊 wxid，"*" 表示默认路由
+        :param send_method: local (本地钉钉模拟发送) / hook (钉钉 Hook 发送)
+        :param target: local 模式为钉钉联系人/群名称，hook 模式为接收消息的目标 ID
+        :param rule_set: 关键词规则集名称
+        :param name: 路由名称，仅用于日志
+        """
+        self.room = room
+        self.send_method = send_method
+        self.target = target
+        self.rule_set = rule_set
+        self.name = name or room
+
+    def __repr__(self) -> str:
+        return f"Route(room={self.room}, name={self.name}, rule_set={self.rule_set}, {self.send_method}->{self.target})"
+
+
+class RoutingTable:
+    """
+    群聊 wxid -> Route 的路由表，按字典查找，未配置的群聊使用默认路由 (如果有)。
+    """
+
+    def __init__(self, routes: List[Route]):
+        self._routes: Dict[str, Route] = {}
+        for route in routes:
+            if route.room in self._routes:
+                logger.warning("路由表中群聊 {} 重复配置，使用后面的配置", route.room)
+            self._routes[route.room] = route
+        self._default = self._routes.pop(DEFAULT_ROOM, None)
+        # 供原始字节预过滤使用；有默认路由时所有群聊都需要处理，不做过滤
+        self.rooms: FrozenSet[bytes] = frozenset() if self._default else frozenset(
+            room.encode("utf-8") for room in self._routes
+        )
+
+    def match(self, room: str) -> Optional[Route]:
+        """
+        返回群聊对应的路由，不需要处理的群聊返回 None。
+        """
+        return self._routes.get(room, self._default)
+
+    def routes(self) -> List[Route]:
+        routes = list(self._routes.values())
+        if self._default:
+            routes.append(self._default)
+        return routes
+
+    def __len__(self) -> int:
+        return len(self._routes) + (1 if self._default else 0)
+
+
+def _parse_route(item: dict) -> Route:
+    send_method = item.get("send_method") or ("local" if global_config.DINGTALK_SEND_METHOD == "local" else "hook")
+    if send_method not in SEND_METHODS:
+        raise ValueError(f"未知的发送方式: {send_method}")
+    rule_set = item.get("rule_set") or "shenyang"
+    if rule_set not in global_config.RULES.names():
+        raise ValueError(f"未知的规则集: {rule_set}")
+    default_target = global_config.DINGTALK_LOCAL_SEND_TARGET if send_method == "local" else global_config.DINGTALK_HOOK_SEND_TARGET
+    target = item.get("target") or default_target
+    if not target:
+        raise ValueError(f"群聊 {item.get('room')} 未配置发送目标")
+    return Route(
+        room=str(item.get("room") or DEFAULT_ROOM),
+        send_method=send_method,
+        target=str(target),
+        rule_set=rule_set,
+        name=str(item.get("name") or ""),
+    )
+
+
+def load_routing_table(path: Optional[str] = None) -> RoutingTable:
+    """
+    加载路由表。
+    配置了路由表文件时从 JSON 文件读取，否则按 WECHAT_LISTEN_ROOM_WXID / DINGTALK_* 配置生成单条路由，
+    与原来单群单目标的行为保持一致。
+
+    文件格式: {"routes": [{"room": "xxx@chatroom", "name": "...", "rule_set": "shenyang",
+                          "send_method": "local", "target": "钉钉联系人名称"}, ...]}
+    """
+    if path:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"路由表文件不存在: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("routes", []) if isinstance(data, dict) else data
+        table = RoutingTable([_parse_route(item) for item in items])
+        logger.info("已加载路由表 {}: {} 条路由", path, len(table))
+    else:
+        send_method = "local" if global_config.DINGTALK_SEND_METHOD == "local" else "hook"
+        target = global_config.DINGTALK_LOCAL_SEND_TARGET if send_method == "local" else global_config.DINGTALK_HOOK_SEND_TARGET
+        table = RoutingTable([Route(
+            room=global_config.WECHAT_LISTEN_ROOM_WXID or DEFAULT_ROOM,
+            send_method=send_method,
+            target=target or "",
+        )])
+
+    for route in table.routes():
+        logger.info("路由: {}", route)
+    return table
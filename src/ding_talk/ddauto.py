@@ -24,8 +24,7 @@ except ImportError:
     logger.warning("未安装 uiautomation 库，将仅使用 Win32 API 进行窗口激活")
 
 from src.config import global_config
-from src.utils.commons import timeit, extract_author
-from src.utils.deduplication import mark_url_as_processed, mark_username_as_processed
+from src.utils.commons import timeit
 
 
 
@@ -38,6 +37,10 @@ class DingTalkAutomationException(Exception):
 
 
 class DDAuto:
+    # 所有实例操作的是同一个钉钉窗口：发送锁在实例间共享，并记录窗口当前停留的会话
+    _window_lock = None
+    _active_contact = None
+
     def __init__(self, target_contact: str):
         """
         初始化钉钉窗口，切换目标联系人
@@ -72,22 +75,40 @@ class DDAuto:
         if global_config.DINGTALK_STANDBY == "1":
             logger.info("⚠️ 钉钉处于 Standby 模式，跳过联系人搜索初始化，直接进入发送就绪状态。")
         else:
-            # 点击搜索框（窗口顶部中间，偏移约15px）
-            self._click_search_box()
-            # 输入联系人
-            pyperclip.copy(target_contact)
-            self._paste()
-            time.sleep(2)
-            self._press_enter()
-            logger.info(f"✅ 钉钉已切换至联系人：{target_contact}")
+            self._switch_contact()
 
         # 点击输入框（窗口底部中间偏上70px）
         self._click_input_box()
         
-        # 初始化发送锁
-        self.lock = asyncio.Lock()
+        # 初始化发送锁 (多个发送目标共用同一把锁)
+        if DDAuto._window_lock is None:
+            DDAuto._window_lock = asyncio.Lock()
+        self.lock = DDAuto._window_lock
         logger.info("--- [DDAuto] 初始化完成 ---")
 
+    def _switch_contact(self):
+        """
+        通过搜索框切换到目标联系人
+        """
+        # 点击搜索框（窗口顶部中间，偏移约15px）
+        self._click_search_box()
+        # 输入联系人
+        pyperclip.copy(self.target_contact)
+        self._paste()
+        time.sleep(2)
+        self._press_enter()
+        DDAuto._active_contact = self.target_contact
+        logger.info(f"✅ 钉钉已切换至联系人：{self.target_contact}")
+
+    def _ensure_contact(self):
+        """
+        多个发送目标共用一个钉钉窗口，发送前确认窗口停留在当前实例的联系人上
+        """
+        if global_config.DINGTALK_STANDBY == "1":
+            return
+        if DDAuto._active_contact != self.target_contact:
+            self._switch_contact()
+
     def _activate_window(self):
         """
         激活钉钉窗口，首选 UIA，兜底 Win32
@@ -255,6 +276,7 @@ class DDAuto:
             try:
                 # 激活窗口
                 self._activate_window()
+                self._ensure_contact()
                 self._click_input_box()
                 self._clean_input_box()
 
@@ -281,6 +303,7 @@ class DDAuto:
             
             # 激活窗口
             self._activate_window()
+            self._ensure_contact()
             try:
                 self._click_input_box()
                 self._clean_input_box()
@@ -310,16 +333,6 @@ class DDAuto:
             # 3. 统一发送
             self._press_enter()
             logger.info("✅ 混合消息发送指令已执行")
-
-            # 4. 后续处理（标记URL等）
-            if msg:
-                match_obj = global_config.URL_PATTERN.search(msg)
-                if match_obj:
-                    url = match_obj.group(0)
-                    await mark_url_as_processed(url)
-                    username = extract_author(msg)
-                    await mark_username_as_processed(username)
-                    logger.debug("消息 媒体URL、作者 已缓存")
                 
     @timeit()
     async def send(self, msg: str):
@@ -327,8 +340,8 @@ class DDAuto:
             logger.debug("准备向 '{}' 发送消息: {}", self.target_contact, msg.replace('\n', ' ')[:100])
             # ✅ 每次发送前激活钉钉窗口
             self._activate_window()
+            self._ensure_contact()
 
-            match_obj = global_config.URL_PATTERN.search(msg)
             # 粘贴并发送
             pyperclip.copy(msg)
             # 点击输入框
@@ -344,13 +357,6 @@ class DDAuto:
 
             logger.info("✅ 钉钉消息发送成功")
 
-            if match_obj:
-                url = match_obj.group(0)
-                await mark_url_as_processed(url)
-                username = extract_author(msg)
-                await mark_username_as_processed(username)
-                logger.debug("消息 媒体URL、作者 已缓存")
-
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+class BloomFilter:
+    """
+    固定容量的 Bloom 过滤器，位数组保存在 bytearray 中。
+    """
+    __slots__ = ("capacity", "error_rate", "num_bits", "num_hashes", "count", "bits")
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        # m = -n ln(p) / (ln 2)^2, k = m / n ln 2
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    def add(self, h1: int, h2: int):
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, h1: int, h2: int) -> bool:
+        # 第 i 个位置为 h1 + i * h2 (双重哈希)
+        bits = self.bits
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class _Bucket:
+    """
+    一个时间段内的可扩展 Bloom 过滤器: 当前过滤器写满后追加一个容量翻倍、误判率减半的新过滤器，
+    各过滤器误判率之和不超过 error_rate。
+    """
+    __slots__ = ("bucket_id", "filters", "dirty")
+
+    def __init__(self, bucket_id: int, filters: List[BloomFilter]):
+        self.bucket_id = bucket_id
+        self.filters = filters
+        self.dirty = False
+
+    @classmethod
+    def create(cls, bucket_id: int, capacity: int, error_rate: float) -> "_Bucket":
+        return cls(bucket_id, [BloomFilter(capacity, error_rate / 2)])
+
+    def add(self, h1: int, h2: int):
+        current = self.filters[-1]
+        if current.full:
+            current = BloomFilter(current.capacity * 2, current.error_rate / 2)
+            self.filters.append(current)
+        current.add(h1, h2)
+        self.dirty = True
+
+    def might_contain(self, h1: int, h2: int) -> bool:
+        return any(bloom.might_contain(h1, h2) for bloom in self.filters)
+
+    @property
+    def count(self) -> int:
+        return sum(bloom.count for bloom in self.filters)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+
+class RotatingBloomFilter:
+    """
+    按时间分段轮换的 Bloom 过滤器，记住最近 bucket_seconds * buckets 秒内加入的 key，占用内存很小。
+
+    - 每个时间段一个可扩展的 Bloom 过滤器，新 key 写入当前时间段，超出时间范围的段整段丢弃
+    - 查询时依次检查各时间段：返回 False 表示一定没有加入过；返回 True 表示很可能加入过
+      (总误判率约为 error_rate)
+    - 调用 open 后各时间段保存为目录下的一个文件，save 只写入有变化的段
+    """
+
+    FILE_SUFFIX = ".bloom"
+
+    def __init__(self, bucket_seconds: float = 86400.0, buckets: int = 28, capacity: int = 50000,
+                 error_rate: float = 0.001):
+        """
+        :param bucket_seconds: 每个时间段的长度 (秒)
+        :param buckets: 保留的时间段数量
+        :param capacity: 每个时间段第一个过滤器的容量，写满后自动扩容
+        :param error_rate: 查询全部时间段的总误判率
+        """
+        self.bucket_seconds = bucket_seconds
+        self.buckets = max(1, buckets)
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.directory = ""
+        self._buckets: Dict[int, _Bucket] = {}
+        self._stats = {"adds": 0, "queries": 0, "positives": 0}
+
+    def open(self, directory: str) -> int:
+        """
+        从目录中加载未过期的时间段，返回加载的 key 数量。
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        oldest = self._current_bucket() - self.buckets + 1
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext != self.FILE_SUFFIX or not stem.isdigit():
+                continue
+            bucket_id = int(stem)
+            path = os.path.join(directory, name)
+            if bucket_id < oldest:
+                self._remove_file(path)
+                continue
+            try:
+                self._buckets[bucket_id] = self._load(bucket_id, path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("读取 Bloom 过滤器文件失败，已忽略: {} ({})", path, e)
+        return sum(bucket.count for bucket in self._buckets.values())
+
+    def add(self, key: str, timestamp: Optional[float] = None):
+        """
+        :param timestamp: key 的加入时间 (time.time())，默认为当前时间；用于按原始时间补录 key
+        """
+        h1, h2 = self._hashes(key)
+        current = self._current_bucket()
+        bucket_id = current if timestamp is None else min(current, int(timestamp // self.bucket_seconds))
+        if bucket_id < current - self.buckets + 1:
+            return
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = _Bucket.create(bucket_id, self.capacity, self.error_rate / self.buckets)
+            self._buckets[bucket_id] = bucket
+            self._rotate(current)
+        bucket.add(h1, h2)
+        self._stats["adds"] += 1
+
+    def might_contain(self, key: str, added_before: Optional[float] = None) -> bool:
+        """
+        :param added_before: 只检查在该时间 (time.time()) 之前可能加入过 key 的时间段
+        """
+        self._stats["queries"] += 1
+        h1, h2 = self._hashes(key)
+        oldest = self._current_bucket() - self.buckets + 1
+        # 时间段的起始时间早于 added_before 时，段内才可能有该时间之前加入的 key
+        newest = None if added_before is None else added_before / self.bucket_seconds
+        for bucket_id, bucket in self._buckets.items():
+            if bucket_id < oldest or (newest is not None and bucket_id >= newest):
+                continue
+            if bucket.might_contain(h1, h2):
+                self._stats["positives"] += 1
+                return True
+        return False
+
+    def clear(self):
+        self._buckets.clear()
+
+    def save(self):
+        """
+        把有变化的时间段写入文件 (先写临时文件再替换)。
+        """
+        if not self.directory:
+            return
+        for bucket in list(self._buckets.values()):
+            if not bucket.dirty:
+                continue
+            path = os.path.join(self.directory, f"{bucket.bucket_id}{self.FILE_SUFFIX}")
+            header = {
+                "bucket": bucket.bucket_id,
+                "filters": [{"capacity": bloom.capacity, "error_rate": bloom.error_rate, "count": bloom.count}
+                            for bloom in bucket.filters],
+            }
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for bloom in bucket.filters:
+                    f.write(bloom.bits)
+            os.replace(tmp_path, path)
+            bucket.dirty = False
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "buckets": len(self._buckets),
+            "keys": sum(bucket.count for bucket in self._buckets.values()),
+            "bytes": sum(bucket.size_bytes for bucket in self._buckets.values()),
+        }
+
+    def _current_bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def _rotate(self, current: int):
+        oldest = current - self.buckets + 1
+        for bucket_id in [bucket_id for bucket_id in self._buckets if bucket_id < oldest]:
+            del self._buckets[bucket_id]
+            if self.directory:
+                self._remove_file(os.path.join(self.directory, f"{bucket_id}{self.FILE_SUFFIX}"))
+
+    @staticmethod
+    def _hashes(key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        # h2 取奇数，避免各位置重合
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    @staticmethod
+    def _load(bucket_id: int, path: str) -> _Bucket:
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            filters = []
+            for item in header["filters"]:
+                bloom = BloomFilter(item["capacity"], item["error_rate"], count=item["count"])
+                bits = f.read(len(bloom.bits))
+                if len(bits) != len(bloom.bits):
+                    raise ValueError("文件不完整")
+                bloom.bits = bytearray(bits)
+                filters.append(bloom)
+        if not filters:
+            raise ValueError("没有过滤器")
+        return _Bucket(bucket_id, filters)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("删除 Bloom 过滤器文件失败: {} ({})", path, e)
@@ -0,0 +1,39 @@
+import json
+import os
+import time
+from typing import Optional
+
+from loguru import logger
+
+
+class CallbackRecorder:
+    """
+    将收到的原始回调请求体按 JSONL 追加写入文件，供压测工具 (tools/loadtest.py) 回放。
+    每行格式: {"ts": 接收时间戳, "body": 原始请求体文本}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._count = 0
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        logger.info("回调录制已开启，写入文件: {}", self.path)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+            logger.info("回调录制已关闭，本次共录制 {} 条", self._count)
+
+    def record(self, body: bytes, ts: Optional[float] = None):
+        if not self._file:
+            return
+        line = {"ts": ts if ts is not None else time.time(), "body": body.decode("utf-8", errors="replace")}
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._count += 1
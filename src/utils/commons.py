@@ -1,6 +1,5 @@
 import asyncio
 import os
-import re
 import subprocess
 import time
 import functools
@@ -10,6 +9,8 @@ from loguru import logger
 from curl_cffi.requests import AsyncSession, RequestsError
 import psutil
 
+from src.utils.share_parser import parse_share
+
 def timeit(enabled=True, log_level="DEBUG"):
     """
     高级装饰器：
@@ -70,33 +71,5 @@ def extract_author(msg: str) -> str:
     Returns:
         提取到的作者用户名，如果未找到则返回空字符串。
     """
-    user = None
-    msg = msg.strip()
-
-    # 优先检查消息中是否包含平台的关键词
-    if 'xhslink.com' in msg or '小红书' in msg:
-        # 小红书格式: 查找“发布了一篇...”前面的非空字符串
-        # 例子: "... 38 小红薯663296B1发布了一篇..." -> 提取 "小红薯663296B1"
-        match = re.search(r'(\S+)\s*发布了一篇小红书笔记', msg)
-        if match:
-            user = match.group(1)
-
-    elif 'douyin.com' in msg or '抖音' in msg:
-        # 抖音格式 1: 查找 "看看【xxx的yyy作品】"
-        match = re.search(r'看看【(.+?)的(?:图文|视频)?作品】', msg)
-        if match:
-            user = match.group(1)
-        else:
-            # 抖音格式 2: 查找 "作者: xxx"
-            match = re.search(r'作者\s*:\s*(.+)', msg)
-            if match:
-                user = match.group(1)
-
-    elif 'weibo' in msg:
-        # 微博逻辑保持不变
-        match = re.search(r'作者：([^\s]+)', msg)
-        if match:
-            user = match.group(1)
-
-    # 返回提取到的用户名，并去除可能存在的前后空白
-    return user.strip() if user else ''
\ No newline at end of file
+    # 由统一的分享文本解析器提取，解析结果按文本缓存
+    return parse_share(msg).author
\ No newline at end of file
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from src.utils.bloom_filter import RotatingBloomFilter
+
+
+class DedupStore:
+    """
+    带过期时间的持久化去重存储 (SQLite WAL)，进程重启后已发送的 URL / 作者不会再次转发。
+
+    - 每类 key (url / username) 有各自的过期时间，过期后视为未处理
+    - 内存前置缓存 (LRU) 保存最近访问的 key，命中时不查询数据库；未命中时按主键查一次数据库
+    - 只有 mark 会落盘，claim 只在内存中占用 (进程崩溃后未发送完成的消息重放时仍可再次处理)
+    - 写入先进入待写缓冲，由后台任务按时间间隔/条数批量提交，过期记录定期清理
+    - 可以为某类 key 配置按时间轮换的 Bloom 过滤器，记住远超过期时间 (如数周) 内标记过的 key:
+      过期时间内以前置缓存、待写记录和数据库的精确记录为准；精确记录中没有时，只有在过期时间之前
+      的时间段中包含该 key 才视为已处理 (有 error_rate 的误判率)，过期时间内的误判不会挡住新消息
+    - 未调用 open 时只使用内存缓存 (压测、离线评估等场景)
+
+    所有方法都在事件循环线程中调用，均为同步的短操作，无需加锁。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Dict[str, float],
+        front_cache_size: int = 8192,
+        flush_interval: float = 1.0,
+        flush_batch: int = 256,
+        purge_interval: float = 600.0,
+        blooms: Optional[Dict[str, RotatingBloomFilter]] = None,
+        bloom_save_interval: float = 60.0,
+    ):
+        """
+        :param ttl_seconds: 每类 key 的过期时间 (秒)，如 {"url": 259200, "username": 21600}
+        :param front_cache_size: 内存前置缓存的最大条目数 (所有类别合计)
+        :param flush_interval: 批量提交的时间间隔 (秒)
+        :param flush_batch: 待写记录达到该条数时提前提交
+        :param purge_interval: 清理数据库中过期记录的间隔 (秒)
+        :param blooms: 每类 key 的长期 Bloom 过滤器，如 {"url": RotatingBloomFilter(...)}
+        :param bloom_save_interval: Bloom 过滤器写入文件的间隔 (秒)
+        """
+        self.ttl_seconds = dict(ttl_seconds)
+        self.front_cache_size = max(1, front_cache_size)
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.purge_interval = purge_interval
+        self.blooms = dict(blooms or {})
+        self.bloom_save_interval = bloom_save_interval
+        self.path = ""
+
+        self._db: Optional[sqlite3.Connection] = None
+        # (类别, key) -> 过期时间 (time.time())
+        self._front: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        # 待写入数据库的记录: (类别, key) -> 过期时间
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+        self._last_bloom_save = 0.0
+        self._stats = {"front_hits": 0, "bloom_hits": 0, "db_hits": 0, "misses": 0, "writes": 0, "flushes": 0, "purged": 0}
+
+    def open(self, path: str, bloom_dir: str = ""):
+        """
+        打开 (必要时创建) 数据库文件。
+
+        :param bloom_dir: Bloom 过滤器文件目录 (每类 key 一个子目录)，为空时 Bloom 过滤器只在内存中
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path)
+        db.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最近提交的少量记录
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS dedup ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS dedup_expires_at ON dedup (expires_at)")
+        db.commit()
+        self._db = db
+        self.path = path
+        self._purge()
+        count = db.execute("SELECT COUNT(*) FROM dedup").fetchone()[0]
+        logger.info("去重存储已打开: {}，有效记录 {} 条", path, count)
+        for kind, bloom in self.blooms.items():
+            loaded = bloom.open(os.path.join(bloom_dir, kind)) if bloom_dir else 0
+            # 文件只定期保存，崩溃前最后一次保存之后写入数据库的记录按原始标记时间补录
+            # (已包含的 key 不重复加入)
+            added = 0
+            ttl = self.ttl_seconds[kind]
+            for key, expires_at in db.execute(
+                    "SELECT key, expires_at FROM dedup WHERE kind = ? AND expires_at > ?", (kind, time.time())):
+                if not bloom.might_contain(key):
+                    bloom.add(key, timestamp=expires_at - ttl)
+                    added += 1
+            logger.info("去重 Bloom 过滤器 [{}] 已加载 {} 个 key，从数据库补录 {} 个", kind, loaded, added)
+        self._last_bloom_save = time.monotonic()
+
+    async def start(self):
+        """
+        启动后台批量提交任务。
+        """
+        self._flush_event = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_loop(), name="dedup-flush")
+
+    async def close(self):
+        """
+        停止后台任务，提交剩余记录并关闭数据库。
+        """
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        if self._db:
+            self.flush()
+            self._save_blooms()
+            self._db.close()
+            self._db = None
+            logger.info("去重存储已关闭: {}", self.path)
+
+    def contains(self, kind: str, key: str) -> bool:
+        """
+        key 在过期时间内已被占用或标记过返回 True。
+        """
+        now = time.time()
+        item = (kind, key)
+        expires_at = self._front.get(item)
+        if expires_at is not None:
+            if expires_at > now:
+                self._front.move_to_end(item)
+                self._stats["front_hits"] += 1
+                return True
+            del self._front[item]
+            expires_at = None
+            if kind not in self.blooms:
+                # 所有写入都会经过前置缓存，这里已过期说明数据库中的记录也已过期
+                self._stats["misses"] += 1
+                return False
+        else:
+            if item in self._pending:
+                expires_at = self._pending[item]
+            elif self._db is not None:
+                row = self._db.execute("SELECT expires_at FROM dedup WHERE kind = ? AND key = ?", item).fetchone()
+                expires_at = row[0] if row else None
+            if expires_at is not None and expires_at > now:
+                self._remember(item, expires_at)
+                self._stats["db_hits"] += 1
+                return True
+
+        bloom = self.blooms.get(kind)
+        # 过期时间内的 key 以精确记录为准，Bloom 过滤器只回答更早标记过的 key
+        if bloom is not None and bloom.might_contain(key, added_before=now - self.ttl_seconds[kind]):
+            self._stats["bloom_hits"] += 1
+            return True
+        self._stats["misses"] += 1
+        return False
+
+    def claim(self, kind: str, key: str) -> bool:
+        """
+        原子地检查并占用 key (只在内存中)，返回 True 表示本次占用成功。
+        """
+        if self.contains(kind, key):
+            return False
+        self._remember((kind, key), time.time() + self.ttl_seconds[kind])
+        return True
+
+    def mark(self, kind: str, key: str):
+        """
+        标记 key 已处理，并写入数据库。
+        """
+        if not key:
+            return
+        item = (kind, key)
+        expires_at = time.time() + self.ttl_seconds[kind]
+        self._remember(item, expires_at)
+        self._write(item, expires_at)
+        bloom = self.blooms.get(kind)
+        if bloom is not None:
+            bloom.add(key)
+
+    def release(self, kind: str, key: str):
+        """
+        释放占用但最终未发送的 key。
+        """
+        item = (kind, key)
+        self._front.pop(item, None)
+        self._pending.pop(item, None)
+
+    def clear(self):
+        """
+        清空内存缓存、待写记录和 Bloom 过滤器 (不影响文件)，用于压测等场景重置状态。
+        """
+        self._front.clear()
+        self._pending.clear()
+        for bloom in self.blooms.values():
+            bloom.clear()
+
+    def flush(self):
+        """
+        把待写记录在一个事务中提交到数据库。
+        """
+        if not self._pending or self._db is None:
+            return
+        pending, self._pending = self._pending, {}
+        upserts = [(kind, key, expires_at) for (kind, key), expires_at in pending.items()]
+        try:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO dedup (kind, key, expires_at) VALUES (?, ?, ?)", upserts)
+        except sqlite3.Error:
+            # 提交失败时放回待写缓冲，下次重试 (期间的新写入优先)
+            for item, expires_at in pending.items():
+                self._pending.setdefault(item, expires_at)
+            raise
+        self._stats["flushes"] += 1
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data["front_size"] = len(self._front)
+        data["pending"] = len(self._pending)
+        data["persistent"] = self._db is not None
+        if self.blooms:
+            data["bloom"] = {kind: bloom.stats() for kind, bloom in self.blooms.items()}
+        return data
+
+    def _remember(self, item: Tuple[str, str], expires_at: float):
+        self._front[item] = expires_at
+        self._front.move_to_end(item)
+        if len(self._front) > self.front_cache_size:
+            self._front.popitem(last=False)
+
+    def _write(self, item: Tuple[str, str], expires_at: float):
+        if self._db is None:
+            return
+        self._pending[item] = expires_at
+        self._stats["writes"] += 1
+        if len(self._pending) >= self.flush_batch and self._flush_event:
+            self._flush_event.set()
+
+    def _save_blooms(self):
+        self._last_bloom_save = time.monotonic()
+        for kind, bloom in self.blooms.items():
+            try:
+                bloom.save()
+            except OSError as e:
+                logger.error("去重 Bloom 过滤器 [{}] 保存失败: {}", kind, e)
+
+    def _purge(self):
+        self._last_purge = time.monotonic()
+        with self._db:
+            purged = self._db.execute("DELETE FROM dedup WHERE expires_at <= ?", (time.time(),)).rowcount
+        if purged:
+            self._stats["purged"] += purged
+            logger.debug("去重存储清理过期记录 {} 条", purged)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._last_purge >= self.purge_interval:
+                    self._purge()
+                if time.monotonic() - self._last_bloom_save >= self.bloom_save_interval:
+                    self._save_blooms()
+            except sqlite3.Error as e:
+                logger.error("去重存储写入失败: {}", e)
@@ -1,22 +1,38 @@
+from typing import Optional, Tuple
+
 from loguru import logger
-import asyncio  # 1. 导入 asyncio
-from cachetools import LRUCache
+
+from src.config import global_config
+from src.utils.bloom_filter import RotatingBloomFilter
+from src.utils.dedup_store import DedupStore
+from src.utils.near_dup import NearDuplicateIndex
+from src.utils.url_canonical import canonical_key
 
 # --- 核心去重工具 ---
-PROCESSED_URLS_CACHE = LRUCache(maxsize=256)
-URL_CACHE_LOCK = asyncio.Lock()  # 2. 创建一个全局的异步锁
+# URL 与作者用户名的去重记录，lifespan 中打开数据库后持久化，重启后仍然有效；未打开时只在内存中去重
+DEDUP_STORE = DedupStore(
+    ttl_seconds={"url": global_config.DEDUP_URL_TTL, "username": global_config.DEDUP_USERNAME_TTL},
+    front_cache_size=global_config.DEDUP_FRONT_CACHE_SIZE,
+    flush_interval=global_config.DEDUP_FLUSH_INTERVAL,
+    flush_batch=global_config.DEDUP_FLUSH_BATCH,
+    # URL 在精确记录过期后，由 Bloom 过滤器继续记住数周
+    blooms={"url": RotatingBloomFilter(
+        bucket_seconds=global_config.DEDUP_BLOOM_BUCKET_SECONDS,
+        buckets=global_config.DEDUP_BLOOM_BUCKETS,
+        capacity=global_config.DEDUP_BLOOM_CAPACITY,
+        error_rate=global_config.DEDUP_BLOOM_ERROR_RATE,
+    )} if global_config.DEDUP_BLOOM_ENABLED else None,
+)
+
+# 存储的操作都是同步的短操作，在事件循环中执行不会被其他协程打断，不再需要异步锁
+# URL 均先转换为规范化的去重 key (同一作品的短链接、不同分享链接得到同一个 key)，也可以直接传入 canonical_key 的结果
+
 
-# 注意：函数现在是异步的 (async def)
 async def is_url_processed(url: str) -> bool:
     """
-    检查给定的URL是否已经被处理过。(线程安全版本)
+    检查给定的URL是否已经被处理过。
     """
-    async with URL_CACHE_LOCK:  # 3. 在访问缓存前获取锁
-        if url in PROCESSED_URLS_CACHE:
-            PROCESSED_URLS_CACHE[url] = True
-            return True
-        return False
-    # 锁在这里会自动释放
+    return DEDUP_STORE.contains("url", await canonical_key(url))
 
 
 async def claim_url_if_not_processed(url: str) -> bool:
@@ -28,23 +44,20 @@ async def claim_url_if_not_processed(url: str) -> bool:
     if not url:
         return True
 
-    async with URL_CACHE_LOCK:
-        if url in PROCESSED_URLS_CACHE:
-            PROCESSED_URLS_CACHE[url] = True
-            return False
-        PROCESSED_URLS_CACHE[url] = True
-        logger.debug("已原子占用URL: {}", url)
-        return True
+    key = await canonical_key(url)
+    if not DEDUP_STORE.claim("url", key):
+        return False
+    logger.debug("已原子占用URL: {} ({})", url, key)
+    return True
+
 
-# 注意：函数现在是异步的 (async def)
 async def mark_url_as_processed(url: str):
     """
-    将一个URL标记为已处理。(线程安全版本)
+    将一个URL标记为已处理。
     """
-    async with URL_CACHE_LOCK:  # 3. 在访问缓存前获取锁
-        PROCESSED_URLS_CACHE[url] = True
-        logger.debug("已将URL标记为已处理: {}", url)
-    # 锁在这里会自动释放
+    key = await canonical_key(url)
+    DEDUP_STORE.mark("url", key)
+    logger.debug("已将URL标记为已处理: {} ({})", url, key)
 
 
 async def release_claimed_url(url: str):
@@ -54,32 +67,47 @@ async def release_claimed_url(url: str):
     if not url:
         return
 
-    async with URL_CACHE_LOCK:
-        if url in PROCESSED_URLS_CACHE:
-            del PROCESSED_URLS_CACHE[url]
-            logger.debug("已释放占用URL: {}", url)
+    DEDUP_STORE.release("url", await canonical_key(url))
+    logger.debug("已释放占用URL: {}", url)
 
 # --- 新增：用户名去重逻辑 ---
-PROCESSED_USERNAMES_CACHE = LRUCache(maxsize=64)  # 您可以为用户名设置不同的大小
-USERNAME_CACHE_LOCK = asyncio.Lock()  # 为用户名缓存创建一把独立的锁
 
 async def is_username_processed(username: str) -> bool:
     """
-    检查给定的用户名是否已经被处理过。(异步安全版本)
+    检查给定的用户名是否已经被处理过。
     """
-    async with USERNAME_CACHE_LOCK:
-        if username in PROCESSED_USERNAMES_CACHE:
-            # 命中缓存，更新其在LRU中的位置
-            PROCESSED_USERNAMES_CACHE[username] = True
-            return True
-        return False
+    return DEDUP_STORE.contains("username", username)
 
 async def mark_username_as_processed(username: str):
     """
-    将一个用户名标记为已处理。(异步安全版本)
+    将一个用户名标记为已处理。
     """
-    async with USERNAME_CACHE_LOCK:
-        PROCESSED_USERNAMES_CACHE[username] = True
-        logger.debug("已将用户名标记为已处理: {}", username)
+    DEDUP_STORE.mark("username", username)
+    logger.debug("已将用户名标记为已处理: {}", username)
 
+# --- 近似重复文本 ---
+NEAR_DUPLICATES = NearDuplicateIndex(
+    threshold=global_config.NEAR_DUP_THRESHOLD,
+    window_seconds=global_config.NEAR_DUP_WINDOW_SECONDS,
+    max_size=global_config.NEAR_DUP_MAX_SIZE,
+)
 
+async def claim_text_if_not_near_duplicate(text: str, label: str = "", group: str = "") -> Tuple[bool, Optional[int]]:
+    """
+    检查清理后的文本是否与已发送的消息近似重复，不重复时占用一条记录。
+    返回 (是否可继续处理, 占用的记录 id)，发送失败或未发送时用 release_claimed_text 释放。
+    """
+    if not global_config.NEAR_DUP_ENABLED:
+        return True, None
+    duplicate_of, entry_id = NEAR_DUPLICATES.claim(text, label=label, group=group)
+    if duplicate_of is not None:
+        logger.info("与已发送的消息近似重复: {}", duplicate_of)
+        return False, None
+    return True, entry_id
+
+async def release_claimed_text(entry_id: Optional[int]):
+    """
+    释放之前占用但最终未发送的近似重复记录。
+    """
+    if entry_id is not None:
+        NEAR_DUPLICATES.release(entry_id)
@@ -0,0 +1,72 @@
+import json
+import re
+from typing import Collection, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 只关注的事件类型 (与 receive_message 中的过滤条件保持一致)
+TARGET_EVENT_TYPES = (b"2000", b"2004")
+
+_EVENT_TYPE_KEY = b'"event_type"'
+_MSG_TYPE_KEY = b'"msgType"'
+_EVENT_TYPE_PATTERN = re.compile(rb'"event_type"\s*:\s*(?:"(-?\d+)"|(-?\d+))\s*[,}]')
+_MSG_TYPE_NULL_PATTERN = re.compile(rb'"msgType"\s*:\s*null\s*[,}]')
+_ROOM_PATTERN = re.compile(rb'"([^"\\]+@chatroom)"')
+
+_STATS = {"checked": 0, "discarded_event": 0, "discarded_room": 0}
+
+
+def json_loads(body: bytes):
+    """
+    解析 JSON 请求体，安装了 orjson 时使用 orjson。
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def prefilter_event(body: bytes, listen_rooms: Collection[bytes] = ()) -> Optional[str]:
+    """
+    在完整解析 JSON 之前，对原始回调字节做轻量扫描。
+
+    返回丢弃原因 (ignored / filtered)，表示该事件一定会被后续逻辑丢弃，无需解析；
+    返回 None 表示无法确定，需要完整解析后再判断。
+    判断不确定时（如 event_type 出现多次、格式不符合预期）一律返回 None，保证不会误丢消息。
+    """
+    _STATS["checked"] += 1
+
+    # 1. 事件类型：event_type 不在关注列表，且没有非空的 msgType
+    event_pos = body.find(_EVENT_TYPE_KEY)
+    single_event = event_pos < 0 or body.find(_EVENT_TYPE_KEY, event_pos + 1) < 0
+    msg_type_count = body.count(_MSG_TYPE_KEY)
+    if single_event and (not msg_type_count or msg_type_count == len(_MSG_TYPE_NULL_PATTERN.findall(body))):
+        if event_pos < 0:
+            _STATS["discarded_event"] += 1
+            return "ignored"
+        match = _EVENT_TYPE_PATTERN.match(body, event_pos)
+        if match:
+            event_type = match.group(1) or match.group(2)
+            if event_type not in TARGET_EVENT_TYPES:
+                _STATS["discarded_event"] += 1
+                return "ignored"
+
+    # 2. 监听群聊：请求体中不包含任何监听群的 wxid，则该消息一定不属于监听群
+    if listen_rooms:
+        if len(listen_rooms) == 1:
+            matched = next(iter(listen_rooms)) in body
+        else:
+            # 多个群时提取请求体中出现的所有群 wxid，逐个在集合中查找
+            matched = any(room in listen_rooms for room in _ROOM_PATTERN.findall(body))
+        if not matched:
+            _STATS["discarded_room"] += 1
+            return "filtered"
+
+    return None
+
+
+def prefilter_stats() -> dict:
+    return dict(_STATS)
@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RecentKeySet:
+    """
+    有界、带时间窗口的已见集合，用于回调幂等去重。
+
+    - 只记住最近 window_seconds 秒内出现过的 key
+    - 超过 max_size 时淘汰最早加入的 key
+    - 所有操作均为均摊 O(1)，仅在事件循环线程中使用，无需加锁
+    """
+
+    def __init__(self, window_seconds: float = 120.0, max_size: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_size = max(1, max_size)
+        self._keys: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def check_and_add(self, key: Hashable) -> bool:
+        """
+        如果 key 在时间窗口内已出现过返回 True；否则记录该 key 并返回 False。
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._keys:
+            self._hits += 1
+            return True
+        self._keys[key] = now
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+        self._misses += 1
+        return False
+
+    def discard(self, key: Hashable):
+        """
+        移除 key，用于消息最终未被接收（如队列已满被拒绝）时允许上游重试。
+        """
+        self._keys.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._keys),
+            "duplicates": self._hits,
+            "unique": self._misses,
+        }
+
+    def _expire(self, now: float):
+        deadline = now - self.window_seconds
+        while self._keys:
+            key, seen_at = next(iter(self._keys.items()))
+            if seen_at >= deadline:
+                break
+            self._keys.popitem(last=False)
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class IpVerdictCache:
+    """
+    浏览器 IP 检查的未命中结果缓存，近期检查过的链接/作者不再重复访问。
+
+    - 提取到 IP 属地但不在关注地区 (no_match)：按链接和作者各记录一条，保留 no_match_ttl 秒
+      (IP 属地是账号的属性，同一作者的其他作品通常相同)
+    - 需要 IP 属地的平台打开了页面但没有提取到 (failed)：只按链接记录，保留较短的 failure_ttl 秒，之后允许重试
+    - 只截图、不需要 IP 属地的平台，以及浏览器访问本身失败 (没有结果) 都不记录
+    - 只记录未命中的结果；记录的是提取到的 IP 属地，调用方按当前规则集的地址列表重新判断，
+      规则热更新或其他规则集关注该地区时不会被旧结论挡住
+    - 超过 max_size 时淘汰最早加入的记录
+
+    只在事件循环线程中使用，无需加锁。
+    """
+
+    def __init__(self, no_match_ttl: float = 21600.0, failure_ttl: float = 300.0, max_size: int = 10000):
+        self.no_match_ttl = no_match_ttl
+        self.failure_ttl = failure_ttl
+        self.max_size = max(1, max_size)
+        # key -> (检查结果, 过期时间)，失败时检查结果为 None
+        self._entries: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "no_match": 0, "failed": 0}
+
+    def lookup(self, url_key: Optional[str], author_key: str = "") -> Tuple[bool, Optional[dict]]:
+        """
+        按链接、作者的顺序查找未过期的记录，返回 (是否命中, 记录的检查结果)。
+        """
+        now = time.monotonic()
+        for key in (f"url:{url_key}" if url_key else "", f"author:{author_key}" if author_key else ""):
+            if not key:
+                continue
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                del self._entries[key]
+                continue
+            self._stats["hits"] += 1
+            return True, entry[0]
+        self._stats["misses"] += 1
+        return False, None
+
+    def record(self, url_key: Optional[str], author_key: str, data: Optional[dict]):
+        """
+        记录一次未命中的检查结果：提取到 IP 属地时按链接和作者记录；需要 IP 属地但没有提取到时只按链接记录为失败。
+        """
+        if not data:
+            return
+        now = time.monotonic()
+        if data.get("true_address"):
+            self._stats["no_match"] += 1
+            verdict = {"true_address": data["true_address"], "platform": data.get("platform")}
+            if url_key:
+                self._put(f"url:{url_key}", verdict, now + self.no_match_ttl)
+            if author_key:
+                self._put(f"author:{author_key}", verdict, now + self.no_match_ttl)
+        elif data.get("requires_ip") and url_key:
+            self._stats["failed"] += 1
+            self._put(f"url:{url_key}", None, now + self.failure_ttl)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._entries)}
+
+    def _put(self, key: str, data: Optional[dict], expires_at: float):
+        self._entries[key] = (data, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
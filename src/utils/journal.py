@@ -0,0 +1,236 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class MessageJournal:
+    """
+    基于分段文件的追加写消息日志，用于进程崩溃/重启后重放未处理完的消息。
+
+    - 每条记录为一行 JSON：{"op": "add", "id", "data"} 或 {"op": "done", "id"}
+    - 写入后立即 flush 到操作系统，fsync 按时间间隔/条数批量执行
+    - 当前段超过 segment_max_bytes 后切换新段；旧段中的消息全部完成后删除，
+      旧段过多时把其中仍未完成的消息搬到当前段后删除（压缩）
+    """
+
+    SEGMENT_SUFFIX = ".log"
+
+    def __init__(
+        self,
+        directory: str = "journal",
+        segment_max_bytes: int = 4 * 1024 * 1024,
+        fsync_interval: float = 0.2,
+        fsync_batch: int = 64,
+        max_sealed_segments: int = 4,
+    ):
+        """
+        :param directory: 日志目录
+        :param segment_max_bytes: 单个段文件的最大字节数
+        :param fsync_interval: 批量 fsync 的时间间隔（秒）
+        :param fsync_batch: 未 fsync 的记录达到该条数时提前 fsync
+        :param max_sealed_segments: 保留的历史段数量上限，超出时触发压缩
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = max(1, fsync_batch)
+        self.max_sealed_segments = max(1, max_sealed_segments)
+
+        self._file = None
+        self._segment_seq = 0
+        self._segment_size = 0
+        self._counter = 0
+        # 未完成的消息: id -> (段序号, data)
+        self._pending: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+        # 每个段中未完成的消息数量
+        self._segment_live: Dict[int, int] = {}
+        self._unsynced = 0
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def open(self) -> List[Tuple[str, Any]]:
+        """
+        读取已有段文件，恢复未完成的消息列表，并打开新的写入段。
+        返回需要重放的 (id, data) 列表，按写入顺序排列。
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for seq in self._list_segments():
+            self._segment_live.setdefault(seq, 0)
+            self._load_segment(seq)
+            self._segment_seq = max(self._segment_seq, seq)
+
+        self._open_segment(self._segment_seq + 1)
+        self._compact()
+
+        if self._pending:
+            logger.info("消息日志中发现 {} 条未处理完成的消息，准备重放", len(self._pending))
+        return [(entry_id, data) for entry_id, (_, data) in self._pending.items()]
+
+    async def start(self):
+        """
+        启动后台批量 fsync 任务。
+        """
+        self._flush_event = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_loop(), name="journal-fsync")
+
+    async def close(self):
+        """
+        停止后台任务，执行最后一次 fsync 并关闭文件。
+        """
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._file = None
+        logger.info("消息日志已关闭，剩余未完成消息 {} 条", len(self._pending))
+
+    def append(self, data: Any) -> str:
+        """
+        追加一条消息记录，返回记录 id。
+        """
+        self._counter += 1
+        entry_id = f"{self._segment_seq}-{self._counter}"
+        self._write({"op": "add", "id": entry_id, "data": data})
+        self._pending[entry_id] = (self._segment_seq, data)
+        self._segment_live[self._segment_seq] = self._segment_live.get(self._segment_seq, 0) + 1
+        return entry_id
+
+    def complete(self, entry_id: str):
+        """
+        标记一条消息已处理完成（成功、失败或被丢弃）。
+        """
+        entry = self._pending.pop(entry_id, None)
+        if entry is None:
+            return
+        self._segment_live[entry[0]] -= 1
+        self._write({"op": "done", "id": entry_id})
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "segments": len(self._segment_live),
+            "current_segment": self._segment_seq,
+            "current_segment_bytes": self._segment_size,
+            "unsynced": self._unsynced,
+        }
+
+    def _write(self, record: dict):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._file.write(line)
+        # flush 到操作系统，进程崩溃也不会丢失；断电保护依赖批量 fsync
+        self._file.flush()
+        self._segment_size += len(line)
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch and self._flush_event:
+            self._flush_event.set()
+        if self._segment_size >= self.segment_max_bytes:
+            self._rotate()
+
+    def _sync(self):
+        if self._file and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.fsync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                self._sync()
+            except OSError as e:
+                logger.error("消息日志 fsync 失败: {}", e)
+
+    def _rotate(self):
+        self._sync()
+        self._file.close()
+        self._open_segment(self._segment_seq + 1)
+        self._compact()
+
+    def _open_segment(self, seq: int):
+        self._segment_seq = seq
+        self._segment_live.setdefault(seq, 0)
+        self._file = open(self._segment_path(seq), "ab")
+        self._segment_size = self._file.tell()
+
+    def _compact(self):
+        """
+        删除已全部完成的旧段；旧段过多时将最旧段中未完成的消息搬到当前段。
+        必须从最旧的段开始按顺序删除，否则新段中的 done 记录丢失后，旧段中的消息会被错误重放。
+        """
+        sealed = sorted(seq for seq in self._segment_live if seq != self._segment_seq)
+        for seq in sealed:
+            if self._segment_live[seq] > 0:
+                if len(self._segment_live) - 1 <= self.max_sealed_segments:
+                    break
+                self._relocate(seq)
+            self._remove_segment(seq)
+
+    def _relocate(self, seq: int):
+        moved = [entry_id for entry_id, (entry_seq, _) in self._pending.items() if entry_seq == seq]
+        for entry_id in moved:
+            _, data = self._pending[entry_id]
+            line = (json.dumps({"op": "add", "id": entry_id, "data": data}, ensure_ascii=False) + "\n").encode("utf-8")
+            self._file.write(line)
+            self._segment_size += len(line)
+            self._pending[entry_id] = (self._segment_seq, data)
+            self._segment_live[self._segment_seq] += 1
+        self._segment_live[seq] = 0
+        # 搬迁后的记录必须先落盘，才能删除旧段
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        logger.debug("消息日志压缩: 段 {} 中 {} 条未完成消息已搬到段 {}", seq, len(moved), self._segment_seq)
+
+    def _remove_segment(self, seq: int):
+        try:
+            os.remove(self._segment_path(seq))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("删除消息日志段 {} 失败: {}", seq, e)
+            return
+        self._segment_live.pop(seq, None)
+
+    def _load_segment(self, seq: int):
+        path = self._segment_path(seq)
+        with open(path, "rb") as f:
+            for raw in f:
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，直接忽略
+                    logger.warning("消息日志段 {} 中存在损坏的记录，已跳过", seq)
+                    continue
+                entry_id = record.get("id")
+                if record.get("op") == "add":
+                    old = self._pending.pop(entry_id, None)
+                    if old is not None:
+                        self._segment_live[old[0]] -= 1
+                    self._pending[entry_id] = (seq, record.get("data"))
+                    self._segment_live[seq] += 1
+                elif record.get("op") == "done":
+                    old = self._pending.pop(entry_id, None)
+                    if old is not None:
+                        self._segment_live[old[0]] -= 1
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == self.SEGMENT_SUFFIX and stem.isdigit():
+                segments.append(int(stem))
+        return sorted(segments)
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:08d}{self.SEGMENT_SUFFIX}")
@@ -0,0 +1,175 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+
+_AT_START = (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING)
+# 这些位置断言在单行内与整条消息中的含义不同
+_AT_UNSAFE = (sre_constants.AT_END, sre_constants.AT_END_STRING,
+              sre_constants.AT_BEGINNING_LINE, sre_constants.AT_END_LINE)
+_NEWLINE = ord("\n")
+_NEWLINE_CATEGORIES = (sre_constants.CATEGORY_SPACE, sre_constants.CATEGORY_NOT_DIGIT,
+                       sre_constants.CATEGORY_NOT_WORD, sre_constants.CATEGORY_LINEBREAK)
+_NOT_NEWLINE_CATEGORIES = (sre_constants.CATEGORY_NOT_SPACE, sre_constants.CATEGORY_DIGIT,
+                           sre_constants.CATEGORY_WORD, sre_constants.CATEGORY_NOT_LINEBREAK)
+
+
+class _LineUnsafe(Exception):
+    """
+    分支可能跨行匹配或依赖行外的上下文，不能按行处理。
+    """
+
+
+def _set_matches_newline(items) -> bool:
+    negate = False
+    found = False
+    for op, arg in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            found |= arg == _NEWLINE
+        elif op is sre_constants.RANGE:
+            found |= arg[0] <= _NEWLINE <= arg[1]
+        elif op is sre_constants.CATEGORY:
+            if arg in _NEWLINE_CATEGORIES:
+                found = True
+            elif arg not in _NOT_NEWLINE_CATEGORIES:
+                raise _LineUnsafe(arg)
+        else:
+            raise _LineUnsafe(op)
+    return found != negate
+
+
+def _analyze(items, dotall: bool, first: bool, runs: List[str], required: bool) -> bool:
+    """
+    检查一段解析后的正则能否按行匹配，同时收集必须出现的字面量片段。
+    返回这一段是否以 ^ 开头。
+    """
+    anchored = False
+    run = ""
+    for position, (op, arg) in enumerate(items):
+        if op is sre_constants.LITERAL:
+            if arg == _NEWLINE:
+                raise _LineUnsafe("newline")
+            run += chr(arg)
+            continue
+        if run and required:
+            runs.append(run)
+        run = ""
+        if op is sre_constants.AT:
+            if arg in _AT_START:
+                if not (first and position == 0):
+                    raise _LineUnsafe("^ not at start")
+                anchored = True
+            elif arg in _AT_UNSAFE:
+                raise _LineUnsafe(arg)
+        elif op is sre_constants.ANY:
+            if dotall:
+                raise _LineUnsafe("dotall")
+        elif op is sre_constants.NOT_LITERAL:
+            if arg != _NEWLINE:
+                raise _LineUnsafe("not literal")
+        elif op is sre_constants.IN:
+            if _set_matches_newline(arg):
+                raise _LineUnsafe("set")
+        elif op is sre_constants.SUBPATTERN:
+            _analyze(arg[-1], dotall, False, runs, required)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) or op.name == "POSSESSIVE_REPEAT":
+            _analyze(arg[2], dotall, False, runs, required and arg[0] > 0)
+        elif op is sre_constants.BRANCH:
+            # 各选项中必须出现的片段不唯一，不作为过滤条件
+            for alternative in arg[1]:
+                _analyze(alternative, dotall, False, [], False)
+        else:
+            # 前后断言、反向引用等会看到行外的内容
+            raise _LineUnsafe(op)
+    if run and required:
+        runs.append(run)
+    return anchored
+
+
+class _Rule:
+    __slots__ = ("source", "anchored", "guard")
+
+    def __init__(self, source: str, anchored: bool, guard: Optional[str]):
+        self.source = source
+        self.anchored = anchored
+        self.guard = guard
+
+
+class LineCleaner:
+    """
+    按行执行的消息清理规则，结果与把全部分支用 | 拼接后对整条消息执行 sub('', text) 完全一致。
+
+    原清理正则未开启 re.M，^ 只匹配整条消息的开头，且任何分支都不会匹配换行符，
+    因此命中不会跨行，可以把消息按 \\n 切分后逐行处理:
+    - 以 ^ 开头的分支只可能在第一行命中，其余行只需要执行不带 ^ 的分支
+    - 每个分支提取一个必须出现的字面量 (如 "局"、"支队") 作为过滤条件，
+      行内不包含过滤条件的分支直接跳过，所有分支都被跳过的行不执行正则
+    - 每行实际执行的分支组合编译后缓存
+
+    有分支可能跨行匹配 (如匹配 \\s、使用 re.S / $ / 前后断言) 时，退回到对整条消息执行原正则。
+    """
+
+    def __init__(self, branches: Sequence[str], flags: int = 0):
+        self.branches = list(branches)
+        self.flags = flags
+        self.pattern = re.compile("|".join(self.branches), flags)
+        self.line_safe = True
+        self.rules: List[_Rule] = []
+        try:
+            self.rules = [self._parse(branch) for branch in self.branches]
+        except _LineUnsafe:
+            self.line_safe = False
+            self.rules = []
+        self._compiled: Dict[Tuple[int, ...], re.Pattern] = {}
+        self._first_line = tuple(range(len(self.rules)))
+        self._other_lines = tuple(i for i, rule in enumerate(self.rules) if not rule.anchored)
+
+    def _parse(self, branch: str) -> _Rule:
+        parsed = sre_parse.parse(branch, self.flags)
+        flags = parsed.state.flags
+        if flags & re.M or parsed.getwidth()[0] == 0:
+            raise _LineUnsafe("flags or empty match")
+        runs: List[str] = []
+        anchored = _analyze(list(parsed), bool(flags & re.S), True, runs, not flags & re.I)
+        guard = max(runs, key=len) if runs else None
+        return _Rule(branch, anchored, guard)
+
+    def _pattern(self, indexes: Tuple[int, ...]) -> re.Pattern:
+        pattern = self._compiled.get(indexes)
+        if pattern is None:
+            pattern = re.compile("|".join(self.rules[i].source for i in indexes), self.flags)
+            self._compiled[indexes] = pattern
+        return pattern
+
+    def _clean_line(self, line: str, candidates: Tuple[int, ...]) -> str:
+        rules = self.rules
+        indexes = tuple(i for i in candidates if rules[i].guard is None or rules[i].guard in line)
+        if not indexes:
+            return line
+        return self._pattern(indexes).sub("", line)
+
+    def clean(self, text: str) -> str:
+        """
+        删除文本中命中清理规则的内容。
+        """
+        if not self.line_safe:
+            return self.pattern.sub("", text)
+        lines = text.split("\n")
+        lines[0] = self._clean_line(lines[0], self._first_line)
+        if self._other_lines:
+            for i in range(1, len(lines)):
+                lines[i] = self._clean_line(lines[i], self._other_lines)
+        return "\n".join(lines)
+
+    def guards(self) -> List[Tuple[str, bool, Optional[str]]]:
+        """
+        返回每个分支的 (正则, 是否以 ^ 开头, 过滤条件)，便于排查规则。
+        """
+        return [(rule.source, rule.anchored, rule.guard) for rule in self.rules]
@@ -0,0 +1,175 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.config import global_config
+
+
+FINGERPRINT_BITS = 64
+# 指纹只取文字和数字，去掉链接、标点、表情和空白
+_NON_WORD = re.compile(r"[\W_]+")
+# 每 8 位指纹展开为 8 个 16 位计数槽，累加后一次得到 64 个位上的计数 (单条文本最多 65535 个片段)
+_LANE_BITS = 16
+_SPREAD = [
+    [sum(((value >> bit) & 1) << (_LANE_BITS * (8 * position + bit)) for bit in range(8)) for value in range(256)]
+    for position in range(8)
+]
+_LANE_MASK = (1 << _LANE_BITS) - 1
+
+
+def simhash(text: str, shingle: int = 3, min_shingles: int = 8) -> Optional[int]:
+    """
+    计算文本的 64 位 SimHash 指纹: 去掉链接和标点后按字符 shingle 切片，相似的文本指纹的汉明距离小。
+    片段少于 min_shingles 时 (文本过短，指纹不可靠) 返回 None。
+    """
+    normalized = _NON_WORD.sub("", global_config.URL_PATTERN.sub("", text)).lower()
+    if len(normalized) - shingle + 1 < min_shingles:
+        return None
+    pieces = {normalized[i:i + shingle] for i in range(len(normalized) - shingle + 1)}
+    lanes = 0
+    spread = _SPREAD
+    for piece in pieces:
+        digest = hashlib.blake2b(piece.encode("utf-8"), digest_size=8).digest()
+        lanes += (spread[0][digest[0]] + spread[1][digest[1]] + spread[2][digest[2]] + spread[3][digest[3]]
+                  + spread[4][digest[4]] + spread[5][digest[5]] + spread[6][digest[6]] + spread[7][digest[7]])
+    half = len(pieces) / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if (lanes >> (_LANE_BITS * bit)) & _LANE_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class _Entry:
+    __slots__ = ("entry_id", "fingerprint", "group", "label", "added_at")
+
+    def __init__(self, entry_id: int, fingerprint: int, group: str, label: str, added_at: float):
+        self.entry_id = entry_id
+        self.fingerprint = fingerprint
+        self.group = group
+        self.label = label
+        self.added_at = added_at
+
+
+class NearDuplicateIndex:
+    """
+    近似重复文本检测：记录时间窗口内已发送消息的 SimHash 指纹，新消息与其中任一指纹足够接近即视为重复。
+
+    - 相似度 = 1 - 汉明距离 / 64，阈值换算为最大汉明距离 k
+    - 指纹按位切成 k + 1 段建立分段索引：距离不超过 k 的两个指纹至少有一段完全相同 (抽屉原理)，
+      查询时只比较至少一段相同的候选，不需要遍历全部记录
+    - 记录按分组 (如命中的车次/站点关键词) 隔离，模板相近但关键词不同的告警不会互相判重
+    - 与 URL 去重一样先占用 (claim)，发送后保留到时间窗口结束，未发送则释放 (release)
+    - 超过时间窗口或数量上限的记录按加入顺序淘汰
+
+    只在事件循环线程中使用，无需加锁。
+    """
+
+    def __init__(self, threshold: float = 0.875, window_seconds: float = 21600.0, max_size: int = 10000):
+        """
+        :param threshold: 相似度阈值 (0~1)，不低于该值视为重复
+        :param window_seconds: 只与该时间窗口 (秒) 内的记录比较
+        :param max_size: 最多保存的记录数
+        """
+        self.max_distance = max(0, min(FINGERPRINT_BITS - 1, int((1 - threshold) * FINGERPRINT_BITS)))
+        self.window_seconds = window_seconds
+        self.max_size = max(1, max_size)
+        bands = self.max_distance + 1
+        # 每段的 (起始位, 位数)
+        self._bands: List[Tuple[int, int]] = []
+        start = 0
+        for band in range(bands):
+            width = FINGERPRINT_BITS // bands + (1 if band < FINGERPRINT_BITS % bands else 0)
+            self._bands.append((start, width))
+            start += width
+        self._index: List[Dict[Tuple[str, int], List[_Entry]]] = [{} for _ in self._bands]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._stats = {"checked": 0, "duplicates": 0, "skipped_short": 0, "candidates": 0}
+
+    def claim(self, text: str, label: str = "", group: str = "") -> Tuple[Optional[str], Optional[int]]:
+        """
+        检查文本是否与窗口内同一分组的记录近似重复，不重复时占用一条记录。
+        返回 (重复记录的标签, 本次占用的记录 id)：重复时第一项不为 None，文本过短无法判断时两项都为 None。
+
+        :param label: 记录的标签 (如链接)，用于日志
+        :param group: 分组，只与同一分组的记录比较
+        """
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            self._stats["skipped_short"] += 1
+            return None, None
+        now = time.monotonic()
+        self._expire(now)
+        self._stats["checked"] += 1
+        match = self._find(fingerprint, group)
+        if match is not None:
+            self._stats["duplicates"] += 1
+            return match.label or "-", None
+        return None, self._add(fingerprint, group, label, now)
+
+    def release(self, entry_id: Optional[int]):
+        """
+        释放占用但最终未发送的记录。
+        """
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            self._unindex(entry)
+
+    def clear(self):
+        self._entries.clear()
+        for band in self._index:
+            band.clear()
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._entries), "max_distance": self.max_distance, "bands": len(self._bands)}
+
+    def _keys(self, fingerprint: int, group: str):
+        for start, width in self._bands:
+            yield group, (fingerprint >> start) & ((1 << width) - 1)
+
+    def _find(self, fingerprint: int, group: str) -> Optional[_Entry]:
+        seen = set()
+        for band, key in zip(self._index, self._keys(fingerprint, group)):
+            for entry in band.get(key, ()):
+                if entry.entry_id in seen:
+                    continue
+                seen.add(entry.entry_id)
+                self._stats["candidates"] += 1
+                if bin(entry.fingerprint ^ fingerprint).count("1") <= self.max_distance:
+                    return entry
+        return None
+
+    def _add(self, fingerprint: int, group: str, label: str, now: float) -> int:
+        self._next_id += 1
+        entry = _Entry(self._next_id, fingerprint, group, label, now)
+        self._entries[entry.entry_id] = entry
+        for band, key in zip(self._index, self._keys(fingerprint, group)):
+            band.setdefault(key, []).append(entry)
+        if len(self._entries) > self.max_size:
+            _, oldest = self._entries.popitem(last=False)
+            self._unindex(oldest)
+        return entry.entry_id
+
+    def _unindex(self, entry: _Entry):
+        for band, key in zip(self._index, self._keys(entry.fingerprint, entry.group)):
+            bucket = band.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(entry)
+            except ValueError:
+                continue
+            if not bucket:
+                del band[key]
+
+    def _expire(self, now: float):
+        deadline = now - self.window_seconds
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.added_at >= deadline:
+                break
+            self._entries.popitem(last=False)
+            self._unindex(entry)
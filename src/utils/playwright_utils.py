@@ -601,7 +601,8 @@ class PlaywrightIpChecker:
                     "screenshot_path": filepath,
                     "url": url,
                     "final_url": final_url,
-                    "platform": platform
+                    "platform": platform,
+                    "requires_ip": requires_ip,
                 }
 
             except Exception as e:
@@ -0,0 +1,143 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class ConditionSpec(NamedTuple):
+    """
+    一种条件的定义。
+
+    cost:    相对代价，同一条规则的条件按代价从低到高执行
+    factory: 规则中的配置值 -> 判断函数 (ctx) -> bool
+    stage:   判断前需要先执行的耗时阶段 (如浏览器访问)，不需要时为 None
+    """
+    cost: int
+    factory: Callable[[Any], Callable[["DecisionContext"], bool]]
+    stage: Optional[str] = None
+
+
+class StageSpec(NamedTuple):
+    """
+    耗时阶段的定义。
+
+    run:  async (ctx) -> 结果，结果保存在 ctx.stage_results 中供条件读取
+    gate: (ctx) -> bool，返回 False 时不执行该阶段 (如消息已超过时效)，依赖它的条件均视为不满足
+    """
+    run: Callable[["DecisionContext"], Awaitable[Any]]
+    gate: Optional[Callable[["DecisionContext"], bool]] = None
+
+
+class DecisionContext:
+    """
+    一次决策的上下文：消息的各项字段，以及已计算的条件结果和阶段结果。
+    同一个条件在多条规则中出现时只计算一次。
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+        self.facts: Dict[Tuple[str, str], bool] = {}
+        self.stage_results: Dict[str, Any] = {}
+        self.stages_gated: List[str] = []
+
+
+class _Condition:
+    __slots__ = ("name", "value", "key", "cost", "stage", "predicate")
+
+    def __init__(self, name: str, value: Any, spec: ConditionSpec):
+        self.name = name
+        self.value = value
+        self.key = (name, repr(value))
+        self.cost = spec.cost
+        self.stage = spec.stage
+        self.predicate = spec.factory(value)
+
+
+class DecisionRule:
+    """
+    编译后的一条规则：条件按代价排序，不需要耗时阶段的条件都在前面。
+    """
+
+    def __init__(self, name: str, action: str, conditions: List[_Condition]):
+        self.name = name
+        self.action = action
+        self.conditions = sorted(conditions, key=lambda cond: (cond.stage is not None, cond.cost))
+
+    def __repr__(self) -> str:
+        return f"DecisionRule(name={self.name}, action={self.action}, when={[cond.name for cond in self.conditions]})"
+
+
+class DecisionPlan:
+    """
+    把声明式的规则列表编译为决策计划。
+
+    规则按列表顺序排优先级，返回第一条所有条件都满足的规则:
+    - 每条规则先执行不需要耗时阶段的条件 (按代价从低到高)，任一条件不满足即跳过该规则
+    - 只有前面的规则都不满足、且当前规则的廉价条件都满足时，才执行浏览器访问等耗时阶段
+    - 条件结果和阶段结果在同一次决策内复用
+
+    规则格式: {"name": "...", "action": "...", "when": {条件名: 配置值, ...}}
+    """
+
+    def __init__(self, rules: Iterable[dict], conditions: Dict[str, ConditionSpec], stages: Dict[str, StageSpec]):
+        self.stages = dict(stages)
+        self.rules: List[DecisionRule] = []
+        for item in rules:
+            compiled = []
+            for name, value in item.get("when", {}).items():
+                spec = conditions.get(name)
+                if spec is None:
+                    raise ValueError(f"规则 {item.get('name')} 使用了未知的条件: {name}")
+                if spec.stage and spec.stage not in self.stages:
+                    raise ValueError(f"条件 {name} 依赖未定义的阶段: {spec.stage}")
+                compiled.append(_Condition(name, value, spec))
+            self.rules.append(DecisionRule(item["name"], item["action"], compiled))
+
+        self._rule_stats = {rule.name: {"evaluated": 0, "matched": 0, "rejected_by": {}} for rule in self.rules}
+        self._condition_stats: Dict[str, int] = {}
+        self._stage_stats = {name: {"runs": 0, "gated": 0} for name in self.stages}
+
+    async def _run_stage(self, name: str, ctx: DecisionContext) -> bool:
+        if name in ctx.stage_results:
+            return True
+        if name in ctx.stages_gated:
+            return False
+        stage = self.stages[name]
+        if stage.gate and not stage.gate(ctx):
+            ctx.stages_gated.append(name)
+            self._stage_stats[name]["gated"] += 1
+            return False
+        self._stage_stats[name]["runs"] += 1
+        ctx.stage_results[name] = await stage.run(ctx)
+        return True
+
+    async def _check(self, cond: _Condition, ctx: DecisionContext) -> bool:
+        result = ctx.facts.get(cond.key)
+        if result is None:
+            if cond.stage and not await self._run_stage(cond.stage, ctx):
+                result = False
+            else:
+                self._condition_stats[cond.name] = self._condition_stats.get(cond.name, 0) + 1
+                result = bool(cond.predicate(ctx))
+            ctx.facts[cond.key] = result
+        return result
+
+    async def decide(self, ctx: DecisionContext) -> Optional[DecisionRule]:
+        """
+        返回命中的规则，都不满足时返回 None。
+        """
+        for rule in self.rules:
+            stats = self._rule_stats[rule.name]
+            stats["evaluated"] += 1
+            for cond in rule.conditions:
+                if not await self._check(cond, ctx):
+                    stats["rejected_by"][cond.name] = stats["rejected_by"].get(cond.name, 0) + 1
+                    break
+            else:
+                stats["matched"] += 1
+                return rule
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "rules": {name: {**stats, "rejected_by": dict(stats["rejected_by"])} for name, stats in self._rule_stats.items()},
+            "conditions": dict(self._condition_stats),
+            "stages": {name: dict(stats) for name, stats in self._stage_stats.items()},
+        }
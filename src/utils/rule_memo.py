@@ -0,0 +1,87 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+
+class RuleMemo:
+    """
+    按文本内容哈希缓存规则计算结果 (关键词判断、清理后的文本、提取的作者等) 的有界 LRU。
+
+    同一条告警常被转发到多个群、反复转发数小时，每次都要重新跑清理正则和关键词扫描；
+    缓存 key 为 (规则集, 规则版本, 计算类型, 文本哈希)，规则热更新后版本变化，旧结果自然失效；
+    第一次遇到更新一代 (generation) 的规则时清掉该规则集的旧条目。热更新前后的消息同时处理时，
+    使用旧规则快照的消息只按版本读写自己的条目，不会回退记录的版本，残留条目由 LRU 淘汰。
+    仅在事件循环线程中使用，无需加锁。
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size: int = 4096):
+        """
+        :param max_size: 最多缓存的结果数量，0 表示不缓存
+        """
+        self.max_size = max(0, max_size)
+        self._items: "OrderedDict[Tuple[str, str, str, bytes], Any]" = OrderedDict()
+        # 规则集 -> 已见过的最新规则 (generation, 版本)
+        self._versions: Dict[str, Tuple[int, str]] = {}
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self.invalidations = 0
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _check_version(self, rules):
+        latest = self._versions.get(rules.name)
+        if latest is not None and rules.generation <= latest[0]:
+            return
+        if latest is not None and latest[1] != rules.version:
+            for key in [key for key in self._items if key[0] == rules.name and key[1] != rules.version]:
+                del self._items[key]
+            self.invalidations += 1
+        self._versions[rules.name] = (rules.generation, rules.version)
+
+    def get_or_compute(self, rules, kind: str, text: str, compute: Callable[[], Any]) -> Any:
+        """
+        返回缓存的结果，未命中时调用 compute() 计算并缓存。
+
+        :param rules: 计算使用的规则集 (RuleSet)
+        :param kind: 计算类型，如 clean / scan / keyword:text
+        :param text: 参与计算的文本
+        """
+        if not self.max_size:
+            return compute()
+        self._check_version(rules)
+        key = (rules.name, rules.version, kind, self.digest(text))
+        value = self._items.get(key, self.MISSING)
+        if value is not self.MISSING:
+            self._items.move_to_end(key)
+            self._hits[kind] = self._hits.get(kind, 0) + 1
+            return value
+        self._misses[kind] = self._misses.get(kind, 0) + 1
+        value = compute()
+        self._items[key] = value
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._items.clear()
+        self._versions.clear()
+
+    def stats(self) -> dict:
+        kinds = {}
+        for kind in sorted(set(self._hits) | set(self._misses)):
+            hits = self._hits.get(kind, 0)
+            misses = self._misses.get(kind, 0)
+            kinds[kind] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4)}
+        hits = sum(self._hits.values())
+        total = hits + sum(self._misses.values())
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "kinds": kinds,
+        }
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.utils.line_cleaner import LineCleaner
+from src.utils.rule_scanner import RuleScanner
+from src.utils.train_matcher import TrainMatcher, load_codes
+
+
+# 一个规则集目录下的数据文件
+RULE_FILES = ("train.txt", "station.txt", "filter.txt", "delete.txt", "address.txt")
+# 站点关键词的上下文排除写法: 关键词 前不是=马 后不是=侧,方位
+_EXCLUDE_BEFORE = "前不是="
+_EXCLUDE_AFTER = "后不是="
+
+
+def _read_lines(path: str) -> List[str]:
+    """
+    读取数据文件中的有效行，忽略空行和 # 开头的注释行。
+    """
+    lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.strip() and not line.lstrip().startswith("#"):
+                lines.append(line)
+    return lines
+
+
+def load_station_keywords(path: str) -> Tuple[List[str], Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]]:
+    """
+    读取站点关键词文件，返回 (关键词列表, 上下文排除规则)。
+    """
+    keywords = []
+    excludes = {}
+    for line in _read_lines(path):
+        word, *options = line.split()
+        not_after: Tuple[str, ...] = ()
+        not_before: Tuple[str, ...] = ()
+        for option in options:
+            if option.startswith(_EXCLUDE_BEFORE):
+                not_after = tuple(filter(None, option[len(_EXCLUDE_BEFORE):].split(",")))
+            elif option.startswith(_EXCLUDE_AFTER):
+                not_before = tuple(filter(None, option[len(_EXCLUDE_AFTER):].split(",")))
+            else:
+                raise ValueError(f"{path}: 无法识别的站点规则 {option!r}")
+        keywords.append(word)
+        if not_after or not_before:
+            excludes[word] = (not_after, not_before)
+    return keywords, excludes
+
+
+def load_cleaner(path: str) -> LineCleaner:
+    """
+    读取消息清理规则，每行一个正则分支，效果等同于按顺序用 | 拼接为一个正则。
+    """
+    branches = [line.strip() for line in _read_lines(path)]
+    for branch in branches:
+        # 逐个编译分支，出错时能定位到具体的行
+        try:
+            re.compile(branch)
+        except re.error as e:
+            raise ValueError(f"{path}: 清理规则 {branch!r} 无效: {e}") from e
+    return LineCleaner(branches)
+
+
+class RuleSet:
+    """
+    一个规则集编译后的全部匹配器，加载后只读，热更新时整体替换。
+    """
+    __slots__ = ("name", "directory", "version", "generation", "loaded_at",
+                 "train_matcher", "scanner", "cleaner", "address_list")
+
+    def __init__(self, name: str, directory: str, version: str, generation: int,
+                 train_matcher: TrainMatcher, scanner: RuleScanner,
+                 cleaner: LineCleaner, address_list: List[str]):
+        self.name = name
+        self.directory = directory
+        self.version = version
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.train_matcher = train_matcher
+        self.scanner = scanner
+        self.cleaner = cleaner
+        self.address_list = address_list
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "trains": len(self.train_matcher),
+            "delete_branches": len(self.cleaner.branches),
+            "delete_line_safe": self.cleaner.line_safe,
+            "address_list": list(self.address_list),
+        }
+
+    def __repr__(self) -> str:
+        return f"RuleSet(name={self.name}, version={self.version}, generation={self.generation})"
+
+
+def load_rule_set(directory: str, url_pattern: re.Pattern, ip_pattern: Optional[re.Pattern] = None,
+                  generation: int = 1) -> RuleSet:
+    """
+    从规则集目录读取数据文件并编译为 RuleSet，版本号为全部数据文件内容的哈希。
+    """
+    digest = hashlib.sha1()
+    for filename in RULE_FILES:
+        with open(os.path.join(directory, filename), "rb") as f:
+            digest.update(filename.encode("utf-8") + b"\0" + f.read() + b"\0")
+
+    train_matcher = TrainMatcher(load_codes(os.path.join(directory, "train.txt")))
+    station_keywords, excludes = load_station_keywords(os.path.join(directory, "station.txt"))
+    filter_keywords = [line.strip() for line in _read_lines(os.path.join(directory, "filter.txt"))]
+    cleaner = load_cleaner(os.path.join(directory, "delete.txt"))
+    address_list = [line.strip() for line in _read_lines(os.path.join(directory, "address.txt"))]
+
+    scanner = RuleScanner(
+        train_matcher=train_matcher,
+        url_pattern=url_pattern,
+        station_keywords=station_keywords,
+        filter_keywords=filter_keywords,
+        excludes=excludes,
+        ip_pattern=ip_pattern,
+    )
+    return RuleSet(
+        name=os.path.basename(os.path.normpath(directory)),
+        directory=directory,
+        version=digest.hexdigest()[:12],
+        generation=generation,
+        train_matcher=train_matcher,
+        scanner=scanner,
+        cleaner=cleaner,
+        address_list=address_list,
+    )
+
+
+class RuleRegistry:
+    """
+    关键词规则注册表：rules 目录下每个子目录是一个规则集。
+
+    后台线程定期检查数据文件的修改时间和大小，有变化时在后台线程中重新编译，
+    编译成功后整体替换规则集字典 (单次赋值，读取方无需加锁)；编译失败时保留旧规则。
+    消息处理时通过 get() 取一次规则集快照，同一条消息始终使用同一版本的规则。
+    """
+
+    def __init__(self, rules_dir: str, url_pattern: re.Pattern, ip_pattern: Optional[re.Pattern] = None,
+                 interval_seconds: int = 5):
+        """
+        :param rules_dir: 规则根目录，每个子目录为一个规则集
+        :param url_pattern: URL 正则
+        :param ip_pattern: IP 检测使用的 URL 正则
+        :param interval_seconds: 检查数据文件变化的间隔 (秒)，0 表示不自动检查
+        """
+        self.rules_dir = rules_dir
+        self.url_pattern = url_pattern
+        self.ip_pattern = ip_pattern
+        self.interval_seconds = interval_seconds
+        self._rule_sets: Dict[str, RuleSet] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self.running = False
+        self.thread = None
+
+    def _rule_set_dirs(self) -> Dict[str, str]:
+        dirs = {}
+        for name in sorted(os.listdir(self.rules_dir)):
+            path = os.path.join(self.rules_dir, name)
+            if os.path.isdir(path) and not name.startswith((".", "_")):
+                dirs[name] = path
+        return dirs
+
+    @staticmethod
+    def _signature(directory: str) -> tuple:
+        """
+        数据文件的 (修改时间, 大小)，用于低成本地判断文件是否变化。
+        """
+        signature = []
+        for filename in RULE_FILES:
+            try:
+                stat = os.stat(os.path.join(directory, filename))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self):
+        """
+        启动时同步加载全部规则集，加载失败直接抛出异常。
+        """
+        with self._reload_lock:
+            rule_sets = {}
+            signatures = {}
+            for name, directory in self._rule_set_dirs().items():
+                signatures[name] = self._signature(directory)
+                rule_sets[name] = load_rule_set(directory, self.url_pattern, self.ip_pattern)
+            if not rule_sets:
+                raise FileNotFoundError(f"规则目录中没有规则集: {self.rules_dir}")
+            self._rule_sets = rule_sets
+            self._signatures = signatures
+        for rule_set in rule_sets.values():
+            logger.info("已加载规则集 {}", rule_set)
+
+    def get(self, name: str = "shenyang") -> RuleSet:
+        return self._rule_sets[name]
+
+    def names(self) -> List[str]:
+        return list(self._rule_sets)
+
+    def reload(self, force: bool = False) -> List[str]:
+        """
+        重新编译数据文件有变化的规则集 (force 时全部重新编译)，返回更新了的规则集名称。
+        编译在调用线程中完成，不影响正在使用旧规则处理的消息。
+        """
+        with self._reload_lock:
+            current = self._rule_sets
+            rule_sets = dict(current)
+            signatures = dict(self._signatures)
+            changed = []
+            for name, directory in self._rule_set_dirs().items():
+                signature = self._signature(directory)
+                if not force and signatures.get(name) == signature:
+                    continue
+                # 即使编译失败也记录签名，避免同一份错误文件被反复编译
+                signatures[name] = signature
+                old = current.get(name)
+                try:
+                    rule_set = load_rule_set(directory, self.url_pattern, self.ip_pattern,
+                                             generation=old.generation + 1 if old else 1)
+                except Exception as e:
+                    self.reload_errors += 1
+                    self.last_error = f"{name}: {e}"
+                    logger.error("规则集 {} 重新加载失败，继续使用旧规则: {}", name, e)
+                    continue
+                if old and old.version == rule_set.version:
+                    continue
+                rule_sets[name] = rule_set
+                changed.append(name)
+                logger.info("规则集已更新: {} -> {}", old, rule_set)
+            self._signatures = signatures
+            if changed:
+                self._rule_sets = rule_sets
+                self.reloads += 1
+            return changed
+
+    def stats(self) -> dict:
+        return {
+            "rule_sets": {name: rule_set.info() for name, rule_set in self._rule_sets.items()},
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
+
+    def start(self):
+        if self.running or self.interval_seconds <= 0:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, daemon=True, name="RuleRegistryThread")
+        self.thread.start()
+        logger.info(f"规则热更新已启动，每 {self.interval_seconds} 秒检查一次 {self.rules_dir}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+            logger.info("规则热更新已停止。")
+
+    def _run_loop(self):
+        while self.running:
+            # 简单的休眠循环
+            for _ in range(self.interval_seconds):
+                if not self.running:
+                    return
+                time.sleep(1)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"规则热更新检查出错: {e}")
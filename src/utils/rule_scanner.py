@@ -0,0 +1,209 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+
+class RuleHit(NamedTuple):
+    start: int
+    end: int
+    category: str
+    value: str
+
+
+class ScanResult:
+    """
+    一段文本的规则扫描结果，后续的关键词判断、URL 提取、IP 检测都从这里读取，不再重复扫描文本。
+    """
+    __slots__ = ("text", "hits", "_first", "_ip_pattern", "_ip_urls")
+
+    def __init__(self, text: str, hits: List[RuleHit], first: Dict[str, RuleHit], ip_pattern: Optional[re.Pattern] = None):
+        self.text = text
+        self.hits = hits
+        self._first = first
+        self._ip_pattern = ip_pattern
+        self._ip_urls = None
+
+    def first(self, category: str) -> Optional[RuleHit]:
+        """
+        返回某类规则的首个命中，与对应正则 search 的结果一致。
+        """
+        return self._first.get(category)
+
+    def has(self, category: str) -> bool:
+        return category in self._first
+
+    def all(self, category: str) -> List[RuleHit]:
+        return [hit for hit in self.hits if hit.category == category]
+
+    @property
+    def url(self) -> Optional[str]:
+        hit = self._first.get("url")
+        return hit.value if hit else None
+
+    @property
+    def urls(self) -> List[str]:
+        return [hit.value for hit in self.hits if hit.category == "url"]
+
+    @property
+    def ip_urls(self) -> List[str]:
+        """
+        IP 检测使用的 URL (IP_PATTERN)，只有走到 IP 检测时才需要，按需计算。
+        """
+        if self._ip_urls is None:
+            self._ip_urls = self._ip_pattern.findall(self.text) if self._ip_pattern and self.has("url") else []
+        return self._ip_urls
+
+    def keyword(self) -> Optional[RuleHit]:
+        """
+        关键词命中：优先车次，其次站点。
+        """
+        return self._first.get("train") or self._first.get("station")
+
+    def __repr__(self) -> str:
+        return f"ScanResult({[(hit.category, hit.value) for hit in self.hits]})"
+
+
+class _KeywordAutomaton:
+    """
+    Aho-Corasick 自动机，用于一次扫描匹配全部中文字面量关键词。
+    自动机处于根状态时，借助字符类正则跳过不可能开始匹配的字符。
+    """
+
+    def __init__(self, keywords: Sequence[Tuple[str, str]]):
+        """
+        :param keywords: [(关键词, 分类)]，同一位置命中多个关键词时按列表顺序优先
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        # 每个状态结束的关键词: [(关键词序号, 关键词长度)]
+        self._output: List[List[Tuple[int, int]]] = [[]]
+        self.keywords = list(keywords)
+
+        for index, (word, _) in enumerate(self.keywords):
+            state = 0
+            for char in word:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._output.append([])
+                state = nxt
+            self._output[state].append((index, len(word)))
+
+        # 按 BFS 顺序构建失败指针，同时把 goto 补全为确定性转移表，扫描时每个字符只查一次字典
+        fail = [0] * len(self._goto)
+        self._delta: List[Dict[str, int]] = [dict(self._goto[0])] + [{} for _ in range(len(self._goto) - 1)]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            parent_fail = fail[state]
+            if state:
+                self._delta[state] = {**self._delta[parent_fail], **self._goto[state]}
+                self._output[state] = self._output[state] + self._output[parent_fail]
+            for char, nxt in self._goto[state].items():
+                fail[nxt] = self._delta[parent_fail].get(char, 0) if state else 0
+                queue.append(nxt)
+
+        first_chars = "".join(sorted({word[0] for word, _ in self.keywords}))
+        self._skip = re.compile("[" + re.escape(first_chars) + "]") if first_chars else None
+
+    def iter_matches(self, text: str):
+        """
+        依次产出 (起始位置, 结束位置, 关键词序号)，包含重叠的命中。
+        """
+        if self._skip is None:
+            return
+        delta = self._delta
+        output = self._output
+        skip = self._skip.search
+        length = len(text)
+        state = 0
+        i = 0
+        while i < length:
+            if state == 0:
+                match = skip(text, i)
+                if match is None:
+                    return
+                i = match.start()
+            state = delta[state].get(text[i], 0)
+            i += 1
+            if output[state]:
+                for index, size in output[state]:
+                    yield i - size, i, index
+
+
+class RuleScanner:
+    """
+    一次性扫描消息文本中的所有规则命中：
+    - url:     URL_PATTERN 匹配的链接
+    - train:   车次 (TrainMatcher)
+    - station: 站点关键词，支持前后文排除 (如 "东北侧"、"马鞍山")
+    - filter:  过滤词
+
+    各分类的首个命中与原来分别调用 URL_PATTERN / SHENYANG_TRAIN / SHENYANG_STATION / SHENYANG_FILTER
+    的 search 结果一致 (最左位置优先，同一位置按关键词顺序优先)。
+    """
+
+    def __init__(
+        self,
+        train_matcher,
+        url_pattern: re.Pattern,
+        station_keywords: Iterable[str],
+        filter_keywords: Iterable[str],
+        excludes: Optional[Mapping[str, Tuple[Sequence[str], Sequence[str]]]] = None,
+        ip_pattern: Optional[re.Pattern] = None,
+    ):
+        """
+        :param train_matcher: 车次匹配器，需提供 finditer
+        :param url_pattern: URL 正则
+        :param station_keywords: 站点关键词，按优先级排列
+        :param filter_keywords: 过滤词
+        :param excludes: 关键词 -> (前面不能紧挨的文字, 后面不能紧挨的文字)
+        :param ip_pattern: IP 检测使用的 URL 正则，按需计算
+        """
+        self.train_matcher = train_matcher
+        self.url_pattern = url_pattern
+        self.ip_pattern = ip_pattern
+        self.excludes = dict(excludes or {})
+        keywords = [(word, "station") for word in station_keywords]
+        keywords += [(word, "filter") for word in filter_keywords]
+        self._automaton = _KeywordAutomaton(keywords)
+
+    def _excluded(self, text: str, word: str, start: int, end: int) -> bool:
+        rule = self.excludes.get(word)
+        if not rule:
+            return False
+        not_after, not_before = rule
+        return any(text.endswith(prefix, 0, start) for prefix in not_after) or \
+            any(text.startswith(suffix, end) for suffix in not_before)
+
+    def scan(self, text: str) -> ScanResult:
+        hits: List[RuleHit] = []
+        first: Dict[str, RuleHit] = {}
+
+        for match in self.url_pattern.finditer(text):
+            hit = RuleHit(match.start(), match.end(), "url", match.group(0))
+            hits.append(hit)
+            first.setdefault("url", hit)
+
+        for match in self.train_matcher.finditer(text):
+            hit = RuleHit(match.start(), match.end(), "train", match.group(0))
+            hits.append(hit)
+            first.setdefault("train", hit)
+
+        # 关键词命中按 (起始位置, 关键词顺序) 取各分类的首个命中
+        best: Dict[str, Tuple[int, int]] = {}
+        keywords = self._automaton.keywords
+        for start, end, index in self._automaton.iter_matches(text):
+            word, category = keywords[index]
+            if self._excluded(text, word, start, end):
+                continue
+            hit = RuleHit(start, end, category, word)
+            hits.append(hit)
+            rank = (start, index)
+            if category not in best or rank < best[category]:
+                best[category] = rank
+                first[category] = hit
+
+        hits.sort()
+        return ScanResult(text, hits, first, self.ip_pattern)
@@ -0,0 +1,88 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from src.config import global_config
+
+
+class ShareInfo(NamedTuple):
+    """
+    一段分享文本的解析结果。
+    """
+    url: Optional[str]
+    urls: Tuple[str, ...]
+    # xiaohongshu / douyin / weibo / kuaishou，无法识别时为空字符串
+    platform: str
+    # 作者用户名，用于去重，未找到时为空字符串
+    author: str
+    # 作品标题 (尽力提取)，未找到时为空字符串
+    title: str
+
+
+class _Platform(NamedTuple):
+    name: str
+    # 文本中包含任一特征即认为是该平台的分享
+    markers: Tuple[str, ...]
+    # 依次尝试的作者正则，取第一个命中的第 1 组
+    author_patterns: Tuple[re.Pattern, ...]
+    title_pattern: Optional[re.Pattern]
+
+
+# 平台分发表，按顺序判断，命中第一个平台后不再继续
+_PLATFORMS = (
+    _Platform(
+        name="xiaohongshu",
+        markers=("xhslink.com", "小红书"),
+        # 例子: "... 38 小红薯663296B1发布了一篇..." -> 提取 "小红薯663296B1"
+        # 最左的命中必然从一个非空白片段的开头开始，(?<!\S) 让正则只在片段开头尝试，结果不变，长链接中不再反复回溯
+        author_patterns=(re.compile(r'(?<!\S)(\S+)\s*发布了一篇小红书笔记'),),
+        # 网页分享: "【标题 - 作者 | 小红书 - 你的生活指南】"
+        title_pattern=re.compile(r'【(.+?) - [^【】]*\| 小红书'),
+    ),
+    _Platform(
+        name="douyin",
+        markers=("douyin.com", "抖音"),
+        # 格式 1: "看看【xxx的yyy作品】"，格式 2: "作者: xxx"
+        author_patterns=(re.compile(r'看看【(.+?)的(?:图文|视频)?作品】'), re.compile(r'作者\s*:\s*(.+)')),
+        title_pattern=re.compile(r'作品】\s*([^#\n]+?)\s*(?:#|https?://|$)'),
+    ),
+    _Platform(
+        name="weibo",
+        markers=("weibo",),
+        author_patterns=(re.compile(r'作者：([^\s]+)'),),
+        title_pattern=None,
+    ),
+    _Platform(
+        name="kuaishou",
+        markers=("kuaishou.com", "快手"),
+        # 快手分享的作者不参与去重，保持与原 extract_author 一致
+        author_patterns=(),
+        title_pattern=re.compile(r'发了一个快手作品，一起来看！\s*(.+)'),
+    ),
+)
+
+
+@lru_cache(maxsize=1024)
+def parse_share(text: str) -> ShareInfo:
+    """
+    一次解析分享文本中的链接、平台、作者和标题，结果按文本缓存。
+    去重、关键词判断、发送后标记等环节共用同一份结果，不再各自扫描文本。
+    """
+    urls = tuple(global_config.URL_PATTERN.findall(text))
+    msg = text.strip()
+    for platform in _PLATFORMS:
+        if not any(marker in msg for marker in platform.markers):
+            continue
+        author = ""
+        for pattern in platform.author_patterns:
+            match = pattern.search(msg)
+            if match:
+                author = match.group(1).strip()
+                break
+        title = ""
+        if platform.title_pattern:
+            match = platform.title_pattern.search(msg)
+            if match:
+                title = match.group(1).strip()
+        return ShareInfo(urls[0] if urls else None, urls, platform.name, author, title)
+    return ShareInfo(urls[0] if urls else None, urls, "", "", "")
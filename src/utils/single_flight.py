@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    同一 key 的并发调用合并为一次执行 (single-flight)，结果在短时间内复用。
+
+    - 第一个调用者执行任务，执行期间同一 key 的其他调用者等待同一个 Future，共享结果或异常
+    - 成功且结果不为 None 的结果保留 grace_seconds 秒，期间的调用直接返回；失败 (异常或 None) 不保留
+    - 执行者被取消时，等待者重新竞争执行，不会一起被取消
+    - 超过 max_size 时淘汰最早保留的结果
+
+    只在事件循环线程中使用，无需加锁。
+    """
+
+    def __init__(self, name: str, grace_seconds: float = 30.0, max_size: int = 1024):
+        """
+        :param name: 名称，用于日志和统计
+        :param grace_seconds: 成功结果的保留时间 (秒)，0 表示只合并并发调用
+        :param max_size: 最多保留的结果数
+        """
+        self.name = name
+        self.grace_seconds = grace_seconds
+        self.max_size = max(1, max_size)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._done: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._stats = {"calls": 0, "executed": 0, "joined": 0, "reused": 0, "failed": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        返回 fn() 的结果；同一 key 正在执行或刚执行成功时复用该结果。
+        """
+        self._stats["calls"] += 1
+        while True:
+            cached = self._done.get(key)
+            if cached is not None:
+                if cached[1] > time.monotonic():
+                    self._done.move_to_end(key)
+                    self._stats["reused"] += 1
+                    return cached[0]
+                del self._done[key]
+
+            future = self._inflight.get(key)
+            if future is None:
+                return await self._execute(key, fn)
+
+            self._stats["joined"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 执行者被取消时重新竞争执行；自身被取消时照常抛出
+                if not future.cancelled():
+                    raise
+
+    async def _execute(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._stats["executed"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self._stats["failed"] += 1
+            future.set_exception(e)
+            # 没有等待者时不输出 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(result)
+        if result is None:
+            self._stats["failed"] += 1
+        elif self.grace_seconds > 0:
+            self._done[key] = (result, time.monotonic() + self.grace_seconds)
+            self._done.move_to_end(key)
+            if len(self._done) > self.max_size:
+                self._done.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._done.clear()
+
+    def stats(self) -> dict:
+        return {**self._stats, "inflight": len(self._inflight), "retained": len(self._done)}
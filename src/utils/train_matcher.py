@@ -0,0 +1,83 @@
+import re
+from typing import Iterable, Iterator, List, Optional
+
+
+# 候选车次 token：连续的字母/数字。
+# 与原车次正则的 (?<![a-zA-Z0-9]) / (?![a-zA-Z0-9]) 边界使用同一个字符类 (含 re.I)，
+# 因此一次命中必然是一个完整的 token，按 token 查集合即可得到与原正则相同的结果。
+_TOKEN_PATTERN = re.compile(r'[a-zA-Z0-9]+', re.I)
+# 车次都是 "字母前缀 + 数字" 的形式，按前缀/数字长度收窄 token，URL 等长串中的片段不会进入 Python 层
+_CODE_SHAPE = re.compile(r'([a-z]*)([0-9]+)')
+
+
+def _build_token_pattern(codes) -> re.Pattern:
+    prefix_lengths = []
+    digit_lengths = []
+    for code in codes:
+        shape = _CODE_SHAPE.fullmatch(code)
+        if not shape:
+            return _TOKEN_PATTERN
+        prefix_lengths.append(len(shape.group(1)))
+        digit_lengths.append(len(shape.group(2)))
+    if not codes:
+        return _TOKEN_PATTERN
+    return re.compile(
+        r'(?<![a-zA-Z0-9])[a-zA-Z]{%d,%d}[0-9]{%d,%d}(?![a-zA-Z0-9])'
+        % (min(prefix_lengths), max(prefix_lengths), min(digit_lengths), max(digit_lengths)),
+        re.I,
+    )
+
+
+def load_codes(path: str) -> List[str]:
+    """
+    读取车次数据文件：每行一个车次，忽略空行和 # 开头的注释。
+    """
+    codes = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                codes.append(line)
+    return codes
+
+
+class TrainMatcher:
+    """
+    基于哈希集合的车次匹配器，替代上千个分支的车次正则。
+
+    对文本做一次线性扫描切出候选 token，逐个在车次集合中查找，
+    search / finditer 返回 re.Match 对象，调用方式与原正则保持一致。
+    """
+
+    def __init__(self, codes: Iterable[str]):
+        self.codes = frozenset(code.strip().lower() for code in codes if code.strip())
+        # 长度不可能命中的 token 不用转小写和查集合
+        self._lengths = frozenset(len(code) for code in self.codes)
+        self._token_pattern = _build_token_pattern(self.codes)
+
+    @classmethod
+    def from_file(cls, path: str) -> "TrainMatcher":
+        return cls(load_codes(path))
+
+    def finditer(self, text: str) -> Iterator[re.Match]:
+        codes = self.codes
+        lengths = self._lengths
+        for match in self._token_pattern.finditer(text):
+            token = match.group(0)
+            if len(token) in lengths and token.lower() in codes:
+                yield match
+
+    def search(self, text: str) -> Optional[re.Match]:
+        """
+        返回第一个命中的车次，与 SHENYANG_TRAIN.search 的结果一致。
+        """
+        return next(self.finditer(text), None)
+
+    def findall(self, text: str) -> List[str]:
+        return [match.group(0) for match in self.finditer(text)]
+
+    def __contains__(self, code: str) -> bool:
+        return code.lower() in self.codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
@@ -0,0 +1,206 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
+
+from curl_cffi.requests import AsyncSession
+from loguru import logger
+
+from src.config import global_config
+
+
+# 短链接域名，需要访问一次取跳转地址才能知道指向的作品
+SHORT_LINK_HOSTS = ("xhslink.com", "v.douyin.com", "v.kuaishou.com", "t.cn", "url.cn")
+# 头条的短链接与正文在同一个域名下，以路径区分
+_SHORT_LINK_PATHS = (("toutiao.com", "/is/"),)
+
+# 各平台域名 -> (平台名, 从路径中提取作品 id 的正则, 可能携带作品 id 的查询参数)
+_CONTENT_ID_RULES = (
+    ("xiaohongshu.com", "xiaohongshu", re.compile(r"/(?:explore|discovery/item|item)/([0-9a-zA-Z]+)"), ()),
+    ("douyin.com", "douyin", re.compile(r"/(?:share/)?(?:video|note|slides)/(\d+)"), ("modal_id", "aweme_id")),
+    ("iesdouyin.com", "douyin", re.compile(r"/(?:share/)?(?:video|note|slides)/(\d+)"), ("modal_id", "aweme_id")),
+    ("kuaishou.com", "kuaishou", re.compile(r"/(?:short-video|fw/photo|photo)/([0-9a-zA-Z]+)"), ("photoId",)),
+    ("gifshow.com", "kuaishou", re.compile(r"/(?:fw/photo|photo)/([0-9a-zA-Z]+)"), ("photoId",)),
+    ("toutiao.com", "toutiao", re.compile(r"/(?:article|video|group|w)/(\d+)|/a(\d+)"), ("group_id",)),
+    ("weibo.cn", "weibo", re.compile(r"/(?:status|detail)/([0-9a-zA-Z]+)"), ("id", "mid")),
+    ("weibo.com", "weibo", re.compile(r"^/(?:\d+|u/\d+)/([0-9a-zA-Z]+)|/(?:status|detail)/([0-9a-zA-Z]+)"), ("id", "mid")),
+)
+
+# 分享、统计用途的查询参数，不影响指向的内容
+_TRACKING_PARAMS = frozenset((
+    "from", "source", "spm", "timestamp", "apptime", "app_platform", "ignore", "u_code", "did", "iid",
+    "mid_share", "xhsshare", "appuid", "apptype", "author_share", "enter_from", "wid", "ts", "utm",
+))
+_TRACKING_PREFIXES = ("utm_", "share_", "xsec_", "shareRedId", "previous_page", "sec_")
+
+_BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _weibo_mid_to_id(mid: str) -> str:
+    """
+    微博 PC 端链接中的 base62 mid 转为数字 id (移动端链接使用数字 id)，从右往左每 4 位一组。
+    """
+    if mid.isdigit():
+        return mid
+    parts = []
+    end = len(mid)
+    while end > 0:
+        start = max(0, end - 4)
+        value = 0
+        for char in mid[start:end]:
+            value = value * 62 + _BASE62.index(char)
+        parts.append(str(value).zfill(7) if start > 0 else str(value))
+        end = start
+    return "".join(reversed(parts))
+
+
+def _host(netloc: str) -> str:
+    host = netloc.lower().rsplit("@", 1)[-1].split(":", 1)[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def _matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+
+def is_short_link(url: str) -> bool:
+    parts = urlsplit(url)
+    host = _host(parts.netloc)
+    if any(_matches(host, domain) for domain in SHORT_LINK_HOSTS):
+        return True
+    return any(_matches(host, domain) and parts.path.startswith(prefix) for domain, prefix in _SHORT_LINK_PATHS)
+
+
+def content_key(url: str) -> Optional[str]:
+    """
+    从完整链接中提取 "平台:作品id"，无法识别时返回 None。
+    """
+    parts = urlsplit(url)
+    host = _host(parts.netloc)
+    for domain, platform, pattern, query_keys in _CONTENT_ID_RULES:
+        if not _matches(host, domain):
+            continue
+        content_id = None
+        match = pattern.search(parts.path)
+        if match:
+            content_id = next(group for group in match.groups() if group)
+        elif query_keys:
+            query = dict(parse_qsl(parts.query))
+            content_id = next((query[key] for key in query_keys if query.get(key)), None)
+        if content_id:
+            if platform == "weibo":
+                content_id = _weibo_mid_to_id(content_id)
+            return f"{platform}:{content_id}"
+        return None
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """
+    去掉链接中的协议、www、锚点和分享统计参数，其余参数排序，用于无法识别作品 id 的链接。
+    """
+    parts = urlsplit(url)
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in _TRACKING_PARAMS and not key.startswith(_TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    normalized = _host(parts.netloc) + path
+    return f"{normalized}?{urlencode(query)}" if query else normalized
+
+
+def canonical_url(url: str) -> str:
+    """
+    不访问网络的规范化: 能识别作品 id 时返回 "平台:作品id"，否则返回去掉分享参数后的链接。
+    """
+    return content_key(url) or normalize_url(url)
+
+
+class ShortLinkResolver:
+    """
+    短链接跳转地址解析，结果缓存在有界 LRU 中 (带过期时间)。
+
+    只请求短链接本身、不跟随跳转，从 Location 头取目标地址；目标仍是短链接时最多继续 max_hops 次。
+    解析失败的结果也缓存 failure_ttl 秒，短时间内不重复请求。
+    """
+
+    def __init__(self, enabled: bool = True, timeout: float = 3.0, max_size: int = 4096,
+                 ttl_seconds: float = 86400.0, failure_ttl: float = 60.0, max_hops: int = 3):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self.failure_ttl = failure_ttl
+        self.max_hops = max(1, max_hops)
+        # 短链接 -> (解析结果, 过期时间)，解析失败时结果为 None
+        self._cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._stats = {"hits": 0, "resolved": 0, "failed": 0}
+
+    async def resolve(self, url: str) -> Optional[str]:
+        """
+        返回短链接最终指向的地址，未启用或解析失败时返回 None。
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        cached = self._cache.get(url)
+        if cached is not None and cached[1] > now:
+            self._cache.move_to_end(url)
+            self._stats["hits"] += 1
+            return cached[0]
+
+        target = await self._follow(url)
+        self._stats["resolved" if target else "failed"] += 1
+        self._cache[url] = (target, now + (self.ttl_seconds if target else self.failure_ttl))
+        self._cache.move_to_end(url)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return target
+
+    async def _follow(self, url: str) -> Optional[str]:
+        current = url
+        try:
+            async with AsyncSession(impersonate="chrome") as session:
+                for _ in range(self.max_hops):
+                    response = await session.get(current, allow_redirects=False, timeout=self.timeout)
+                    location = response.headers.get("location")
+                    if not location:
+                        break
+                    current = urljoin(current, location)
+                    if not is_short_link(current):
+                        break
+        except Exception as e:
+            logger.warning("短链接解析失败: {} ({})", url, e)
+            return None
+        if current == url:
+            logger.debug("短链接没有跳转地址: {}", url)
+            return None
+        logger.debug("短链接 {} -> {}", url, current)
+        return current
+
+    def stats(self) -> dict:
+        return {**self._stats, "size": len(self._cache)}
+
+
+RESOLVER = ShortLinkResolver(
+    enabled=global_config.URL_RESOLVE_ENABLED,
+    timeout=global_config.URL_RESOLVE_TIMEOUT,
+    max_size=global_config.URL_RESOLVE_CACHE_SIZE,
+    ttl_seconds=global_config.URL_RESOLVE_CACHE_TTL,
+)
+
+
+async def canonical_key(url: Optional[str]) -> Optional[str]:
+    """
+    链接的去重 key: 同一作品的短链接、不同分享 token、带统计参数的完整链接都得到同一个 key。
+    短链接先解析跳转地址 (有缓存)，解析失败时退回到短链接本身。
+    传入的已经是 key (不以 http 开头) 时原样返回，可以重复调用。
+    """
+    if not url or not url.startswith(("http://", "https://")):
+        return url
+    if is_short_link(url):
+        target = await RESOLVER.resolve(url)
+        if target:
+            return canonical_url(target)
+    return canonical_url(url)
@@ -0,0 +1,431 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+
+class _Lane:
+    """
+    队列中的一个优先级通道，拥有独立的内存队列、溢出文件、权重和并发上限。
+    """
+
+    def __init__(self, name: str, weight: int, max_in_flight: int, spill_path: str):
+        self.name = name
+        self.weight = max(1, weight)
+        self.max_in_flight = max_in_flight
+        self.spill_path = spill_path
+        self.items = deque()
+        self.in_flight = 0
+        # 平滑加权轮询的当前权重
+        self.current_weight = 0
+
+        # 溢出文件读写状态: 未读回的任务数、已读回的位置 (同时写入 offset_path，重启后从该位置继续)
+        self.spill_pending = 0
+        self.spill_offset = 0
+        self.offset_path = spill_path + ".offset"
+
+        # 统计信息
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.spilled = 0
+        self.max_depth = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_waits = deque(maxlen=1000)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.items) and self.in_flight < self.max_in_flight
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.items or self.spill_pending or self.in_flight)
+
+    def record_wait(self, wait: float):
+        self.wait_count += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.recent_waits.append(wait)
+
+    def stats(self) -> dict:
+        waits = sorted(self.recent_waits)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "weight": self.weight,
+            "max_in_flight": self.max_in_flight,
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "spill_pending": self.spill_pending,
+            "in_flight": self.in_flight,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "spilled": self.spilled,
+            "wait_avg_ms": round(self.wait_total / self.wait_count * 1000, 2) if self.wait_count else 0.0,
+            "wait_p95_ms": round(p95 * 1000, 2),
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+class WorkQueue:
+    """
+    有界任务队列 + 固定数量的 worker 协程。
+
+    - 入队是 O(1) 的同步操作，回调接口不会被业务处理阻塞
+    - 支持多个优先级通道 (lane)，worker 按权重做平滑加权轮询取任务，
+      每个通道可以限制同时执行的任务数，避免低价值的耗时任务占满所有 worker
+    - 通道满时按溢出策略处理：
+        drop_oldest: 丢弃该通道最早入队的任务，为新任务腾位置
+        reject:      拒绝新任务，由调用方返回背压信号
+        spill:       将新任务以 JSONL 形式溢出到磁盘，通道有空位时再读回；
+                     读回的位置记录在旁边的 .offset 文件中，崩溃重启后已读回的任务不会再次执行
+    - 通过 stats() 暴露队列深度和排队等待耗时
+    """
+
+    POLICIES = ("drop_oldest", "reject", "spill")
+    DEFAULT_LANE = "default"
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int = 4,
+        max_size: int = 200,
+        policy: str = "drop_oldest",
+        spill_dir: str = "queue_spill",
+        name: str = "work_queue",
+        on_drop: Optional[Callable[[Any], None]] = None,
+        encode: Optional[Callable[[Any], Any]] = None,
+        decode: Optional[Callable[[Any], Any]] = None,
+        lanes: Optional[Dict[str, Tuple[int, Optional[int]]]] = None,
+        default_lane: Optional[str] = None,
+    ):
+        """
+        :param handler: 处理单个任务的协程函数
+        :param workers: worker 协程数量
+        :param max_size: 每个通道的内存队列最大深度
+        :param policy: 溢出策略，见 POLICIES
+        :param spill_dir: spill 策略下的溢出文件目录
+        :param name: 队列名称，用于日志和溢出文件名
+        :param on_drop: 任务被 drop_oldest 策略丢弃时的回调
+        :param encode: 溢出到磁盘前将任务转换为可 JSON 序列化对象
+        :param decode: 从磁盘读回时将 JSON 对象还原为任务
+        :param lanes: 优先级通道 {通道名: (权重, 最大并发数)}，最大并发数为 None 时不限制；
+                      不配置时只有一个 default 通道
+        :param default_lane: 未指定通道或通道不存在时使用的通道，默认为第一个通道
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {policy}")
+
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_size = max(1, max_size)
+        self.policy = policy
+        self.name = name
+        self.on_drop = on_drop
+        self.encode = encode or (lambda payload: payload)
+        self.decode = decode or (lambda data: data)
+
+        lanes = lanes or {self.DEFAULT_LANE: (1, None)}
+        self._lanes: Dict[str, _Lane] = {}
+        for lane_name, (weight, max_in_flight) in lanes.items():
+            # 单通道时沿用原来的溢出文件名，兼容升级前遗留的溢出文件
+            spill_file = f"{name}.jsonl" if len(lanes) == 1 else f"{name}-{lane_name}.jsonl"
+            self._lanes[lane_name] = _Lane(
+                name=lane_name,
+                weight=weight,
+                max_in_flight=min(max_in_flight or self.workers, self.workers),
+                spill_path=os.path.join(spill_dir, spill_file),
+            )
+        self.default_lane = default_lane if default_lane in self._lanes else next(iter(self._lanes))
+
+        self._tasks = []
+        self._changed: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def depth(self) -> int:
+        return sum(len(lane.items) for lane in self._lanes.values())
+
+    async def start(self, spill_filter: Optional[Callable[[Any], bool]] = None):
+        """
+        启动 worker 协程。
+
+        :param spill_filter: 接管上次运行遗留的溢出任务时的过滤条件，返回 False 的任务直接丢弃
+                             (在 worker 启动前对每个遗留任务调用一次)
+        """
+        if self._tasks:
+            return
+        self._changed = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        if self.policy == "spill":
+            for lane in self._lanes.values():
+                self._load_spill_file(lane, spill_filter)
+        for i in range(self.workers):
+            task = asyncio.create_task(self._worker_loop(), name=f"{self.name}-worker-{i}")
+            self._tasks.append(task)
+        logger.info(
+            "任务队列 [{}] 已启动: workers={} max_size={} policy={} lanes={}",
+            self.name, self.workers, self.max_size, self.policy,
+            {lane.name: (lane.weight, lane.max_in_flight) for lane in self._lanes.values()},
+        )
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        等待队列排空（最多 timeout 秒）后停止所有 worker。
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "任务队列 [{}] 在 {} 秒内未能排空，剩余 {} 个任务",
+                self.name, timeout, sum(len(lane.items) + lane.in_flight for lane in self._lanes.values()),
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("任务队列 [{}] 已停止", self.name)
+
+    async def join(self):
+        """
+        等待所有通道的内存队列、溢出文件和执行中的任务全部处理完成。
+        """
+        while any(lane.busy for lane in self._lanes.values()):
+            self._idle.clear()
+            await self._idle.wait()
+
+    def submit(self, payload: Any, lane: Optional[str] = None) -> str:
+        """
+        提交一个任务到指定通道，返回入队结果:
+        queued / dropped_oldest / spilled / rejected
+        """
+        if self._changed is None:
+            raise RuntimeError(f"任务队列 [{self.name}] 尚未启动")
+
+        target = self._lanes.get(lane or self.default_lane) or self._lanes[self.default_lane]
+        if len(target.items) >= self.max_size or target.spill_pending:
+            if self.policy == "reject":
+                target.rejected += 1
+                logger.warning("任务队列 [{}:{}] 已满 ({}), 拒绝新任务", self.name, target.name, self.max_size)
+                return "rejected"
+            if self.policy == "spill":
+                self._spill(target, payload)
+                return "spilled"
+            if len(target.items) >= self.max_size:
+                _, dropped = target.items.popleft()
+                target.dropped += 1
+                if self.on_drop:
+                    self.on_drop(dropped)
+                logger.warning("任务队列 [{}:{}] 已满 ({}), 丢弃最早的任务", self.name, target.name, self.max_size)
+                target.items.append((time.monotonic(), payload))
+                target.enqueued += 1
+                self._changed.set()
+                return "dropped_oldest"
+
+        target.items.append((time.monotonic(), payload))
+        target.enqueued += 1
+        target.max_depth = max(target.max_depth, len(target.items))
+        self._changed.set()
+        return "queued"
+
+    def stats(self) -> dict:
+        """
+        返回队列运行统计：顶层为所有通道的汇总，多通道时 lanes 中为各通道明细。
+        """
+        lanes = {lane.name: lane.stats() for lane in self._lanes.values()}
+        result = {"name": self.name, "policy": self.policy, "workers": self.workers, "max_size": self.max_size}
+        for key in ("depth", "max_depth", "spill_pending", "in_flight", "enqueued", "processed",
+                    "failed", "dropped", "rejected", "spilled"):
+            result[key] = sum(lane_stats[key] for lane_stats in lanes.values())
+        wait_count = sum(lane.wait_count for lane in self._lanes.values())
+        wait_total = sum(lane.wait_total for lane in self._lanes.values())
+        result["wait_avg_ms"] = round(wait_total / wait_count * 1000, 2) if wait_count else 0.0
+        result["wait_p95_ms"] = max(lane_stats["wait_p95_ms"] for lane_stats in lanes.values())
+        result["wait_max_ms"] = max(lane_stats["wait_max_ms"] for lane_stats in lanes.values())
+        if len(lanes) > 1:
+            result["lanes"] = lanes
+        return result
+
+    def _next_lane(self) -> Optional[_Lane]:
+        """
+        平滑加权轮询：在有任务且未达到并发上限的通道中选出下一个通道。
+        """
+        ready = [lane for lane in self._lanes.values() if lane.ready]
+        if len(ready) <= 1:
+            return ready[0] if ready else None
+        total = 0
+        best = None
+        for lane in ready:
+            lane.current_weight += lane.weight
+            total += lane.weight
+            if best is None or lane.current_weight > best.current_weight:
+                best = lane
+        best.current_weight -= total
+        return best
+
+    async def _worker_loop(self):
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            enqueued_at, payload = lane.items.popleft()
+            self._refill_from_spill(lane)
+            lane.record_wait(time.monotonic() - enqueued_at)
+
+            lane.in_flight += 1
+            try:
+                await self.handler(payload)
+                lane.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                lane.failed += 1
+                logger.exception("任务队列 [{}:{}] 处理任务异常: {}", self.name, lane.name, e)
+            finally:
+                lane.in_flight -= 1
+                # 释放了并发名额，唤醒可能在等待该通道的 worker
+                self._changed.set()
+                if not any(item.busy for item in self._lanes.values()):
+                    self._idle.set()
+
+    def _spill(self, lane: _Lane, payload: Any):
+        os.makedirs(os.path.dirname(lane.spill_path) or ".", exist_ok=True)
+        with open(lane.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.encode(payload), ensure_ascii=False) + "\n")
+        lane.spill_pending += 1
+        lane.spilled += 1
+        logger.warning("任务队列 [{}:{}] 已满，任务已溢出到磁盘 (待读回 {})", self.name, lane.name, lane.spill_pending)
+
+    def _refill_from_spill(self, lane: _Lane):
+        """
+        通道有空位时，按顺序从溢出文件中读回任务。
+        """
+        if not lane.spill_pending or len(lane.items) >= self.max_size:
+            return
+        try:
+            with open(lane.spill_path, "r", encoding="utf-8") as f:
+                f.seek(lane.spill_offset)
+                while lane.spill_pending and len(lane.items) < self.max_size:
+                    line = f.readline()
+                    if not line:
+                        lane.spill_pending = 0
+                        break
+                    lane.spill_offset = f.tell()
+                    # 与 _load_spill_file 一致，空行不计入待读回的任务数
+                    if not line.strip():
+                        continue
+                    lane.spill_pending -= 1
+                    lane.items.append((time.monotonic(), self.decode(json.loads(line))))
+        except (OSError, ValueError) as e:
+            logger.error("任务队列 [{}:{}] 读取溢出文件失败: {}", self.name, lane.name, e)
+            lane.spill_pending = 0
+
+        if self._changed:
+            self._changed.set()
+        if not lane.spill_pending:
+            self._reset_spill_file(lane)
+        else:
+            self._save_spill_offset(lane)
+
+    def _load_spill_file(self, lane: _Lane, spill_filter: Optional[Callable[[Any], bool]] = None):
+        """
+        启动时接管上次运行遗留的溢出文件。
+        """
+        if not os.path.exists(lane.spill_path):
+            self._remove_file(lane, lane.offset_path)
+            return
+        lane.spill_offset = self._read_spill_offset(lane)
+        if spill_filter is not None:
+            self._filter_spill_file(lane, spill_filter)
+        with open(lane.spill_path, "r", encoding="utf-8") as f:
+            f.seek(lane.spill_offset)
+            lane.spill_pending = sum(1 for line in f if line.strip())
+        if lane.spill_pending:
+            logger.info("任务队列 [{}:{}] 发现 {} 个遗留的溢出任务", self.name, lane.name, lane.spill_pending)
+            self._refill_from_spill(lane)
+        else:
+            self._reset_spill_file(lane)
+
+    def _filter_spill_file(self, lane: _Lane, spill_filter: Callable[[Any], bool]):
+        """
+        把溢出文件中未读回的部分按 spill_filter 过滤后重写，有任务被丢弃时从头读取新文件。
+        无法解析的行原样保留，由读回时记录错误。
+        """
+        tmp_path = lane.spill_path + ".tmp"
+        dropped = 0
+        with open(lane.spill_path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+            src.seek(lane.spill_offset)
+            for line in src:
+                if not line.strip():
+                    continue
+                try:
+                    keep = spill_filter(self.decode(json.loads(line)))
+                except (ValueError, KeyError, TypeError):
+                    keep = True
+                if keep:
+                    dst.write(line)
+                else:
+                    dropped += 1
+        if not dropped:
+            self._remove_file(lane, tmp_path)
+            return
+        os.replace(tmp_path, lane.spill_path)
+        lane.spill_offset = 0
+        self._remove_file(lane, lane.offset_path)
+        logger.info("任务队列 [{}:{}] 丢弃 {} 个已无需执行的遗留溢出任务", self.name, lane.name, dropped)
+
+    def _read_spill_offset(self, lane: _Lane) -> int:
+        """
+        读取上次运行记录的读回位置，文件不存在、损坏或超出溢出文件长度时从头读取。
+        """
+        try:
+            with open(lane.offset_path, "r", encoding="utf-8") as f:
+                offset = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning("任务队列 [{}:{}] 读取溢出位置失败，从头读取: {}", self.name, lane.name, e)
+            return 0
+        if not 0 <= offset <= os.path.getsize(lane.spill_path):
+            logger.warning("任务队列 [{}:{}] 溢出位置 {} 无效，从头读取", self.name, lane.name, offset)
+            return 0
+        return offset
+
+    def _save_spill_offset(self, lane: _Lane):
+        tmp_path = lane.offset_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(lane.spill_offset))
+            os.replace(tmp_path, lane.offset_path)
+        except OSError as e:
+            logger.warning("任务队列 [{}:{}] 记录溢出位置失败: {}", self.name, lane.name, e)
+
+    def _reset_spill_file(self, lane: _Lane):
+        lane.spill_offset = 0
+        # 先删除溢出文件：两者之间崩溃时只会留下无用的位置文件
+        self._remove_file(lane, lane.spill_path)
+        self._remove_file(lane, lane.offset_path)
+
+    def _remove_file(self, lane: _Lane, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("任务队列 [{}:{}] 清理溢出文件失败: {}", self.name, lane.name, e)
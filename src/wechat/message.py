@@ -0,0 +1,187 @@
+import hashlib
+import time
+from typing import Optional, Tuple
+
+from src.utils.share_parser import parse_share
+
+
+# vxhook 不同版本中消息 id / 时间戳可能出现的字段名
+_MSG_ID_KEYS = ("newMsgId", "msgSvrId", "msgId", "msg_id", "NewMsgId", "MsgId")
+_TIMESTAMP_KEYS = ("createTime", "create_time", "CreateTime", "timestamp", "msgTime")
+
+
+class NormalizedMessage:
+    """
+    归一化后的微信消息。
+
+    由 normalize_message 从 vxhook 原始回调中一次性解析生成，
+    之后在接收、排队、业务处理的整个流程中传递，避免重复解析 content_xml，
+    也不再让后台任务持有完整的原始回调字典。
+    """
+    __slots__ = (
+        "msg_type", "room", "sender", "sender_name", "event_desc",
+        "text", "quote", "urls", "timestamp", "msg_id",
+    )
+
+    def __init__(
+        self,
+        msg_type: str,
+        room: str,
+        sender: str,
+        text: str,
+        quote: str = "",
+        urls: Tuple[str, ...] = (),
+        timestamp: float = 0.0,
+        msg_id: str = "",
+        sender_name: str = "",
+        event_desc: str = "",
+    ):
+        """
+        :param msg_type: 消息类型，quote 表示引用消息，text 表示普通文本
+        :param room: 群聊 wxid，非群聊为空字符串
+        :param sender: 发送者 wxid (fromUserName)
+        :param text: 消息正文；引用消息为回复内容
+        :param quote: 被引用的消息内容，仅引用消息有值
+        :param urls: 从正文(普通文本)或引用内容(引用消息)中提取的 URL
+        :param timestamp: 消息时间戳（秒）
+        :param msg_id: vxhook 消息 id
+        :param sender_name: 发送者昵称
+        :param event_desc: vxhook 事件描述，仅用于日志
+        """
+        self.msg_type = msg_type
+        self.room = room
+        self.sender = sender
+        self.text = text
+        self.quote = quote
+        self.urls = tuple(urls)
+        self.timestamp = timestamp
+        self.msg_id = msg_id
+        self.sender_name = sender_name
+        self.event_desc = event_desc
+
+    @property
+    def is_quote(self) -> bool:
+        return self.msg_type == "quote"
+
+    @property
+    def sender_display(self) -> str:
+        return f"{self.sender_name} [{self.sender}]" if self.sender_name else self.sender
+
+    def age(self) -> float:
+        """
+        消息从微信端产生到当前的时长（秒）。
+        """
+        return time.time() - self.timestamp
+
+    def dedup_key(self) -> str:
+        """
+        回调幂等去重使用的 key：优先使用 vxhook 消息 id，没有时退化为内容哈希。
+        """
+        if self.msg_id:
+            return f"id:{self.msg_id}"
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (self.room, self.sender, self.msg_type, self.text, self.quote):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return f"hash:{digest.hexdigest()}"
+
+    def summary(self) -> str:
+        """
+        生成单行日志摘要。
+        """
+        content = self.text.replace("\n", " ")[:80]
+        if self.is_quote:
+            quoted = self.quote.replace("\n", " ")[:50]
+            return f"[收到 {self.event_desc}] | 发送者: {self.sender_display} | 内容: {content} | 引用: {quoted}"
+        return f"[收到 {self.event_desc}] | 发送者: {self.sender_display} | 内容: {content}"
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NormalizedMessage":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def __repr__(self) -> str:
+        return f"NormalizedMessage(type={self.msg_type}, room={self.room}, sender={self.sender}, text={self.text[:30]!r})"
+
+
+def _fix_url_spaces(text: str, force_https: bool = False) -> str:
+    """
+    修复钉钉/微信转发时 URL 协议头后被插入空格的问题。
+    """
+    text = text.replace("https:// ", "https://").replace("http:// ", "https://")
+    if force_https:
+        text = text.replace("http://", "https://")
+    return text
+
+
+def _first_value(msg_data: dict, keys: Tuple[str, ...]):
+    for key in keys:
+        value = msg_data.get(key)
+        if value not in (None, "", 0):
+            return value
+    return None
+
+
+def _parse_timestamp(value) -> float:
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return time.time()
+    # 毫秒时间戳转为秒
+    return ts / 1000 if ts > 1e12 else ts
+
+
+def normalize_message(msg_data: dict) -> Optional[NormalizedMessage]:
+    """
+    从 vxhook 回调数据中一次性提取业务需要的字段。
+    未提取到有效文本或引用消息时返回 None。
+    """
+    from_user_name = msg_data.get("fromUserName", "")
+    if isinstance(from_user_name, dict):
+        from_user_name = from_user_name.get("String", "")
+    from_user_name = str(from_user_name)
+    room_wxid = from_user_name if from_user_name.endswith("@chatroom") else ""
+
+    # 判断引用消息还是普通文本
+    content_xml = msg_data.get("content_xml") or {}
+    msg_node = content_xml.get("msg") or {}
+    appmsg_node = msg_node.get("appmsg") or {}
+    quote_title = msg_node.get("title") or appmsg_node.get("title")
+    quote_refer_content = (msg_node.get("refermsg") or {}).get("content") or (appmsg_node.get("refermsg") or {}).get("content")
+    real_content = msg_data.get("real_content")
+
+    if not quote_title and not real_content:
+        return None
+
+    if quote_title:
+        msg_type = "quote"
+        text = str(quote_title)
+        quote = _fix_url_spaces(str(quote_refer_content or ""))
+        urls = parse_share(quote).urls
+    else:
+        msg_type = "text"
+        text = _fix_url_spaces(str(real_content), force_https=True)
+        quote = ""
+        urls = parse_share(text).urls
+
+    sender_profile = msg_data.get("sender_profile", {})
+    nickname = sender_profile.get("nickName", "") if isinstance(sender_profile, dict) else ""
+    if not nickname:
+        nickname = msg_data.get("sender_nick", "")
+
+    msg_id = _first_value(msg_data, _MSG_ID_KEYS)
+
+    return NormalizedMessage(
+        msg_type=msg_type,
+        room=room_wxid,
+        sender=from_user_name,
+        text=text,
+        quote=quote,
+        urls=tuple(urls),
+        timestamp=_parse_timestamp(_first_value(msg_data, _TIMESTAMP_KEYS)),
+        msg_id=str(msg_id) if msg_id is not None else "",
+        sender_name=str(nickname or ""),
+        event_desc=str(msg_data.get("event_desc") or msg_data.get("messageType") or "未知事件"),
+    )
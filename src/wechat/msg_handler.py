@@ -3,16 +3,70 @@ import asyncio
 import os
 import time
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import List, Optional
 
 from loguru import logger
 
 from src.config import global_config
 from src.ding_talk.dd_hook import send_to_dd
-from src.utils.commons import timeit, extract_author
-from src.utils.deduplication import claim_url_if_not_processed, is_username_processed, release_claimed_url
+from src.utils.commons import timeit
+from src.utils.deduplication import (
+    claim_text_if_not_near_duplicate,
+    claim_url_if_not_processed,
+    is_username_processed,
+    mark_url_as_processed,
+    mark_username_as_processed,
+    release_claimed_text,
+    release_claimed_url,
+)
+from src.utils.ip_verdict_cache import IpVerdictCache
 from src.utils.playwright_utils import PlaywrightIpChecker
+from src.utils.rule_engine import DecisionPlan, StageSpec
+from src.utils.rule_registry import RuleSet
+from src.utils.rule_scanner import ScanResult
+from src.utils.share_parser import parse_share
+from src.utils.single_flight import SingleFlight
+from src.utils.url_canonical import canonical_key
 from src.utils.video_manager import video_manager
+from src.wechat.message import NormalizedMessage
+from src.wechat.text_rules import (
+    DECISION_CONDITIONS, DECISION_RULES, IP_CHECK_KEYWORDS, decision_context, ip_address_matched, msg_cleaner,
+    msg_restructure, scan_text,
+)
+
+
+# 因消息超过时效而跳过的各阶段次数
+STALE_STATS = {"screenshot": 0, "ip_check": 0, "video": 0}
+
+# 同一作品 (规范化 URL) 的截图、IP 检查、视频下载并发时只执行一次，结果短时间内复用
+SCREENSHOT_FLIGHTS = SingleFlight("screenshot", global_config.SINGLE_FLIGHT_GRACE_SECONDS, global_config.SINGLE_FLIGHT_MAX_SIZE)
+IP_CHECK_FLIGHTS = SingleFlight("ip_check", global_config.SINGLE_FLIGHT_GRACE_SECONDS, global_config.SINGLE_FLIGHT_MAX_SIZE)
+VIDEO_FLIGHTS = SingleFlight("video", global_config.SINGLE_FLIGHT_GRACE_SECONDS, global_config.SINGLE_FLIGHT_MAX_SIZE)
+
+# IP 属地不在关注地区、或提取失败的链接/作者，在一段时间内不再访问
+IP_VERDICTS = IpVerdictCache(
+    no_match_ttl=global_config.IP_NO_MATCH_TTL,
+    failure_ttl=global_config.IP_FAILURE_TTL,
+    max_size=global_config.IP_VERDICT_CACHE_SIZE,
+)
+
+def _past_deadline(message: NormalizedMessage, stage: str) -> bool:
+    """
+    判断消息是否已超过时效，超时则记录跳过的阶段。
+    浏览器积压时，迟到的消息不再占用截图/IP 检查/视频下载的资源。
+    """
+    max_age = global_config.MESSAGE_MAX_AGE_SECONDS
+    if max_age <= 0:
+        return False
+    age = message.age()
+    if age <= max_age:
+        return False
+    STALE_STATS[stage] += 1
+    logger.warning(
+        "⏰ 消息已超过时效 ({:.0f}s > {:.0f}s)，跳过 [{}] 阶段: {}",
+        age, max_age, stage, message.text.replace("\n", " ")[:50],
+    )
+    return True
 
 
 def _set_video_info_path(info, file_path: str):
@@ -49,9 +103,101 @@ def _rename_downloaded_video(file_path: str) -> str:
 # 步骤1：将关键词和IP检查分别封装成独立的异步函数
 # --------------------------------------------------------------------------------------
 
+async def _download_videos(url: str) -> Optional[List[str]]:
+    """
+    解析并下载作品中的视频，返回下载完成 (已重命名) 的文件路径；作品内没有可下载的视频时返回空列表，
+    VideoClient 未初始化或解析失败时返回 None。
+    """
+    client = video_manager.client
+    if not client:
+        logger.error("VideoClient 未初始化，跳过视频下载")
+        return None
+
+    # 在线程池中执行耗时操作 (解析和下载)
+    loop = asyncio.get_running_loop()
+    
+    # 1. 解析
+    # parsefromurl 通常很快，但也可能涉及网络请求
+    video_infos = await loop.run_in_executor(None, client.parsefromurl, url)
+    if not video_infos:
+        logger.warning(f"无法解析视频 URL: {url}")
+        return None
+
+    # 2. 作品内无视频时, 跳过
+    if not video_infos:
+        logger.info(f"作品内无视频信息, 直接发送文本消息: {url}")
+        return []
+        
+    # 调试打印所有解析到的视频信息
+    for idx, info in enumerate(video_infos):
+        logger.info(f"Video Info [{idx}]: {info}")
+        
+    # 3. 收集所有符合条件的 mp4 视频路径
+    # 预先收集所有需要下载的任务，过滤非 mp4
+    # 根据 videodl 逻辑，client.download(video_infos) 会处理列表中的每一项
+    # 我们需要在下载前过滤掉非 mp4 的项，以免下载了不需要的格式
+    
+    filtered_video_infos = []
+    # 定义允许的视频来源路径关键字
+    allowed_sources = ['DouyinVideoClient', 'KuaishouVideoClient', 'RednoteVideoClient', 'WeiboVideoClient']
+    
+    for info in video_infos:
+        # 兼容新版videodl对象(VideoInfo)和旧版字典
+        title = getattr(info, 'title', '') if hasattr(info, 'title') else (info.get('title', 'Unknown') if isinstance(info, dict) else 'Unknown')
+        source = getattr(info, 'source', '') if hasattr(info, 'source') else (info.get('source', '') if isinstance(info, dict) else '')
+        # 新版为 save_path, 旧版字典可能是 file_path
+        file_path = getattr(info, 'save_path', '') if hasattr(info, 'save_path') else (info.get('file_path', '') if isinstance(info, dict) else '')
+        
+        # 1. 检查格式是否为 mp4
+        if not file_path or not str(file_path).lower().endswith('.mp4'):
+            logger.info(f"跳过非mp4资源: {title} - {file_path}")
+            continue
+            
+        # 2. 检查路径是否包含指定的来源关键字，新版本直接检查 source 属性
+        is_allowed_source = False
+        if source in allowed_sources:
+            is_allowed_source = True
+        else:
+            for s in allowed_sources:
+                if s in str(file_path) or s in str(source):
+                    is_allowed_source = True
+                    break
+        
+        if not is_allowed_source:
+            logger.debug(f"跳过非指定来源资源: {title} - {file_path} - {source}")
+            continue
+            
+        filtered_video_infos.append(info)
+    
+    if not filtered_video_infos:
+        logger.info("没有找到有效的 MP4 视频资源（且来源合法），跳过下载。")
+        return []
+
+    # 4. 下载
+    logger.info(f"正在下载 {len(filtered_video_infos)} 个视频...")
+    downloaded_infos = await loop.run_in_executor(None, client.download, filtered_video_infos)
+    
+    if downloaded_infos is None:
+        downloaded_infos = filtered_video_infos
+
+    # 5. 收集下载后的文件路径
+    file_paths = []
+    for info in downloaded_infos:
+        file_path = getattr(info, 'save_path', '') if hasattr(info, 'save_path') else (info.get('file_path', '') if isinstance(info, dict) else '')
+        if file_path and os.path.exists(file_path):
+            renamed_file_path = _rename_downloaded_video(file_path)
+            _set_video_info_path(info, renamed_file_path)
+            logger.info(f"视频下载完成: {renamed_file_path}")
+            file_paths.append(renamed_file_path)
+        else:
+            logger.error(f"视频文件不存在: {file_path}")
+    return file_paths
+
+
 async def process_video_task(url: str, dd_sender):
     """
     异步处理视频下载和发送任务
+    同一作品 (规范化 URL) 的并发任务只解析、下载一次，刚下载完成的视频在短时间内直接复用。
     """
     if not dd_sender:
         # Webhook 模式不支持发送本地视频文件
@@ -59,86 +205,11 @@ async def process_video_task(url: str, dd_sender):
 
     try:
         logger.info(f"🎥 开始异步处理视频任务: {url}")
-        client = video_manager.client
-        if not client:
-            logger.error("VideoClient 未初始化，跳过视频下载")
-            return
-
-        # 在线程池中执行耗时操作 (解析和下载)
-        loop = asyncio.get_running_loop()
-        
-        # 1. 解析
-        # parsefromurl 通常很快，但也可能涉及网络请求
-        video_infos = await loop.run_in_executor(None, client.parsefromurl, url)
-        if not video_infos:
-            logger.warning(f"无法解析视频 URL: {url}")
-            return
-
-        # 2. 作品内无视频时, 跳过
-        if not video_infos:
-            logger.info(f"作品内无视频信息, 直接发送文本消息: {url}")
-            return
-            
-        # 调试打印所有解析到的视频信息
-        for idx, info in enumerate(video_infos):
-            logger.info(f"Video Info [{idx}]: {info}")
-            
-        # 3. 收集所有符合条件的 mp4 视频路径
-        # 预先收集所有需要下载的任务，过滤非 mp4
-        # 根据 videodl 逻辑，client.download(video_infos) 会处理列表中的每一项
-        # 我们需要在下载前过滤掉非 mp4 的项，以免下载了不需要的格式
-        
-        filtered_video_infos = []
-        # 定义允许的视频来源路径关键字
-        allowed_sources = ['DouyinVideoClient', 'KuaishouVideoClient', 'RednoteVideoClient', 'WeiboVideoClient']
-        
-        for info in video_infos:
-            # 兼容新版videodl对象(VideoInfo)和旧版字典
-            title = getattr(info, 'title', '') if hasattr(info, 'title') else (info.get('title', 'Unknown') if isinstance(info, dict) else 'Unknown')
-            source = getattr(info, 'source', '') if hasattr(info, 'source') else (info.get('source', '') if isinstance(info, dict) else '')
-            # 新版为 save_path, 旧版字典可能是 file_path
-            file_path = getattr(info, 'save_path', '') if hasattr(info, 'save_path') else (info.get('file_path', '') if isinstance(info, dict) else '')
-            
-            # 1. 检查格式是否为 mp4
-            if not file_path or not str(file_path).lower().endswith('.mp4'):
-                logger.info(f"跳过非mp4资源: {title} - {file_path}")
-                continue
-                
-            # 2. 检查路径是否包含指定的来源关键字，新版本直接检查 source 属性
-            is_allowed_source = False
-            if source in allowed_sources:
-                is_allowed_source = True
-            else:
-                for s in allowed_sources:
-                    if s in str(file_path) or s in str(source):
-                        is_allowed_source = True
-                        break
-            
-            if not is_allowed_source:
-                logger.debug(f"跳过非指定来源资源: {title} - {file_path} - {source}")
-                continue
-                
-            filtered_video_infos.append(info)
-        
-        if not filtered_video_infos:
-            logger.info("没有找到有效的 MP4 视频资源（且来源合法），跳过下载。")
-            return
+        file_paths = await VIDEO_FLIGHTS.do(await canonical_key(url), lambda: _download_videos(url))
 
-        # 4. 下载
-        logger.info(f"正在下载 {len(filtered_video_infos)} 个视频...")
-        downloaded_infos = await loop.run_in_executor(None, client.download, filtered_video_infos)
-        
-        if downloaded_infos is None:
-            downloaded_infos = filtered_video_infos
-
-        # 5. 收集下载后的文件路径并发送
-        for info in downloaded_infos:
-            file_path = getattr(info, 'save_path', '') if hasattr(info, 'save_path') else (info.get('file_path', '') if isinstance(info, dict) else '')
-            if file_path and os.path.exists(file_path):
-                renamed_file_path = _rename_downloaded_video(file_path)
-                _set_video_info_path(info, renamed_file_path)
-                file_path = renamed_file_path
-                logger.info(f"视频下载完成，准备发送: {file_path}")
+        for file_path in file_paths or []:
+            if os.path.exists(file_path):
+                logger.info(f"准备发送视频: {file_path}")
                 await dd_sender.send_video(file_path)
             else:
                 logger.error(f"视频文件不存在: {file_path}")
@@ -146,20 +217,39 @@ async def process_video_task(url: str, dd_sender):
     except Exception as e:
         logger.error(f"视频处理任务异常: {e}")
 
-async def capture_screenshot(source_content: str) -> Optional[str]:
+async def _release_claims(url_key: Optional[str], near_dup_id: Optional[int]):
+    """
+    释放占用但最终未发送的 URL 和近似重复记录。
+    """
+    if url_key:
+        await release_claimed_url(url_key)
+    await release_claimed_text(near_dup_id)
+
+
+async def _mark_sent(url_key: Optional[str], author: str):
+    """
+    发送成功后标记 URL 和作者已处理；URL 使用占用时的同一个规范化 key，占用和标记的 key 始终一致。
+    """
+    if url_key:
+        await mark_url_as_processed(url_key)
+    await mark_username_as_processed(author)
+
+
+async def capture_screenshot(url: Optional[str]) -> Optional[str]:
     """
     独立封装的截图逻辑。
-    从提供的文本中提取 URL 并进行截图。
-    返回截图路径，如果未找到 URL 或截图失败则返回 None。
+    对消息中提取出的 URL 进行截图。
+    返回截图路径，如果 URL 为空或截图失败则返回 None。
     """
-    urls = global_config.URL_PATTERN.findall(source_content)
-    if urls:
-        url = urls[0]
+    if url:
         logger.info("🚀 关键词匹配成功，准备截图 URL: {}", url)
         from src.utils.playwright_utils import PlaywrightIpChecker
         checker = PlaywrightIpChecker()
-        # 强制截图模式，使用项目截图目录，便于清理器管理
-        data = await checker.process_any_url(url, force_screenshot_only=True, use_temp_file=False)
+        # 强制截图模式，使用项目截图目录，便于清理器管理 (同一作品并发截图时共用一张)
+        data = await SCREENSHOT_FLIGHTS.do(
+            await canonical_key(url),
+            lambda: checker.process_any_url(url, force_screenshot_only=True, use_temp_file=False),
+        )
         if data and data.get("screenshot_path"):
             return data["screenshot_path"]
     return None
@@ -170,52 +260,58 @@ async def capture_screenshot(source_content: str) -> Optional[str]:
 # --------------------------------------------------------------------------------------
 
 @timeit(log_level="INFO")
-async def async_process_message(msg_data: dict, chat, dd_sender):
+async def async_process_message(message: NormalizedMessage, chat, dd_sender, hook_target: Optional[str] = None,
+                                rule_set: str = "shenyang"):
     """
     异步处理核心逻辑 (并行优化版)
-    """
-    content_xml = msg_data.get("content_xml") or {}
-    msg_node = content_xml.get("msg") or {}
-    quote_title = msg_node.get("title") or (msg_node.get("appmsg") or {}).get("title")
-    quote_refer_content = (msg_node.get("refermsg") or {}).get("content") or (msg_node.get("appmsg") or {}).get("refermsg", {}).get("content")
-    real_content = msg_data.get("real_content")
 
-    msg_type = 'quote' if quote_title else 'text'
-    msg_content = str(quote_title) if quote_title else str(real_content)
-    msg_quote_content = str(quote_refer_content or "") if quote_title else ""
+    :param message: 接收时已归一化的消息，URL 空格修复等预处理已在归一化时完成
+    :param hook_target: 未使用本地发送器时，钉钉 Hook 的接收目标 ID (来自消息所在群聊的路由)
+    :param rule_set: 消息所在群聊路由使用的关键词规则集
+    """
+    # 取一次规则快照，处理过程中规则热更新也不影响这条消息
+    rules = global_config.RULES.get(rule_set)
+    msg_type = message.msg_type
+    msg_content = message.text
+    msg_quote_content = message.quote
 
     # 消息预处理
     if msg_type == 'quote':
         if not msg_quote_content: 
             logger.warning("引用消息内容为空: {}", msg_content)
             return
-        msg_quote_content = msg_quote_content.replace("https:// ", "https://").replace("http:// ", "https://")
-        
+
         # 如果是引用消息则直接判断关键词返回即可
-        if check_keyword(msg_type, msg_content, msg_quote_content):
+        ctx = decision_context(message, rules, msg_content, scan_text(msg_content, rules))
+        if await DECISION_PLAN.decide(ctx):
             logger.info("✅ 规则匹配：关键词")
             # 构建最终消息文本
-            cleaned_quote = msg_cleaner(msg_quote_content)
+            cleaned_quote = msg_cleaner(msg_quote_content, rules=rules)
             final_text = msg_restructure(quote_content=cleaned_quote, msg_content=msg_content)
             
             if dd_sender is None:
-                await send_to_dd(msg=final_text)
+                sent = await send_to_dd(msg=final_text, target=hook_target)
             else:
                 await dd_sender.send(final_text)
+                sent = True
+            # 引用的作品也记为已发送，之后单独转发同一作品的消息不再重复发送
+            if sent and global_config.SYSTEM_ENV == 'prod':
+                await _mark_sent(await canonical_key(message.urls[0]) if message.urls else None,
+                                 parse_share(msg_quote_content).author)
             
             # 关键词命中后，直接在当前协程/任务中顺序执行后续逻辑
-            if dd_sender and msg_quote_content:
+            if dd_sender and message.urls:
+                quote_url = message.urls[0]
                 # 1. 截图并补发图文消息
-                img_path = await capture_screenshot(msg_quote_content)
-                if img_path:
-                    logger.info("🖼️ 关键词落查截图已生成，开始补发图文消息。")
-                    await dd_sender.send_mixed(final_text, img_path)
+                if not _past_deadline(message, "screenshot"):
+                    img_path = await capture_screenshot(quote_url)
+                    if img_path:
+                        logger.info("🖼️ 关键词落查截图已生成，开始补发图文消息。")
+                        await dd_sender.send_mixed(final_text, img_path)
 
-                # 2. 提取 URL 并触发视频下载任务
-                quote_url_match = global_config.URL_PATTERN.search(msg_quote_content)
-                if quote_url_match:
-                    video_url = quote_url_match.group(0)
-                    await process_video_task(video_url, dd_sender)
+                # 2. 触发视频下载任务
+                if not _past_deadline(message, "video"):
+                    await process_video_task(quote_url, dd_sender)
 
         return
 
@@ -223,220 +319,185 @@ async def async_process_message(msg_data: dict, chat, dd_sender):
         if not msg_content: 
             logger.warning("文本消息内容为空")
             return
-        msg_content = msg_content.replace("https:// ", "https://").replace("http:// ", "https://").replace("http://", "https://")
-        username = extract_author(msg_content)
-        msg_content = msg_cleaner(msg_content)
+        # 归一化时已解析过同一段文本，这里直接取缓存的作者
+        username = parse_share(msg_content).author
+        msg_content = msg_cleaner(msg_content, rules=rules)
 
-        url_match = global_config.URL_PATTERN.search(msg_content)
-        url_string = url_match.group(0) if url_match else None
+        # 清理后的文本只扫描一次，URL、关键词、过滤词、IP 检测都读取同一份扫描结果
+        scan = scan_text(msg_content, rules)
+        url_string = scan.url
+        # 本条消息占用的 URL 去重 key，只在生产环境去重时解析 (短链接可能需要访问网络)
+        url_key = None
 
         username_has_processed = await is_username_processed(username)
-        url_claimed = False
+        near_dup_id = None
         if global_config.SYSTEM_ENV == 'prod' and msg_type == 'text':
             if url_string:
-                url_claimed = await claim_url_if_not_processed(url_string)
-                if not url_claimed:
-                    logger.info("该 URL 已被处理，跳过: {}", url_string)
+                # 同一作品的短链接、不同分享链接使用同一个去重 key
+                url_key = await canonical_key(url_string)
+                if not await claim_url_if_not_processed(url_key):
+                    logger.info("该 URL 已被处理，跳过: {} ({})", url_string, url_key)
                     return
             elif username and username_has_processed:
                 logger.info("该 用户名 已被处理，跳过: {}", username)
                 return
+            # 链接不同但内容相同的转发 (换了前缀、删掉单位名、加了表情)，只与命中同一关键词的消息比较
+            keyword = scan.keyword()
+            text_claimed, near_dup_id = await claim_text_if_not_near_duplicate(
+                msg_content, label=url_key or url_string or username or "", group=keyword.value if keyword else "")
+            if not text_claimed:
+                await _release_claims(url_key, None)
+                return
 
-        # 方案 A：简单串行
-        if check_keyword(msg_type, msg_content, ""):
+        # 按决策规则判断：廉价条件优先，只有关键词未命中时才会进行浏览器 IP 检查
+        ctx = decision_context(message, rules, msg_content, scan, author=username)
+        decision = await DECISION_PLAN.decide(ctx)
+
+        if decision and decision.action == "keyword":
             logger.info("✅ 关键词检查命中，处理完成。")
             
             # 组装清理后的最终文本
-            cleaned_text = msg_cleaner(msg_content)
+            cleaned_text = msg_cleaner(msg_content, rules=rules)
             final_text = msg_restructure(msg_content=cleaned_text)
             
-            # 触发截图
-            img_path = await capture_screenshot(msg_content)
+            # 触发截图 (消息超过时效时降级为纯文本发送)
+            img_path = None
+            if url_string and not _past_deadline(message, "screenshot"):
+                img_path = await capture_screenshot(url_string)
             
             try:
                 if dd_sender is None:
-                    await send_to_dd(msg=final_text)
+                    sent = await send_to_dd(msg=final_text, target=hook_target)
                 else:
                     if img_path:
                         await dd_sender.send_mixed(final_text, img_path)
                     else:
                         await dd_sender.send(final_text)
+                    sent = True
             except Exception:
-                if url_claimed and url_string:
-                    await release_claimed_url(url_string)
+                await _release_claims(url_key, near_dup_id)
                 raise
+            if not sent:
+                await _release_claims(url_key, near_dup_id)
+                return
+            await _mark_sent(url_key, username)
             
-            if dd_sender and url_string:
+            if dd_sender and url_string and not _past_deadline(message, "video"):
                 await process_video_task(url_string, dd_sender)
 
             return
 
-        # 如果关键词没命中，且有 URL，再进行 IP 检查
-        if url_string:
-            # IP 检查同样需要使用带有完整 URL 的原文
-            ip_result = await ip_should_sent(msg_content)
+        # 如果关键词没命中，且有 URL，IP 检查的结果满足规则 (消息超过时效时不会进行 IP 检查)
+        if decision and decision.action == "ip_address":
+            ip_result = ctx.stage_results["ip_check"]
             if ip_result:
                 logger.info("✅ URL处理命中，处理完成。")
                 
-                cleaned_msg_text = msg_cleaner(msg_content)
+                cleaned_msg_text = msg_cleaner(msg_content, rules=rules)
                 final_msg = msg_restructure(msg_content=cleaned_msg_text)
                 img_path = ip_result.get('screenshot_path')
                 
                 try:
                     if dd_sender is None:
-                        await send_to_dd(msg=final_msg)
+                        sent = await send_to_dd(msg=final_msg, target=hook_target)
                     else:
                         await dd_sender.send_mixed(final_msg, img_path)
+                        sent = True
                 except Exception:
-                    if url_claimed and url_string:
-                        await release_claimed_url(url_string)
+                    await _release_claims(url_key, near_dup_id)
                     raise
+                if not sent:
+                    await _release_claims(url_key, near_dup_id)
+                    return
+                await _mark_sent(url_key, username)
                 
                 # 启动视频处理任务
-                if url_string:
+                if url_string and not _past_deadline(message, "video"):
                     await process_video_task(url_string, dd_sender)
 
                 return
                 
-        if url_claimed and url_string:
-            await release_claimed_url(url_string)
+        await _release_claims(url_key, near_dup_id)
 
     logger.info("所有检查已完成，未匹配任何规则。")
     return
 
 
-def check_keyword(msg_type: str, msg_content: str, msg_quote_content: str) -> bool:
-    is_quote_msg = msg_type == 'quote'
+async def fetch_ip_info(msg_content: str, scan: ScanResult) -> Optional[dict]:
+    """
+    通过浏览器访问消息中的链接，提取 IP 属地和截图。
+    返回：访问成功返回包含信息的字典，否则返回 None
+    """
+    logger.debug("触发 [IP检测] 逻辑, msg: {}", msg_content.replace("\n", " ")[:100])
+    # 尝试提取 URL
+    urls = scan.ip_urls
+    if not urls:
+        return None
+
+    url = urls[0] # 取第一个URL
+    logger.debug("提取到URL: {}", url)
+
+    # 使用新的 Playwright 工具获取信息
+    from src.utils.playwright_utils import PlaywrightIpChecker
+    checker = PlaywrightIpChecker()
 
-    # ----------- 情况一：处理引用消息 -----------
-    if is_quote_msg:
-        original_content = msg_quote_content
-        cite_msg = msg_content
+    # 直接调用统一入口，不区分平台；同一作品并发检查时共用一次浏览器访问的结果
+    return await IP_CHECK_FLIGHTS.do(await canonical_key(url), lambda: checker.process_any_url(url))
 
-        logger.debug(
-            "处理引用消息: [引用内容] " + original_content.replace('\n', ' ')[:100] + "... -> [回复] {}", cite_msg)
-        # 引用消息不用管原消息内容, 只需要检查引用消息内容是否有关键字
-        found_keyword = None
-        # 优先检查车次
-        train_match = global_config.SHENYANG_TRAIN.search(cite_msg)
-        if train_match:
-            found_keyword = train_match.group(0)
-            logger.debug("引用回复内容匹配到 [车次] 关键词: '{}'", found_keyword)
-        else:
-            # 如果没有车次，再检查站点
-            station_match = global_config.SHENYANG_STATION.search(cite_msg)
-            if station_match:
-                found_keyword = station_match.group(0)
-                logger.debug("引用回复内容匹配到 [站点] 关键词: '{}'", found_keyword)
-
-        # 如果两个都没匹配到，则返回
-        if not found_keyword:
-            logger.info("引用回复内容关键词校验未通过")
-            return False
-        return True
-
-    # ----------- 情况二：处理普通文本消息 -----------
-    else:
-        message = msg_content
-        logger.debug("处理普通文本消息: {}", message.replace("\n", " "))
-
-        # 核心逻辑1: URL 校验, 判断消息内是否有 URL 链接
-        url_result = global_config.URL_PATTERN.search(message)
-        if not url_result or global_config.SHENYANG_FILTER.search(message):
-            logger.debug('普通文本消息 url_result 校验未通过')
-            return False
-        logger.debug("普通文本消息 url_result 校验通过: {}", url_result.group(0))
-
-        # 核心逻辑2: 检查关键词
-
-        # ======================= [分开检查并记录关键词] =======================
-        found_keyword = None
-        # 优先检查车次
-        train_match = global_config.SHENYANG_TRAIN.search(message)
-        if train_match:
-            found_keyword = train_match.group(0)
-            logger.debug("匹配到 [车次] 关键词: '{}'", found_keyword)
-        else:
-            # 如果没有车次，再检查站点
-            station_match = global_config.SHENYANG_STATION.search(message)
-            if station_match:
-                found_keyword = station_match.group(0)
-                logger.debug("匹配到 [站点] 关键词: '{}'", found_keyword)
-
-        # 如果两个都没匹配到，则返回
-        if not found_keyword:
-            logger.info('普通文本消息 SHENYANG_TRAIN 和 SHENYANG_STATION 校验未通过')
-            return False
-        return True
-
-def msg_cleaner(msg_content: str) -> str:
-    """
-    消息清理
 
-    :param msg_content: 需要清理的消息内容
+async def checked_ip_info(msg_content: str, scan: ScanResult, rules: RuleSet, author: str = "") -> Optional[dict]:
     """
-    # 清理msg中需要用SHENYANG_DELETE清理掉的内容
-    cleaned_message = global_config.SHENYANG_DELETE.sub('', msg_content)
-    # 第二步：按行切分，去除空行（包括只含空格或被清空后的行）
-    cleaned_lines = []
-    for line in cleaned_message.splitlines():
-        stripped = line.strip()
-        if stripped:  # 只保留非空行
-            cleaned_lines.append(stripped)
-    formatted_msg = "\n".join(cleaned_lines)
-    if cleaned_message != msg_content:
-        logger.debug("☑️ 检测到 SHENYANG_DELETE 内容替换，原始文本已被删减为:\n{}", formatted_msg)
-    else:
-        logger.info("✅ 未检测到需要替换的敏感词内容。")
-    # 第四步：重组消息
-    return formatted_msg
-
-def msg_restructure(msg_content: str, quote_content: Optional[str] = None) -> str:
+    带未命中结果缓存的 fetch_ip_info：近期检查过、IP 属地不在 rules 地址列表中 (或提取失败) 的链接或作者，
+    直接返回记录的结果，不再访问浏览器；本次检查未命中时记录结果。
     """
-    消息重构
-
-    :param msg_content: 发出的内容，或者回复的内容（引用） A 引用了 B 的消息, msg_content = A
-    :param quote_content: 被引用的消息内容. A 引用了 B 的消息, quote_content = B
-    """
-    if quote_content:
-        restructured_msg = f'{global_config.SENDER_NAME}\n落查：' + msg_content + '\n' + quote_content
-    else:
-        restructured_msg = f'{global_config.SENDER_NAME}\n' + msg_content
-    return restructured_msg
-
-async def ip_should_sent(msg_content) -> Optional[dict]:
+    urls = scan.ip_urls
+    if not global_config.IP_VERDICT_CACHE_ENABLED or not urls:
+        return await fetch_ip_info(msg_content, scan)
+
+    url_key = await canonical_key(urls[0])
+    platform = parse_share(msg_content).platform
+    author_key = f"{platform}:{author}" if author and platform else ""
+    hit, cached = IP_VERDICTS.lookup(url_key, author_key)
+    # 记录的 IP 属地按当前地址列表重新判断，规则更新后命中的不使用缓存
+    if hit and not ip_address_matched(cached, rules.address_list):
+        logger.info("近期已检查过该链接/作者 (IP 属地: {})，跳过浏览器访问: {}",
+                    cached.get("true_address") if cached else "提取失败", urls[0])
+        return cached
+
+    data = await fetch_ip_info(msg_content, scan)
+    if not ip_address_matched(data, rules.address_list):
+        IP_VERDICTS.record(url_key, author_key, data)
+    return data
+
+
+async def ip_should_sent(msg_content, scan: Optional[ScanResult] = None, rules: Optional[RuleSet] = None) -> Optional[dict]:
     """
     IP检测逻辑
     返回：如果匹配成功，返回包含信息的字典；如果不匹配，返回 None
+
+    :param scan: msg_content 的规则扫描结果，不传时在这里扫描
+    :param rules: 使用的规则集 (IP 属地列表)，不传时使用默认规则集
     """
+    if rules is None:
+        rules = global_config.RULES.get()
     # 关键词检查保留，作为快速过滤器
-    keywords = ["xhs", "douyin", "weibo", "xiaohongshu", "kuaishou", "toutiao"]
-    if any(keyword in msg_content for keyword in keywords):
-        logger.debug("触发 [IP检测] 逻辑, msg: {}", msg_content.replace("\n", " ")[:100])
-        # 尝试提取 URL
-        urls = global_config.IP_PATTERN.findall(msg_content)
-        if not urls:
-            return None
-        
-        url = urls[0] # 取第一个URL
-        logger.debug("提取到URL: {}", url)
-        
-        # 使用新的 Playwright 工具获取信息
-        from src.utils.playwright_utils import PlaywrightIpChecker
-        checker = PlaywrightIpChecker()
+    if not any(keyword in msg_content for keyword in IP_CHECK_KEYWORDS):
+        return None
+    data = await checked_ip_info(msg_content, scan or scan_text(msg_content, rules), rules)
+    # 返回完整数据对象，包含截图路径
+    return data if ip_address_matched(data, rules.address_list) else None
 
-        # 直接调用统一入口，不区分平台
-        data = await checker.process_any_url(url)
 
-        if data is None:
-            return None
+# --------------------------------------------------------------------------------------
+# 决策规则
+# --------------------------------------------------------------------------------------
 
-        # 1. 如果提取到了 IP (requires_ip 的平台)，必须匹配地址列表
-        if data.get('true_address'):
-            if data['true_address'] in global_config.ADDRESS_LIST:
-                logger.info("IP地址匹配成功: {}", data['true_address'])
-                return data # 返回完整数据对象，包含截图路径
-            else:
-                logger.debug("IP地址不匹配: {}", data['true_address'])
-                return None
-        return None
+# 耗时阶段: 消息超过时效时不再进行
+DECISION_STAGES = {
+    "ip_check": StageSpec(
+        run=lambda ctx: checked_ip_info(ctx.text, ctx.scan, ctx.rules, author=ctx.author),
+        gate=lambda ctx: not _past_deadline(ctx.message, "ip_check"),
+    ),
+}
+
+DECISION_PLAN = DecisionPlan(DECISION_RULES, DECISION_CONDITIONS, DECISION_STAGES)
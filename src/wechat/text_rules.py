@@ -0,0 +1,236 @@
+"""
+消息文本规则：关键词判断、消息清理、消息重构和决策规则定义。
+
+只依赖规则数据和纯文本处理，不引入浏览器、钉钉发送、视频下载等依赖，
+可供离线评估工具 (tools/bulk_eval.py) 在多进程中直接使用。
+"""
+from typing import Optional
+
+from loguru import logger
+
+from src.config import global_config
+from src.utils.rule_engine import ConditionSpec, DecisionContext
+from src.utils.rule_memo import RuleMemo
+from src.utils.rule_registry import RuleSet
+from src.utils.rule_scanner import ScanResult
+from src.utils.share_parser import parse_share
+from src.wechat.message import NormalizedMessage
+
+
+# 触发 IP 检测的平台关键词
+IP_CHECK_KEYWORDS = ("xhs", "douyin", "weibo", "xiaohongshu", "kuaishou", "toutiao")
+
+# 按文本内容缓存扫描、清理、关键词判断的结果，同一条消息被转发到多个群时不重复计算
+RULE_MEMO = RuleMemo(max_size=global_config.RULE_MEMO_MAX_SIZE)
+
+
+def scan_text(text: str, rules: RuleSet) -> ScanResult:
+    """
+    对文本做一次规则扫描，结果按文本内容缓存。
+    """
+    return RULE_MEMO.get_or_compute(rules, "scan", text, lambda: rules.scanner.scan(text))
+
+
+def classify_message(message: NormalizedMessage, rule_set: str = "shenyang") -> str:
+    """
+    入队前粗略判断消息的处理价值，决定进入任务队列的哪个优先级通道:
+    high:   引用回复或普通文本命中车次/站点关键词，需要尽快发送
+    low:    未命中关键词、只能走 IP 检测的链接，需要占用浏览器且大多不会发送
+    normal: 其他消息 (通常很快就会被规则丢弃)
+
+    这里只用于调度，不打印日志；是否发送仍以 async_process_message 中的完整检查为准。
+
+    :param rule_set: 消息所在群聊路由使用的关键词规则集
+    """
+    rules = global_config.RULES.get(rule_set)
+    if message.is_quote:
+        return "high" if scan_text(message.text, rules).keyword() else "normal"
+
+    if not message.urls:
+        return "normal"
+    scan = scan_text(message.text, rules)
+    if not scan.has("filter") and scan.keyword():
+        return "high"
+    if any(keyword in message.text for keyword in IP_CHECK_KEYWORDS):
+        return "low"
+    return "normal"
+
+
+def check_keyword(msg_type: str, msg_content: str, msg_quote_content: str, scan: Optional[ScanResult] = None,
+                  rules: Optional[RuleSet] = None) -> bool:
+    """
+    :param scan: msg_content 的规则扫描结果，不传时在这里扫描
+    :param rules: 使用的规则集，不传时使用默认规则集
+    """
+    if rules is None:
+        rules = global_config.RULES.get()
+    # 判断结果只取决于消息类型和 msg_content，按内容缓存
+    return RULE_MEMO.get_or_compute(
+        rules, "keyword:" + msg_type, msg_content,
+        lambda: _check_keyword(msg_type, msg_content, msg_quote_content, scan or scan_text(msg_content, rules)),
+    )
+
+
+def _check_keyword(msg_type: str, msg_content: str, msg_quote_content: str, scan: ScanResult) -> bool:
+    is_quote_msg = msg_type == 'quote'
+
+    # ----------- 情况一：处理引用消息 -----------
+    if is_quote_msg:
+        original_content = msg_quote_content
+        cite_msg = msg_content
+
+        logger.debug(
+            "处理引用消息: [引用内容] " + original_content.replace('\n', ' ')[:100] + "... -> [回复] {}", cite_msg)
+        # 引用消息不用管原消息内容, 只需要检查引用消息内容是否有关键字
+        found_keyword = None
+        # 优先检查车次
+        train_match = scan.first("train")
+        if train_match:
+            found_keyword = train_match.value
+            logger.debug("引用回复内容匹配到 [车次] 关键词: '{}'", found_keyword)
+        else:
+            # 如果没有车次，再检查站点
+            station_match = scan.first("station")
+            if station_match:
+                found_keyword = station_match.value
+                logger.debug("引用回复内容匹配到 [站点] 关键词: '{}'", found_keyword)
+
+        # 如果两个都没匹配到，则返回
+        if not found_keyword:
+            logger.info("引用回复内容关键词校验未通过")
+            return False
+        return True
+
+    # ----------- 情况二：处理普通文本消息 -----------
+    else:
+        message = msg_content
+        logger.debug("处理普通文本消息: {}", message.replace("\n", " "))
+
+        # 核心逻辑1: URL 校验, 判断消息内是否有 URL 链接
+        url_result = scan.first("url")
+        if not url_result or scan.has("filter"):
+            logger.debug('普通文本消息 url_result 校验未通过')
+            return False
+        logger.debug("普通文本消息 url_result 校验通过: {}", url_result.value)
+
+        # 核心逻辑2: 检查关键词
+
+        # ======================= [分开检查并记录关键词] =======================
+        found_keyword = None
+        # 优先检查车次
+        train_match = scan.first("train")
+        if train_match:
+            found_keyword = train_match.value
+            logger.debug("匹配到 [车次] 关键词: '{}'", found_keyword)
+        else:
+            # 如果没有车次，再检查站点
+            station_match = scan.first("station")
+            if station_match:
+                found_keyword = station_match.value
+                logger.debug("匹配到 [站点] 关键词: '{}'", found_keyword)
+
+        # 如果两个都没匹配到，则返回
+        if not found_keyword:
+            logger.info('普通文本消息车次和站点关键词校验未通过')
+            return False
+        return True
+
+def msg_cleaner(msg_content: str, rules: Optional[RuleSet] = None) -> str:
+    """
+    消息清理
+
+    :param msg_content: 需要清理的消息内容
+    :param rules: 使用的规则集，不传时使用默认规则集
+    """
+    if rules is None:
+        rules = global_config.RULES.get()
+    return RULE_MEMO.get_or_compute(rules, "clean", msg_content, lambda: _clean_message(msg_content, rules))
+
+
+def _clean_message(msg_content: str, rules: RuleSet) -> str:
+    # 清理msg中需要用清理规则 (delete.txt) 清理掉的内容，按行执行，结果与整条消息执行原正则一致
+    cleaned_message = rules.cleaner.clean(msg_content)
+    # 第二步：按行切分，去除空行（包括只含空格或被清空后的行）
+    cleaned_lines = []
+    for line in cleaned_message.splitlines():
+        stripped = line.strip()
+        if stripped:  # 只保留非空行
+            cleaned_lines.append(stripped)
+    formatted_msg = "\n".join(cleaned_lines)
+    if cleaned_message != msg_content:
+        logger.debug("☑️ 检测到清理规则内容替换，原始文本已被删减为:\n{}", formatted_msg)
+    else:
+        logger.info("✅ 未检测到需要替换的敏感词内容。")
+    # 第四步：重组消息
+    return formatted_msg
+
+def msg_restructure(msg_content: str, quote_content: Optional[str] = None) -> str:
+    """
+    消息重构
+
+    :param msg_content: 发出的内容，或者回复的内容（引用） A 引用了 B 的消息, msg_content = A
+    :param quote_content: 被引用的消息内容. A 引用了 B 的消息, quote_content = B
+    """
+    if quote_content:
+        restructured_msg = f'{global_config.SENDER_NAME}\n落查：' + msg_content + '\n' + quote_content
+    else:
+        restructured_msg = f'{global_config.SENDER_NAME}\n' + msg_content
+    return restructured_msg
+
+
+def ip_address_matched(data: Optional[dict], address_list) -> bool:
+    """
+    提取到了 IP (requires_ip 的平台) 时，判断是否在地址列表中
+    """
+    if not data or not data.get('true_address'):
+        return False
+    if data['true_address'] in address_list:
+        logger.info("IP地址匹配成功: {}", data['true_address'])
+        return True
+    logger.debug("IP地址不匹配: {}", data['true_address'])
+    return False
+
+
+# --------------------------------------------------------------------------------------
+# 决策规则
+# --------------------------------------------------------------------------------------
+
+def decision_context(message: NormalizedMessage, rules: RuleSet, text: str, scan: ScanResult, author: str = "") -> DecisionContext:
+    """
+    :param text: 参与规则判断的文本 (普通消息为清理后的正文，引用消息为回复内容)
+    :param scan: text 的规则扫描结果
+    """
+    return DecisionContext(message=message, msg_type=message.msg_type, room=message.room, text=text,
+                           quote=message.quote, scan=scan, rules=rules, author=author)
+
+
+def _platform(ctx: DecisionContext) -> str:
+    return parse_share(ctx.text).platform
+
+
+# 条件定义: 名称 -> (代价, 判断函数工厂, 依赖的耗时阶段)
+DECISION_CONDITIONS = {
+    "msg_type": ConditionSpec(0, lambda value: lambda ctx: ctx.msg_type == value),
+    "room_in": ConditionSpec(0, lambda rooms: lambda ctx: ctx.room in rooms),
+    "author_in": ConditionSpec(1, lambda authors: lambda ctx: bool(ctx.author) and ctx.author in authors),
+    "platform_in": ConditionSpec(2, lambda platforms: lambda ctx: _platform(ctx) in platforms),
+    "has_url": ConditionSpec(2, lambda value: lambda ctx: bool(ctx.scan.url) == value),
+    "text_contains_any": ConditionSpec(2, lambda words: lambda ctx: any(word in ctx.text for word in words)),
+    "keyword": ConditionSpec(3, lambda value: lambda ctx: check_keyword(
+        ctx.msg_type, ctx.text, ctx.quote, scan=ctx.scan, rules=ctx.rules) == value),
+    # IP 属地在规则集的 address.txt 中 (配置值为 None 时) 或在配置的列表中，需要浏览器访问链接
+    "ip_address_in": ConditionSpec(100, lambda addresses: lambda ctx: ip_address_matched(
+        ctx.stage_results["ip_check"], ctx.rules.address_list if addresses is None else addresses), stage="ip_check"),
+}
+
+# 按优先级排列的决策规则，action 决定命中后的发送方式
+DECISION_RULES = (
+    # 引用回复内容命中车次/站点关键词
+    {"name": "quote_keyword", "action": "keyword", "when": {"msg_type": "quote", "keyword": True}},
+    # 普通消息带链接、无过滤词，并命中车次/站点关键词
+    {"name": "text_keyword", "action": "keyword", "when": {"msg_type": "text", "keyword": True}},
+    # 关键词未命中的平台链接，访问后 IP 属地在关注地区
+    {"name": "text_ip_address", "action": "ip_address", "when": {
+        "msg_type": "text", "has_url": True, "text_contains_any": IP_CHECK_KEYWORDS, "ip_address_in": None,
+    }},
+)
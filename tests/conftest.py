@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接从仓库根目录导入 src 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """
+    可手动拨动的时钟，替换被测模块中的 time 模块 (time() 与 monotonic() 同步前进)。
+    """
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from src.utils import bloom_filter, dedup_store
+from src.utils.bloom_filter import RotatingBloomFilter
+from src.utils.dedup_store import DedupStore
+
+
+@pytest.fixture(autouse=True)
+def fake_time(clock, monkeypatch):
+    monkeypatch.setattr(bloom_filter, "time", clock)
+    monkeypatch.setattr(dedup_store, "time", clock)
+
+
+def test_add_and_query():
+    bloom = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    keys = [f"url-{n}" for n in range(500)]
+    for key in keys:
+        bloom.add(key)
+    # 超出容量后自动扩容，加入过的 key 不会漏判
+    assert all(bloom.might_contain(key) for key in keys)
+    false_positives = sum(bloom.might_contain(f"other-{n}") for n in range(2000))
+    assert false_positives < 20
+
+
+def test_buckets_rotate_out(clock):
+    bloom = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    bloom.add("old")
+    clock.advance(20)
+    bloom.add("new")
+    assert bloom.might_contain("old")
+    assert bloom.stats()["buckets"] == 2
+
+    # 加入 old 的时间段超出保留范围：查询不再命中，写入新时间段时整段丢弃
+    clock.advance(10)
+    assert not bloom.might_contain("old")
+    bloom.add("newer")
+    assert bloom.might_contain("new")
+    assert bloom.stats()["buckets"] == 2
+
+
+def test_added_before(clock):
+    bloom = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    bloom.add("a")
+    assert not bloom.might_contain("a", added_before=clock.now - 10)
+    clock.advance(11)
+    assert bloom.might_contain("a", added_before=clock.now - 10)
+
+
+def test_add_with_timestamp(clock):
+    bloom = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    bloom.add("recent", timestamp=clock.now - 10)
+    bloom.add("expired", timestamp=clock.now - 30)
+    assert bloom.might_contain("recent", added_before=clock.now - 5)
+    assert not bloom.might_contain("expired")
+
+
+def test_save_and_open(tmp_path, clock):
+    bloom = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    bloom.open(str(tmp_path))
+    bloom.add("old")
+    clock.advance(10)
+    bloom.add("new")
+    bloom.save()
+    assert len(list(tmp_path.glob("*.bloom"))) == 2
+
+    reopened = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    assert reopened.open(str(tmp_path)) == 2
+    assert reopened.might_contain("old") and reopened.might_contain("new")
+
+    # 过期时间段的文件在加载时删除
+    clock.advance(20)
+    reopened = RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)
+    assert reopened.open(str(tmp_path)) == 1
+    assert not reopened.might_contain("old")
+    assert len(list(tmp_path.glob("*.bloom"))) == 1
+
+
+def test_dedup_store_remembers_urls_past_ttl(tmp_path, clock):
+    def open_store() -> DedupStore:
+        store = DedupStore(ttl_seconds={"url": 10.0},
+                           blooms={"url": RotatingBloomFilter(bucket_seconds=10, buckets=3, capacity=100)})
+        store.open(str(tmp_path / "dedup.sqlite3"), bloom_dir=str(tmp_path / "bloom"))
+        return store
+
+    store = open_store()
+    store.mark("url", "a")
+    # 过期时间内以精确记录为准：释放后可以重新占用
+    assert store.claim("url", "b")
+    store.release("url", "b")
+    assert store.claim("url", "b")
+    asyncio.run(store.close())
+
+    clock.advance(15)
+    store = open_store()
+    assert store.contains("url", "a")
+    assert store.stats()["bloom_hits"] == 1
+    assert store.claim("url", "c")
+
+    # 超出 Bloom 过滤器的保留期后可以重新转发
+    clock.advance(30)
+    assert not store.contains("url", "a")
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from src.utils import dedup_store
+from src.utils.dedup_store import DedupStore
+
+
+TTL = {"url": 100.0, "username": 10.0}
+
+
+@pytest.fixture
+def db_path(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(dedup_store, "time", clock)
+    return str(tmp_path / "data" / "dedup.sqlite3")
+
+
+def open_store(path: str, **kwargs) -> DedupStore:
+    store = DedupStore(ttl_seconds=TTL, **kwargs)
+    store.open(path)
+    return store
+
+
+def test_claim_and_release(db_path):
+    store = open_store(db_path)
+    assert store.claim("url", "a")
+    assert not store.claim("url", "a")
+    # 不同类别互不影响
+    assert store.claim("username", "a")
+    store.release("url", "a")
+    assert not store.contains("url", "a")
+    assert store.claim("url", "a")
+
+
+def test_claim_is_not_persisted(db_path):
+    store = open_store(db_path)
+    assert store.claim("url", "a")
+    asyncio.run(store.close())
+
+    store = open_store(db_path)
+    assert not store.contains("url", "a")
+
+
+def test_mark_persists_across_reopen(db_path):
+    store = open_store(db_path)
+    store.mark("url", "a")
+    store.mark("username", "")
+    # 提交前已在待写缓冲中
+    assert store.stats()["pending"] == 1
+    asyncio.run(store.close())
+
+    store = open_store(db_path)
+    assert store.contains("url", "a")
+    assert store.stats()["db_hits"] == 1
+    assert not store.claim("url", "a")
+
+
+def test_mark_expires_after_ttl(db_path, clock):
+    store = open_store(db_path)
+    store.mark("url", "a")
+    store.mark("username", "b")
+    store.flush()
+    clock.advance(50)
+    assert store.contains("url", "a")
+    assert not store.contains("username", "b")
+    clock.advance(51)
+    assert not store.contains("url", "a")
+    assert store.claim("url", "a")
+
+
+def test_expired_rows_are_purged_on_open(db_path, clock):
+    store = open_store(db_path)
+    store.mark("url", "a")
+    asyncio.run(store.close())
+
+    clock.advance(101)
+    store = open_store(db_path)
+    assert store.stats()["purged"] == 1
+    assert not store.contains("url", "a")
+
+
+def test_front_cache_eviction_falls_back_to_db(db_path):
+    store = open_store(db_path, front_cache_size=1)
+    store.mark("url", "a")
+    store.mark("url", "b")
+    store.flush()
+    assert store.stats()["front_size"] == 1
+    assert store.contains("url", "a")
+    assert store.contains("url", "b")
+
+
+def test_release_after_mark_before_flush(db_path):
+    store = open_store(db_path)
+    store.mark("url", "a")
+    store.release("url", "a")
+    asyncio.run(store.close())
+
+    store = open_store(db_path)
+    assert not store.contains("url", "a")
+
+
+def test_memory_only_without_open(clock, monkeypatch):
+    monkeypatch.setattr(dedup_store, "time", clock)
+    store = DedupStore(ttl_seconds=TTL)
+    assert store.claim("url", "a")
+    store.mark("url", "a")
+    assert store.contains("url", "a")
+    assert store.stats()["persistent"] is False
+    clock.advance(101)
+    assert store.claim("url", "a")
@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+from src.utils.journal import MessageJournal
+
+
+def open_journal(directory: str, **kwargs):
+    journal = MessageJournal(directory=directory, **kwargs)
+    return journal, journal.open()
+
+
+def test_append_and_complete(tmp_path):
+    journal, pending = open_journal(str(tmp_path))
+    assert pending == []
+    first = journal.append({"n": 1})
+    second = journal.append({"n": 2})
+    assert first != second
+    journal.complete(first)
+    # 重复完成或未知 id 不报错
+    journal.complete(first)
+    journal.complete("unknown")
+    assert journal.stats()["pending"] == 1
+
+
+def test_replay_after_crash(tmp_path):
+    journal, _ = open_journal(str(tmp_path))
+    ids = [journal.append({"n": n}) for n in range(4)]
+    journal.complete(ids[1])
+    # 不调用 close 直接丢弃 (模拟进程崩溃)，最后一行只写了一半
+    journal._file.write(b'{"op": "add", "id": "x", "da')
+    journal._file.flush()
+
+    _, pending = open_journal(str(tmp_path))
+    assert pending == [(ids[0], {"n": 0}), (ids[2], {"n": 2}), (ids[3], {"n": 3})]
+
+
+def test_replay_after_close(tmp_path):
+    async def run():
+        journal, _ = open_journal(str(tmp_path))
+        await journal.start()
+        entry_id = journal.append({"n": 1})
+        journal.complete(journal.append({"n": 2}))
+        await journal.close()
+        return entry_id
+
+    entry_id = asyncio.run(run())
+    _, pending = open_journal(str(tmp_path))
+    assert pending == [(entry_id, {"n": 1})]
+
+
+def test_completed_segments_are_removed(tmp_path):
+    journal, _ = open_journal(str(tmp_path), segment_max_bytes=200)
+    for n in range(20):
+        journal.complete(journal.append({"n": n}))
+    assert journal.stats()["segments"] == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_compaction_relocates_pending_entries(tmp_path):
+    journal, _ = open_journal(str(tmp_path), segment_max_bytes=200, max_sealed_segments=2)
+    kept = journal.append({"n": "kept"})
+    for n in range(40):
+        journal.complete(journal.append({"n": n}))
+    # 最旧段中未完成的消息被搬到新段，历史段数量不超过上限
+    stats = journal.stats()
+    assert stats["pending"] == 1
+    assert stats["segments"] <= 3
+    assert len(os.listdir(tmp_path)) == stats["segments"]
+    assert not os.path.exists(journal._segment_path(1))
+
+    _, pending = open_journal(str(tmp_path))
+    assert pending == [(kept, {"n": "kept"})]
+
+
+def test_ids_stay_unique_across_restarts(tmp_path):
+    journal, _ = open_journal(str(tmp_path))
+    first = journal.append({"n": 1})
+    journal, pending = open_journal(str(tmp_path))
+    second = journal.append({"n": 2})
+    assert first != second
+    _, pending = open_journal(str(tmp_path))
+    assert [entry_id for entry_id, _ in pending] == [first, second]
@@ -0,0 +1,104 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import src.app as app_module
+from src.config import global_config
+from src.utils.journal import MessageJournal
+from src.wechat.message import NormalizedMessage
+
+
+MSG_IDS = ("m1", "m2", "m3", "m4", "m5")
+
+
+@pytest.fixture
+def queue_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(global_config, "WORK_QUEUE_WORKERS", 1)
+    monkeypatch.setattr(global_config, "WORK_QUEUE_MAX_SIZE", 1)
+    monkeypatch.setattr(global_config, "WORK_QUEUE_OVERFLOW_POLICY", "spill")
+    monkeypatch.setattr(global_config, "WORK_QUEUE_SPILL_DIR", str(tmp_path / "queue_spill"))
+    monkeypatch.setattr(global_config, "WORK_QUEUE_LANE_WEIGHTS", "normal:1")
+    monkeypatch.setattr(app_module, "classify_message", lambda message, rule_set: "normal")
+    return tmp_path
+
+
+def make_app(journal: MessageJournal) -> SimpleNamespace:
+    route = SimpleNamespace(target="hook", send_method="hook", rule_set="default")
+    state = SimpleNamespace(routing=SimpleNamespace(match=lambda room: route), dd_senders={}, journal=journal)
+    return SimpleNamespace(state=state)
+
+
+async def crash_while_processing(journal_dir: str, monkeypatch, block_on: str):
+    """
+    第一次运行：消息全部入队，处理到 block_on 时进程崩溃 (worker 被直接取消，不做排空)。
+    """
+    blocked = asyncio.Event()
+
+    async def process(message, **kwargs):
+        if message.msg_id == block_on:
+            blocked.set()
+            await asyncio.Event().wait()
+
+    monkeypatch.setattr(app_module, "async_process_message", process)
+    journal = MessageJournal(directory=journal_dir)
+    journal.open()
+    await journal.start()
+    app = make_app(journal)
+    work_queue = app_module.build_work_queue(app)
+    await work_queue.start()
+    app.state.work_queue = work_queue
+
+    for msg_id in MSG_IDS:
+        message = NormalizedMessage(msg_type="text", room="room", sender="sender", text=msg_id, msg_id=msg_id)
+        app_module.enqueue_message(app, message)
+    await asyncio.wait_for(blocked.wait(), timeout=5)
+
+    for task in work_queue._tasks:
+        task.cancel()
+    await asyncio.gather(*work_queue._tasks, return_exceptions=True)
+    await journal.close()
+
+
+async def restart(journal_dir: str, monkeypatch) -> list:
+    """
+    第二次运行：按 lifespan 的顺序先打开消息日志，再接管溢出文件并重放日志，返回处理过的消息 id。
+    """
+    processed = []
+
+    async def process(message, **kwargs):
+        processed.append(message.msg_id)
+
+    monkeypatch.setattr(app_module, "async_process_message", process)
+    journal = MessageJournal(directory=journal_dir)
+    pending = journal.open()
+    await journal.start()
+    app = make_app(journal)
+    recovered = set()
+    work_queue = app_module.build_work_queue(app)
+    await work_queue.start(spill_filter=app_module.spill_recovery_filter(pending, recovered))
+    app.state.work_queue = work_queue
+    app_module.replay_journal(app, pending, recovered)
+
+    await asyncio.wait_for(work_queue.join(), timeout=5)
+    await work_queue.stop()
+    assert journal.stats()["pending"] == 0
+    await journal.close()
+    return processed
+
+
+@pytest.mark.parametrize("lose_offset", [False, True])
+def test_crash_restart_runs_each_message_once(queue_config, monkeypatch, lose_offset):
+    journal_dir = str(queue_config / "journal")
+    asyncio.run(crash_while_processing(journal_dir, monkeypatch, block_on="m3"))
+
+    spill_path = os.path.join(global_config.WORK_QUEUE_SPILL_DIR, "recvMsg.jsonl")
+    assert os.path.exists(spill_path)
+    if lose_offset:
+        # 读回位置没来得及保存：溢出文件中既有已完成的 m2，也有内存中的 m3/m4
+        os.remove(spill_path + ".offset")
+
+    processed = asyncio.run(restart(journal_dir, monkeypatch))
+    assert sorted(processed) == ["m3", "m4", "m5"]
+    assert not os.path.exists(spill_path)
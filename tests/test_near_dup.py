@@ -0,0 +1,81 @@
+import pytest
+
+from src.utils import near_dup
+from src.utils.near_dup import NearDuplicateIndex, simhash
+
+
+ALERT = "G1234次列车沈阳北站晚点约三十分钟，请旅客注意候车时间并关注车站广播通知"
+# 与 ALERT 只差一个字，指纹汉明距离为 14
+SIMILAR = "G1234次列车沈阳北站晚点约四十分钟，请旅客注意候车时间并关注车站广播通知"
+UNRELATED = "今天天气晴朗适合出门散步，公园里的花都开了，很多人在拍照留念"
+
+
+@pytest.fixture(autouse=True)
+def fake_time(clock, monkeypatch):
+    monkeypatch.setattr(near_dup, "time", clock)
+
+
+def test_simhash_ignores_urls_and_punctuation():
+    assert simhash(ALERT) == simhash(ALERT + " https://example.com/a?b=1")
+    assert simhash(ALERT) == simhash(ALERT.replace("，", " "))
+    assert simhash("短文本") is None
+
+
+def test_exact_duplicate():
+    index = NearDuplicateIndex()
+    duplicate_of, entry_id = index.claim(ALERT, label="first")
+    assert duplicate_of is None and entry_id is not None
+    assert index.claim(ALERT + "！", label="second") == ("first", None)
+    assert index.claim(UNRELATED)[0] is None
+
+
+@pytest.mark.parametrize("threshold, duplicate", [(0.875, False), (0.75, True)])
+def test_threshold(threshold, duplicate):
+    index = NearDuplicateIndex(threshold=threshold)
+    index.claim(ALERT, label="first")
+    assert (index.claim(SIMILAR)[0] == "first") is duplicate
+    assert index.claim(UNRELATED)[0] is None
+
+
+def test_short_text_is_not_checked():
+    index = NearDuplicateIndex()
+    assert index.claim("短文本") == (None, None)
+    assert index.claim("短文本") == (None, None)
+    assert index.stats()["skipped_short"] == 2
+
+
+def test_groups_are_isolated():
+    index = NearDuplicateIndex()
+    index.claim(ALERT, group="G1234")
+    assert index.claim(ALERT, group="G5678")[0] is None
+    assert index.claim(ALERT, group="G1234")[0] == "-"
+
+
+def test_window(clock):
+    index = NearDuplicateIndex(window_seconds=60)
+    index.claim(ALERT, label="first")
+    clock.advance(59)
+    assert index.claim(ALERT)[0] == "first"
+    clock.advance(2)
+    duplicate_of, entry_id = index.claim(ALERT, label="again")
+    assert duplicate_of is None and entry_id is not None
+    assert index.stats()["size"] == 1
+
+
+def test_release():
+    index = NearDuplicateIndex()
+    _, entry_id = index.claim(ALERT, label="first")
+    index.release(entry_id)
+    # 重复释放或释放 None 不报错
+    index.release(entry_id)
+    index.release(None)
+    assert index.stats()["size"] == 0
+    duplicate_of, entry_id = index.claim(ALERT, label="retry")
+    assert duplicate_of is None and entry_id is not None
+
+
+def test_max_size():
+    index = NearDuplicateIndex(max_size=1)
+    index.claim(ALERT, label="first")
+    index.claim(UNRELATED, label="second")
+    assert index.claim(ALERT)[0] is None
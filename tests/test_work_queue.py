@@ -0,0 +1,148 @@
+import asyncio
+import os
+
+import pytest
+
+from src.utils.work_queue import WorkQueue
+
+
+def make_queue(tmp_path, handler, policy: str, **kwargs) -> WorkQueue:
+    return WorkQueue(handler=handler, workers=1, max_size=2, policy=policy, spill_dir=str(tmp_path), name="test",
+                     **kwargs)
+
+
+def test_unknown_policy(tmp_path):
+    with pytest.raises(ValueError):
+        make_queue(tmp_path, None, "unknown")
+
+
+def test_submit_before_start(tmp_path):
+    queue = make_queue(tmp_path, None, "reject")
+    with pytest.raises(RuntimeError):
+        queue.submit(1)
+
+
+def test_drop_oldest(tmp_path):
+    async def run():
+        processed, dropped = [], []
+
+        async def handler(item):
+            processed.append(item)
+
+        queue = make_queue(tmp_path, handler, "drop_oldest", on_drop=dropped.append)
+        await queue.start()
+        # submit 是同步的，worker 在下一次让出事件循环前不会取任务
+        statuses = [queue.submit(item) for item in range(4)]
+        await queue.join()
+        await queue.stop()
+        return statuses, processed, dropped, queue.stats()
+
+    statuses, processed, dropped, stats = asyncio.run(run())
+    assert statuses == ["queued", "queued", "dropped_oldest", "dropped_oldest"]
+    assert processed == [2, 3]
+    assert dropped == [0, 1]
+    assert stats["dropped"] == 2
+
+
+def test_reject(tmp_path):
+    async def run():
+        processed = []
+
+        async def handler(item):
+            processed.append(item)
+
+        queue = make_queue(tmp_path, handler, "reject")
+        await queue.start()
+        statuses = [queue.submit(item) for item in range(4)]
+        await queue.join()
+        await queue.stop()
+        return statuses, processed, queue.stats()
+
+    statuses, processed, stats = asyncio.run(run())
+    assert statuses == ["queued", "queued", "rejected", "rejected"]
+    assert processed == [0, 1]
+    assert stats["rejected"] == 2
+
+
+def test_spill_keeps_order(tmp_path):
+    async def run():
+        processed = []
+
+        async def handler(item):
+            processed.append(item["n"])
+
+        queue = make_queue(tmp_path, handler, "spill")
+        await queue.start()
+        statuses = [queue.submit({"n": n}) for n in range(6)]
+        await queue.join()
+        await queue.stop()
+        return statuses, processed, queue.stats()
+
+    statuses, processed, stats = asyncio.run(run())
+    assert statuses == ["queued", "queued"] + ["spilled"] * 4
+    assert processed == list(range(6))
+    assert stats["spilled"] == 4
+    assert stats["spill_pending"] == 0
+    assert not os.path.exists(tmp_path / "test.jsonl")
+
+
+async def crash_while_processing(tmp_path, block_on: int):
+    """
+    worker 处理到 block_on 时直接取消 (模拟进程崩溃)，返回已开始处理的任务。
+    """
+    started = []
+    blocked = asyncio.Event()
+
+    async def handler(item):
+        started.append(item["n"])
+        if item["n"] == block_on:
+            blocked.set()
+            await asyncio.Event().wait()
+
+    queue = WorkQueue(handler=handler, workers=1, max_size=1, policy="spill", spill_dir=str(tmp_path), name="test")
+    await queue.start()
+    for n in range(6):
+        queue.submit({"n": n})
+    await asyncio.wait_for(blocked.wait(), timeout=5)
+    for task in queue._tasks:
+        task.cancel()
+    await asyncio.gather(*queue._tasks, return_exceptions=True)
+    return started
+
+
+async def restart(tmp_path, spill_filter=None):
+    processed = []
+
+    async def handler(item):
+        processed.append(item["n"])
+
+    queue = WorkQueue(handler=handler, workers=1, max_size=1, policy="spill", spill_dir=str(tmp_path), name="test")
+    await queue.start(spill_filter=spill_filter)
+    await asyncio.wait_for(queue.join(), timeout=5)
+    await queue.stop()
+    return processed
+
+
+def test_spill_recovery_resumes_from_offset(tmp_path):
+    started = asyncio.run(crash_while_processing(tmp_path, block_on=2))
+    assert started == [0, 1, 2]
+    assert os.path.exists(tmp_path / "test.jsonl.offset")
+
+    # 3 崩溃时已读回内存 (由消息日志负责)，溢出文件中只接管 4、5
+    assert asyncio.run(restart(tmp_path)) == [4, 5]
+    assert not os.path.exists(tmp_path / "test.jsonl")
+    assert not os.path.exists(tmp_path / "test.jsonl.offset")
+
+
+def test_spill_recovery_ignores_invalid_offset(tmp_path):
+    asyncio.run(crash_while_processing(tmp_path, block_on=2))
+    (tmp_path / "test.jsonl.offset").write_text("999999")
+
+    assert asyncio.run(restart(tmp_path)) == [1, 2, 3, 4, 5]
+
+
+def test_spill_recovery_filter(tmp_path):
+    asyncio.run(crash_while_processing(tmp_path, block_on=0))
+
+    assert asyncio.run(restart(tmp_path, spill_filter=lambda item: item["n"] % 2 == 0)) == [2, 4]
+    assert not os.path.exists(tmp_path / "test.jsonl.offset")
@@ -0,0 +1,78 @@
+"""
+消息清理基准测试与回归校验。
+
+tools/corpus/cleaner_expected.jsonl 记录了每条消息经原清理正则 (所有分支拼接、对整条消息执行 sub) 处理后的结果，
+先校验 LineCleaner (按行、按过滤条件执行) 与整条正则的输出都和记录完全一致，再对比两者的耗时。
+修改 delete.txt 后可用 --update 按整条正则重新生成期望结果。
+
+用法 (在项目根目录执行):
+    python -m tools.bench_cleaner [--corpus tools/corpus/cleaner_expected.jsonl] [--rounds 5] [--update]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import global_config
+from tools.bench_train_matcher import bench
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "cleaner_expected.jsonl")
+
+
+def load_cases(path: str):
+    cases = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                cases.append(json.loads(line))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息清理基准测试与回归校验")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="回归语料 (JSONL: text / expected)")
+    parser.add_argument("--rule-set", default="shenyang", help="规则集名称")
+    parser.add_argument("--rounds", type=int, default=5, help="测试轮数，取最小值")
+    parser.add_argument("--update", action="store_true", help="按整条正则重新生成期望结果")
+    args = parser.parse_args()
+
+    cleaner = global_config.RULES.get(args.rule_set).cleaner
+    cases = load_cases(args.corpus)
+
+    if args.update:
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            for case in cases:
+                case["expected"] = cleaner.pattern.sub("", case["text"])
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+        print(f"已更新 {len(cases)} 条期望结果: {args.corpus}")
+        return
+
+    for case in cases:
+        text = case["text"]
+        assert cleaner.pattern.sub("", text) == case["expected"], f"整条正则结果与记录不一致: {text!r}"
+        assert cleaner.clean(text) == case["expected"], f"LineCleaner 结果与记录不一致: {text!r}"
+    changed = sum(case["text"] != case["expected"] for case in cases)
+    print(f"按行执行: {'是' if cleaner.line_safe else '否 (存在可能跨行的分支，退回整条正则)'}")
+    for source, anchored, guard in cleaner.guards():
+        print(f"  {'^' if anchored else ' '} 过滤条件 {guard or '-':<8} {source}")
+    print(f"语料 {len(cases)} 条，其中 {changed} 条会被清理，结果全部一致")
+
+    texts = [case["text"] for case in cases]
+    groups = {
+        "语料原文": texts,
+        # 多条转发合并的长消息
+        "10 条拼接的长消息": ["\n".join(texts[i:i + 10]) for i in range(0, len(texts), 10)],
+    }
+    for name, items in groups.items():
+        avg_len = sum(len(text) for text in items) / len(items)
+        regex_ns = bench(lambda text: cleaner.pattern.sub("", text), items, args.rounds)
+        line_ns = bench(cleaner.clean, items, args.rounds)
+        print(f"\n[{name}] {len(items)} 条，平均 {avg_len:.0f} 字符")
+        print(f"  整条正则 sub:     {regex_ns / 1000:10.2f} us/条")
+        print(f"  LineCleaner:      {line_ns / 1000:10.2f} us/条 ({regex_ns / max(line_ns, 1):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+回调预过滤基准测试。
+
+对比被丢弃的 vxhook 事件在「完整 JSON 解析」与「原始字节预过滤」两种方式下的耗时，
+输出每个事件节省的解析时间。
+
+用法 (在项目根目录执行):
+    python -m tools.bench_prefilter [--events 2000] [--xml-nodes 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.utils.fast_filter import json_loads, orjson, prefilter_event
+
+
+LISTEN_ROOM = "12345678901@chatroom"
+LISTEN_ROOMS = frozenset([LISTEN_ROOM.encode("utf-8")])
+
+
+def build_payload(event_type: int, xml_nodes: int, room: str) -> bytes:
+    """
+    构造接近真实大小的 vxhook 回调，content_xml 中包含较大的嵌套节点。
+    """
+    content_xml = {
+        "msg": {
+            "appmsg": {
+                "title": "收到一条分享",
+                "des": "描述" * 50,
+                "items": [{"id": i, "title": f"节点{i}", "url": f"https://example.com/{i}", "extra": "x" * 40} for i in range(xml_nodes)],
+            }
+        }
+    }
+    payload = {
+        "event_type": event_type,
+        "event_desc": "事件",
+        "fromUserName": {"String": room},
+        "sender_profile": {"nickName": "某群友"},
+        "content_xml": content_xml,
+        "real_content": "测试内容 " * 20,
+    }
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def bench(func, payloads, rounds: int = 3) -> float:
+    """
+    返回平均每个事件的耗时 (ns)，取多轮中的最小值。
+    """
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for body in payloads:
+            func(body)
+        elapsed = (time.perf_counter_ns() - start) / len(payloads)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def full_decode_then_filter(body: bytes):
+    msg_data = json.loads(body)
+    event_type = msg_data.get("event_type")
+    return str(event_type) not in ["2000", "2004"] and msg_data.get("msgType") is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="vxhook 回调预过滤基准测试")
+    parser.add_argument("--events", type=int, default=2000, help="每类事件的数量")
+    parser.add_argument("--xml-nodes", type=int, default=200, help="content_xml 中的节点数量，用于控制事件大小")
+    args = parser.parse_args()
+
+    cases = {
+        "非目标事件 (event_type=10000)": [build_payload(10000, args.xml_nodes, LISTEN_ROOM) for _ in range(args.events)],
+        "非监听群 (event_type=2000)": [build_payload(2000, args.xml_nodes, "99999999@chatroom") for _ in range(args.events)],
+    }
+
+    print(f"orjson: {'已安装' if orjson else '未安装'}")
+    for name, payloads in cases.items():
+        size = len(payloads[0])
+        assert all(prefilter_event(body, LISTEN_ROOMS) for body in payloads), "预过滤未能丢弃事件"
+        decode_ns = bench(full_decode_then_filter, payloads)
+        fast_decode_ns = bench(json_loads, payloads)
+        prefilter_ns = bench(lambda body: prefilter_event(body, LISTEN_ROOMS), payloads)
+        print(f"\n[{name}] 单个事件 {size / 1024:.1f} KB")
+        print(f"  json.loads + 过滤:   {decode_ns / 1000:10.2f} us/event")
+        print(f"  json_loads (解析):   {fast_decode_ns / 1000:10.2f} us/event")
+        print(f"  原始字节预过滤:       {prefilter_ns / 1000:10.2f} us/event")
+        print(f"  每个被丢弃事件节省:   {(decode_ns - prefilter_ns) / 1000:10.2f} us ({decode_ns / max(prefilter_ns, 1):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+消息规则热路径基准测试。
+
+在消息语料上测量 check_keyword / msg_cleaner / msg_restructure / extract_author 以及 global_config 中各正则的
+每次调用耗时 (ns/op) 和每次调用的内存分配峰值 (B/op，tracemalloc)，语料分为:
+- 普通消息 / 引用消息:  tools/corpus/messages.jsonl 原文
+- 长消息:                10 条消息拼接 (多条转发合并)
+- 多链接:                正文后附加 20 个链接
+- 重清理:                tools/corpus/cleaner_expected.jsonl 中会被清理规则删减的消息
+
+测量时关闭规则结果缓存和分享解析缓存，反映每条新消息的真实开销。
+指定 --compare-rules-dir 时，依赖规则的函数会分别用两套规则目录测量并给出耗时比。
+
+用法 (在项目根目录执行):
+    python -m tools.bench_rules [--rounds 5] [--only msg_cleaner,check_keyword]
+    python -m tools.bench_rules --compare-rules-dir /path/to/old/rules [--json result.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import global_config
+from src.utils import commons, share_parser
+from src.utils.commons import extract_author
+from src.utils.rule_registry import RuleRegistry
+from src.wechat import text_rules
+from tools.bench_cleaner import DEFAULT_CORPUS as CLEANER_CORPUS, load_cases
+from tools.bench_train_matcher import DEFAULT_CORPUS, bench
+
+
+def load_groups(corpus: str, cleaner_corpus: str) -> dict:
+    texts, quotes = [], []
+    with open(corpus, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "quote" and record.get("quote"):
+                quotes.append((record["text"], record["quote"]))
+            else:
+                texts.append(record["text"])
+    urls = " ".join(f"https://example.com/share/{i}?from=wechat" for i in range(20))
+    return {
+        "普通消息": texts,
+        "长消息": ["\n".join(texts[i:i + 10]) for i in range(0, len(texts), 10)],
+        "多链接": [f"{text} {urls}" for text in texts[:100]],
+        "重清理": [case["text"] for case in load_cases(cleaner_corpus) if case["text"] != case["expected"]],
+        "引用消息": quotes,
+    }
+
+
+def rule_cases(rules) -> dict:
+    """
+    依赖规则集的函数: 名称 -> (适用的语料, 调用方式)
+    """
+    def clean(text):
+        return text_rules.msg_cleaner(text, rules=rules)
+
+    def keyword_text(text):
+        cleaned = rules.cleaner.clean(text)
+        return text_rules.check_keyword("text", cleaned, "", rules=rules)
+
+    def keyword_quote(item):
+        return text_rules.check_keyword("quote", item[0], item[1], rules=rules)
+
+    return {
+        "msg_cleaner": (("普通消息", "长消息", "重清理"), clean),
+        "LineCleaner.clean": (("普通消息", "长消息", "重清理"), rules.cleaner.clean),
+        "清理正则 (整条)": (("普通消息", "长消息", "重清理"), lambda text: rules.cleaner.pattern.sub("", text)),
+        "RuleScanner.scan": (("普通消息", "长消息", "多链接"), rules.scanner.scan),
+        "check_keyword(text)": (("普通消息", "长消息", "多链接"), keyword_text),
+        "check_keyword(quote)": (("引用消息",), keyword_quote),
+    }
+
+
+def static_cases() -> dict:
+    """
+    不依赖规则集的函数。
+    """
+    return {
+        "msg_restructure": (("普通消息", "长消息"), lambda text: text_rules.msg_restructure(text)),
+        "msg_restructure(quote)": (("引用消息",), lambda item: text_rules.msg_restructure(item[0], quote_content=item[1])),
+        "extract_author": (("普通消息", "长消息"), extract_author),
+        "parse_share": (("普通消息", "长消息", "多链接"), share_parser.parse_share.__wrapped__),
+        "URL_PATTERN.findall": (("普通消息", "长消息", "多链接"), global_config.URL_PATTERN.findall),
+        "IP_PATTERN.findall": (("普通消息", "长消息", "多链接"), global_config.IP_PATTERN.findall),
+        "NUMBER_PATTERN.search": (("普通消息", "长消息"), global_config.NUMBER_PATTERN.search),
+        "MSG_SUB_PATTERN.sub": (("普通消息", "长消息"), lambda text: global_config.MSG_SUB_PATTERN.sub("", text)),
+        "WEIBO_URL_PATTERN.search": (("普通消息", "多链接"), global_config.WEIBO_URL_PATTERN.search),
+    }
+
+
+def measure_alloc(func, items) -> float:
+    """
+    返回平均每次调用的内存分配峰值 (字节)。
+    """
+    tracemalloc.start()
+    try:
+        total = 0
+        for item in items:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            func(item)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / len(items)
+
+
+def run_case(func, items, rounds: int) -> dict:
+    # 预热: 惰性编译的正则等一次性开销不计入
+    for item in items:
+        func(item)
+    return {"ns_per_op": bench(func, items, rounds), "bytes_per_op": measure_alloc(func, items)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息规则热路径基准测试")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="消息语料 (JSONL)")
+    parser.add_argument("--cleaner-corpus", default=CLEANER_CORPUS, help="清理规则回归语料 (JSONL)")
+    parser.add_argument("--rule-set", default="shenyang", help="规则集名称")
+    parser.add_argument("--rules-dir", default=global_config.RULES_DIR, help="规则目录")
+    parser.add_argument("--compare-rules-dir", default="", help="对比的另一套规则目录 (如旧版本)")
+    parser.add_argument("--rounds", type=int, default=5, help="测试轮数，取最小值")
+    parser.add_argument("--only", default="", help="只测试这些函数 (逗号分隔)")
+    parser.add_argument("--json", default="", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    # 关闭缓存，测量每条新消息的真实开销
+    text_rules.RULE_MEMO.max_size = 0
+    commons.parse_share = text_rules.parse_share = share_parser.parse_share.__wrapped__
+    # 规则判断的日志不计入耗时
+    from loguru import logger
+    logger.remove()
+
+    groups = load_groups(args.corpus, args.cleaner_corpus)
+    only = {name.strip() for name in args.only.split(",") if name.strip()}
+
+    rule_sets = {}
+    for label, rules_dir in (("当前", args.rules_dir), ("对比", args.compare_rules_dir)):
+        if rules_dir:
+            registry = RuleRegistry(rules_dir, global_config.URL_PATTERN, global_config.IP_PATTERN, interval_seconds=0)
+            registry.load()
+            rule_sets[label] = registry.get(args.rule_set)
+    for label, rules in rule_sets.items():
+        print(f"{label}规则: {rules.directory} 版本 {rules.version}")
+    print("语料: " + "，".join(f"{name} {len(items)} 条" for name, items in groups.items()))
+
+    results = {}
+    header = f"\n{'函数':<26}{'语料':<10}{'ns/op':>12}{'B/op':>10}"
+    if "对比" in rule_sets:
+        header += f"{'对比 ns/op':>14}{'对比 B/op':>12}{'耗时比':>8}"
+    print(header)
+
+    cases = {name: (group_names, {"当前": func}) for name, (group_names, func) in static_cases().items()}
+    per_rules = {label: rule_cases(rules) for label, rules in rule_sets.items()}
+    for name, (group_names, _) in per_rules["当前"].items():
+        cases[name] = (group_names, {label: per_rules[label][name][1] for label in rule_sets})
+
+    for name, (group_names, funcs) in cases.items():
+        if only and name not in only:
+            continue
+        for group_name in group_names:
+            items = groups[group_name]
+            if not items:
+                continue
+            row = {label: run_case(func, items, args.rounds) for label, func in funcs.items()}
+            results.setdefault(name, {})[group_name] = row
+            current = row["当前"]
+            line = f"{name:<26}{group_name:<10}{current['ns_per_op']:>12.0f}{current['bytes_per_op']:>10.0f}"
+            if "对比" in row:
+                other = row["对比"]
+                line += f"{other['ns_per_op']:>14.0f}{other['bytes_per_op']:>12.0f}" \
+                        f"{other['ns_per_op'] / max(current['ns_per_op'], 1):>7.2f}x"
+            print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "rule_sets": {label: {"directory": rules.directory, "version": rules.version} for label, rules in rule_sets.items()},
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+车次匹配基准测试。
+
+在消息语料 (tools/corpus/messages.jsonl) 上对比原车次正则 (上千个分支 + 前后断言) 与 TrainMatcher，
+先逐条校验两者的匹配结果完全一致，再输出每条消息的平均匹配耗时。
+
+用法 (在项目根目录执行):
+    python -m tools.bench_train_matcher [--corpus tools/corpus/messages.jsonl] [--rounds 5]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import global_config
+from src.utils.train_matcher import TrainMatcher, load_codes
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "messages.jsonl")
+
+
+def build_legacy_regex(codes) -> re.Pattern:
+    """
+    按原车次正则 (SHENYANG_TRAIN) 的写法，用车次列表拼出单个正则。
+    """
+    return re.compile('(?<![a-zA-Z0-9])(' + '|'.join(codes) + ')(?![a-zA-Z0-9])', re.I)
+
+
+def load_corpus(path: str):
+    """
+    读取语料，返回需要做车次匹配的文本列表 (普通消息正文、引用消息的回复和引用内容)。
+    """
+    texts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            texts.append(record["text"])
+            if record.get("quote"):
+                texts.append(record["quote"])
+    return texts
+
+
+def bench(func, texts, rounds: int) -> float:
+    """
+    返回平均每条文本的耗时 (ns)，取多轮中的最小值。
+    """
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for text in texts:
+            func(text)
+        elapsed = (time.perf_counter_ns() - start) / len(texts)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def verify(regex: re.Pattern, matcher: TrainMatcher, texts) -> int:
+    """
+    校验 search / finditer 的命中位置和内容完全一致，返回命中的文本数量。
+    """
+    hits = 0
+    for text in texts:
+        expected = [(m.span(), m.group(0)) for m in regex.finditer(text)]
+        actual = [(m.span(), m.group(0)) for m in matcher.finditer(text)]
+        assert expected == actual, f"匹配结果不一致: {text!r}\n  正则: {expected}\n  集合: {actual}"
+        first = regex.search(text)
+        found = matcher.search(text)
+        assert (first and (first.span(), first.group(0))) == (found and (found.span(), found.group(0))), text
+        hits += bool(expected)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="车次匹配基准测试")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="消息语料 (JSONL)")
+    parser.add_argument("--rounds", type=int, default=5, help="测试轮数，取最小值")
+    args = parser.parse_args()
+
+    codes = load_codes(os.path.join(global_config.RULES.get().directory, "train.txt"))
+    regex = build_legacy_regex(codes)
+    matcher = TrainMatcher(codes)
+    texts = load_corpus(args.corpus)
+
+    hits = verify(regex, matcher, texts)
+    print(f"车次数量: {len(matcher)}，语料文本: {len(texts)} 条，命中车次: {hits} 条，匹配结果一致")
+
+    cases = {
+        "语料原文": texts,
+        # 长消息 (多条转发合并) 下两种方式的差距更明显
+        "10 条拼接的长消息": ["\n".join(texts[i:i + 10]) for i in range(0, len(texts), 10)],
+    }
+    for name, items in cases.items():
+        avg_len = sum(len(text) for text in items) / len(items)
+        regex_ns = bench(regex.search, items, args.rounds)
+        matcher_ns = bench(matcher.search, items, args.rounds)
+        print(f"\n[{name}] {len(items)} 条，平均 {avg_len:.0f} 字符")
+        print(f"  车次正则 search:   {regex_ns / 1000:10.2f} us/条")
+        print(f"  TrainMatcher:      {matcher_ns / 1000:10.2f} us/条 ({regex_ns / max(matcher_ns, 1):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
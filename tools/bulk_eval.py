@@ -0,0 +1,336 @@
+"""
+离线批量评估工具。
+
+把消息归档按原始顺序流式读入，用多进程执行与线上完全相同的消息清理 (msg_cleaner)、
+关键词判断 (check_keyword) 和决策规则，再在主进程中按顺序执行线上的 URL / 作者 / 近似文本去重，
+不启动浏览器，也不发送任何消息。输出各规则命中数、命中最多的关键词、过滤词命中、
+去重跳过数、需要浏览器 IP 检查的消息数以及吞吐量，用于评估规则修改的影响。
+
+支持的归档格式 (JSONL，可为 .gz 压缩)，每行自动识别:
+- 语料格式:       {"type": "text" | "quote", "text": "...", "quote": "..."} (tools/corpus/messages.jsonl)
+- 消息日志:       {"op": "add", "id": "...", "data": {...}} (JOURNAL_DIR 下的 journal 文件)
+- 回调录制:       {"ts": ..., "body": "..."} (VXHOOK_CAPTURE_FILE)
+- 归一化消息或 vxhook 原始回调字典
+
+IP 检查需要浏览器访问链接，这里只统计会进入 IP 检查的消息，这些消息按未发送处理 (释放占用的 URL)。
+URL 去重按规范化的 key 进行，默认不访问短链接 (短链接按自身去重)，指定 --resolve-short-links 时与线上一样解析跳转地址。
+
+用法 (在项目根目录执行):
+    python -m tools.bulk_eval tools/corpus/messages.jsonl [--workers 4] [--rule-set shenyang]
+    python -m tools.bulk_eval captures/recv.jsonl.gz --no-dedup --json result.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 每批交给子进程的行数
+BATCH_SIZE = 500
+# 与 accept_event 一致，只处理这两类事件
+_EVENT_TYPES = ("2000", "2004")
+
+# 子进程内的规则集和决策计划，由 _init_worker 初始化
+_rules = None
+_plan = None
+
+
+# --------------------------------------------------------------------------------------
+# 子进程：解析与规则判断
+# --------------------------------------------------------------------------------------
+
+def _init_worker(rules_dir: str, rule_set: str):
+    global _rules, _plan
+    from loguru import logger
+
+    from src.config import global_config
+    from src.utils.rule_engine import DecisionPlan, StageSpec
+    from src.utils.rule_registry import RuleRegistry
+    from src.wechat.text_rules import DECISION_CONDITIONS, DECISION_RULES
+
+    # 规则判断的日志量很大，评估时不输出
+    logger.remove()
+    registry = RuleRegistry(rules_dir, global_config.URL_PATTERN, global_config.IP_PATTERN, interval_seconds=0)
+    registry.load()
+    _rules = registry.get(rule_set)
+
+    async def no_browser(ctx):
+        return None
+
+    # IP 检查阶段始终不执行，依赖它的规则视为不满足，ctx.stages_gated 中记录会进入 IP 检查的消息
+    _plan = DecisionPlan(DECISION_RULES, DECISION_CONDITIONS, {
+        "ip_check": StageSpec(run=no_browser, gate=lambda ctx: False),
+    })
+
+
+def parse_record(line: str):
+    """
+    把归档中的一行解析为 NormalizedMessage，返回 (状态, 消息)。
+    状态: ok / invalid (无法解析) / ignored (非消息事件) / empty (没有文本或引用)
+    """
+    from src.wechat.message import NormalizedMessage, normalize_message
+
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return "invalid", None
+    if not isinstance(record, dict):
+        return "invalid", None
+
+    if "op" in record:
+        if record.get("op") != "add" or not isinstance(record.get("data"), dict):
+            return "ignored", None
+        record = record["data"]
+    elif "body" in record and "ts" in record:
+        try:
+            record = json.loads(record["body"])
+        except ValueError:
+            return "invalid", None
+        if not isinstance(record, dict):
+            return "invalid", None
+
+    if "msg_type" in record:
+        message = NormalizedMessage.from_dict(record)
+    elif record.get("type") in ("text", "quote") and "text" in record:
+        message = NormalizedMessage(msg_type=record["type"], room="", sender="", text=record["text"] or "",
+                                    quote=record.get("quote") or "")
+    else:
+        if str(record.get("event_type")) not in _EVENT_TYPES and record.get("msgType") is None:
+            return "ignored", None
+        message = normalize_message(record)
+    if message is None:
+        return "empty", None
+    return "ok", message
+
+
+async def _evaluate(message) -> tuple:
+    from src.utils.share_parser import parse_share
+    from src.wechat.text_rules import decision_context, msg_cleaner, scan_text
+
+    rules = _rules
+    if message.is_quote:
+        if not message.quote:
+            return "empty", message.msg_type, None, None, None, "", "", False, False, False
+        scan = scan_text(message.text, rules)
+        ctx = decision_context(message, rules, message.text, scan)
+        author = ""
+        cleaned = ""
+        url = None
+        filtered = False
+        cleaned_changed = False
+    else:
+        if not message.text:
+            return "empty", message.msg_type, None, None, None, "", "", False, False, False
+        author = parse_share(message.text).author
+        cleaned = msg_cleaner(message.text, rules=rules)
+        scan = scan_text(cleaned, rules)
+        ctx = decision_context(message, rules, cleaned, scan, author=author)
+        url = scan.url
+        filtered = scan.has("filter")
+        cleaned_changed = cleaned != message.text
+
+    decision = await _plan.decide(ctx)
+    keyword = scan.keyword()
+    return ("ok", message.msg_type, decision.name if decision else None, keyword.value if keyword else None,
+            url, author, cleaned, filtered, cleaned_changed, "ip_check" in ctx.stages_gated)
+
+
+async def _evaluate_batch(lines):
+    results = []
+    for line in lines:
+        status, message = parse_record(line)
+        if message is None:
+            results.append((status,))
+        else:
+            results.append(await _evaluate(message))
+    return results
+
+
+def evaluate_batch(lines):
+    return asyncio.run(_evaluate_batch(lines))
+
+
+# --------------------------------------------------------------------------------------
+# 主进程：读取归档、按顺序去重、汇总
+# --------------------------------------------------------------------------------------
+
+def iter_batches(path: str, limit: int = 0):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        lines = (line for line in f if line.strip())
+        if limit > 0:
+            lines = islice(lines, limit)
+        while True:
+            batch = list(islice(lines, BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+
+class Summary:
+    """
+    汇总评估结果，按归档顺序执行与 async_process_message 相同的去重。
+    """
+
+    def __init__(self, dedup: bool, top: int):
+        from src.utils import deduplication
+
+        self.dedup = dedup
+        self.top = top
+        self.dd = deduplication
+        deduplication.DEDUP_STORE.clear()
+        deduplication.NEAR_DUPLICATES.clear()
+        self.status = Counter()
+        self.types = Counter()
+        self.rules = Counter()
+        self.keywords = Counter()
+        self.dedup_skipped = Counter()
+        self.filtered = 0
+        self.cleaned = 0
+        self.ip_candidates = 0
+        self.sent = 0
+
+    async def add(self, result: tuple):
+        status = result[0]
+        self.status[status] += 1
+        if status != "ok":
+            return
+        _, msg_type, rule, keyword, url, author, cleaned, filtered, cleaned_changed, needs_ip = result
+        self.types[msg_type] += 1
+        self.filtered += filtered
+        self.cleaned += cleaned_changed
+
+        url_claimed = False
+        near_dup_id = None
+        if self.dedup and msg_type == "text":
+            username_has_processed = await self.dd.is_username_processed(author)
+            if url:
+                url_claimed = await self.dd.claim_url_if_not_processed(url)
+                if not url_claimed:
+                    self.dedup_skipped["url"] += 1
+                    return
+            elif author and username_has_processed:
+                self.dedup_skipped["author"] += 1
+                return
+            text_claimed, near_dup_id = await self.dd.claim_text_if_not_near_duplicate(
+                cleaned, label=url or author or "", group=keyword or "")
+            if not text_claimed:
+                if url_claimed:
+                    await self.dd.release_claimed_url(url)
+                self.dedup_skipped["near_dup"] += 1
+                return
+
+        if needs_ip:
+            self.ip_candidates += 1
+        if rule is None:
+            if url_claimed:
+                await self.dd.release_claimed_url(url)
+            await self.dd.release_claimed_text(near_dup_id)
+            return
+        self.rules[rule] += 1
+        if keyword:
+            self.keywords[keyword] += 1
+        self.sent += 1
+        # 发送成功后与钉钉发送器一样标记 URL 和作者
+        if self.dedup and msg_type == "text":
+            if url:
+                await self.dd.mark_url_as_processed(url)
+            await self.dd.mark_username_as_processed(author)
+
+    def to_dict(self, elapsed: float) -> dict:
+        total = sum(self.status.values())
+        return {
+            "total": total,
+            "status": dict(self.status),
+            "types": dict(self.types),
+            "rules": dict(self.rules),
+            "sent": self.sent,
+            "top_keywords": self.keywords.most_common(self.top),
+            "filtered": self.filtered,
+            "cleaned": self.cleaned,
+            "dedup_skipped": dict(self.dedup_skipped),
+            "ip_check_candidates": self.ip_candidates,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def print_summary(data: dict, rules):
+    print(f"规则集: {rules.name} 版本 {rules.version} ({rules.directory})")
+    print(f"\n共 {data['total']} 行: " + "，".join(f"{name} {count}" for name, count in sorted(data["status"].items())))
+    print("消息类型: " + "，".join(f"{name} {count}" for name, count in sorted(data["types"].items())))
+    print(f"清理规则改动的消息: {data['cleaned']}，命中过滤词的消息: {data['filtered']}")
+    print("去重跳过: " + ("，".join(f"{name} {count}" for name, count in data["dedup_skipped"].items()) or "0"))
+    print(f"\n规则命中 (共发送 {data['sent']} 条):")
+    for name, count in sorted(data["rules"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<20}{count:>8}")
+    print(f"需要浏览器 IP 检查的消息: {data['ip_check_candidates']}")
+    if data["top_keywords"]:
+        print("\n命中最多的关键词:")
+        for keyword, count in data["top_keywords"]:
+            print(f"  {keyword:<16}{count:>8}")
+    print(f"\n耗时 {data['elapsed_seconds']:.2f}s，吞吐量 {data['messages_per_second']:.0f} 条/秒")
+
+
+async def run(args, rules) -> dict:
+    summary = Summary(dedup=not args.no_dedup, top=args.top)
+    start = time.perf_counter()
+    init_args = (args.rules_dir, args.rule_set)
+    if args.workers <= 1:
+        _init_worker(*init_args)
+        for batch in iter_batches(args.archive, args.limit):
+            for result in await _evaluate_batch(batch):
+                await summary.add(result)
+    else:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=init_args) as pool:
+            # imap 按提交顺序返回，主进程的去重顺序与归档一致
+            for results in pool.imap(evaluate_batch, iter_batches(args.archive, args.limit)):
+                for result in results:
+                    await summary.add(result)
+    return summary.to_dict(time.perf_counter() - start)
+
+
+def main():
+    from loguru import logger
+
+    from src.config import global_config
+    from src.utils import url_canonical
+    from src.utils.rule_registry import RuleRegistry
+
+    parser = argparse.ArgumentParser(description="离线批量评估消息规则")
+    parser.add_argument("archive", help="消息归档 (JSONL 或 .jsonl.gz)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数，1 表示在主进程中执行")
+    parser.add_argument("--rule-set", default="shenyang", help="规则集名称")
+    parser.add_argument("--rules-dir", default=global_config.RULES_DIR, help="规则目录")
+    parser.add_argument("--no-dedup", action="store_true", help="不执行 URL / 作者 / 近似文本去重")
+    parser.add_argument("--resolve-short-links", action="store_true", help="去重前访问短链接取跳转地址 (需要网络)")
+    parser.add_argument("--limit", type=int, default=0, help="最多读取的行数，0 表示全部")
+    parser.add_argument("--top", type=int, default=20, help="输出命中最多的前 N 个关键词")
+    parser.add_argument("--json", default="", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    logger.remove()
+    registry = RuleRegistry(args.rules_dir, global_config.URL_PATTERN, global_config.IP_PATTERN, interval_seconds=0)
+    registry.load()
+    rules = registry.get(args.rule_set)
+    url_canonical.RESOLVER.enabled = args.resolve_short_links
+
+    data = asyncio.run(run(args, rules))
+    print_summary(data, rules)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rule_set": {"name": rules.name, "directory": rules.directory, "version": rules.version},
+                       **data}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+回调录制回放压测工具。
+
+把 VXHOOK_CAPTURE_FILE 录制的真实 /api/recvMsg 请求体，按原始时间间隔乘以加速倍数回放到 src.app.app，
+Playwright、VideoClient 和钉钉发送器全部替换为可配置延迟的桩实现，
+输出每个倍速下的吞吐量、端到端延迟 (p50/p95/p99) 以及队列深度变化。
+
+用法 (在项目根目录执行):
+    python -m tools.loadtest --capture captures/recv.jsonl --speeds 1,5,20
+    python -m tools.loadtest --synthetic 500 --rate 50 --speeds 1,2,4 --ip-latency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# --------------------------------------------------------------------------------------
+# 桩实现
+# --------------------------------------------------------------------------------------
+
+class FakeDDSender:
+    """
+    模拟本地钉钉发送器，发送过程与 DDAuto 一样串行执行。
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lock = asyncio.Lock()
+        self.sent = 0
+
+    async def _send(self):
+        async with self.lock:
+            await asyncio.sleep(self.latency)
+            self.sent += 1
+
+    async def send(self, msg: str):
+        await self._send()
+
+    async def send_mixed(self, msg: str, image_path: str = None):
+        await self._send()
+
+    async def send_video(self, video_path: str):
+        await self._send()
+
+
+class FakeVideoClient:
+    """
+    模拟 VideoClient，解析在线程池中阻塞执行，返回空列表 (不触发下载)。
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def parsefromurl(self, url):
+        time.sleep(self.latency)
+        return []
+
+    def download(self, video_infos):
+        return video_infos
+
+
+def install_stubs(args):
+    """
+    替换 src.app 依赖的浏览器、视频和发送器实现，并返回 app 模块。
+    """
+    from loguru import logger
+
+    import src.app as app_module
+    from src.config import global_config
+    from src.utils import playwright_utils, url_canonical
+    from src.utils.video_manager import video_manager
+    from src.wechat import msg_handler
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    async def noop(*_args, **_kwargs):
+        return None
+
+    async def fake_process_any_url(self, url, force_screenshot_only=False, use_temp_file=False, retry_count=0):
+        async with playwright_utils.PlaywrightManager.get_semaphore():
+            latency = args.screenshot_latency if force_screenshot_only else args.ip_latency
+            await asyncio.sleep(latency)
+        address = None
+        if not force_screenshot_only:
+            address = random.choice(global_config.RULES.get().address_list) if random.random() < args.ip_match_ratio else "广东"
+        return {"true_address": address, "screenshot_path": None, "url": url, "final_url": url, "platform": "unknown"}
+
+    playwright_utils.PlaywrightManager.start = staticmethod(noop)
+    playwright_utils.PlaywrightManager.stop = staticmethod(noop)
+    playwright_utils.PlaywrightIpChecker.process_any_url = fake_process_any_url
+
+    video_manager.init_client = lambda: None
+    video_manager._client = FakeVideoClient(args.video_latency)
+
+    sender = FakeDDSender(args.send_latency)
+    app_module.build_dd_sender = lambda route: sender
+
+    async def fake_send_to_dd(msg, target=None):
+        await asyncio.sleep(args.send_latency)
+        return True
+
+    msg_handler.send_to_dd = fake_send_to_dd
+
+    # 压测数据会重复回放，关闭回调幂等去重，消息日志写入临时目录
+    class _NoDedup:
+        def check_and_add(self, key):
+            return False
+
+        def discard(self, key):
+            pass
+
+        def stats(self):
+            return {}
+
+    app_module.callback_seen = _NoDedup()
+    global_config.JOURNAL_DIR = tempfile.mkdtemp(prefix="loadtest_journal_")
+    # 去重只在内存中进行，不读写线上的去重数据库，也不访问短链接
+    global_config.DEDUP_DB_PATH = ""
+    url_canonical.RESOLVER.enabled = False
+    global_config.VXHOOK_CAPTURE_FILE = ""
+    # 录制数据中的消息时间戳早已过期，默认关闭时效检查
+    global_config.MESSAGE_MAX_AGE_SECONDS = args.max_age
+    if args.room is not None:
+        global_config.WECHAT_LISTEN_ROOM_WXID = args.room
+    return app_module
+
+
+# --------------------------------------------------------------------------------------
+# 数据准备
+# --------------------------------------------------------------------------------------
+
+def load_capture(path: str):
+    """
+    读取录制文件，返回 [(相对时间偏移秒, 请求体 bytes)]。
+    """
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            events.append((float(record["ts"]), record["body"].encode("utf-8")))
+    if not events:
+        return []
+    events.sort(key=lambda item: item[0])
+    start = events[0][0]
+    return [(ts - start, body) for ts, body in events]
+
+
+def build_synthetic(count: int, rate: float, room: str):
+    """
+    生成模拟的群消息：关键词命中、IP 检查候选、引用消息和无关消息混合。
+    """
+    templates = [
+        "K54次列车上发现可疑情况 https://v.douyin.com/{token}/ 复制此链接，打开Dou音搜索，直接观看视频！",
+        "沈阳站附近 http://xhslink.com/a/{token} 小红薯{token}发布了一篇小红书笔记，快来看吧！",
+        "3.14 这里有人拍视频 https://www.xiaohongshu.com/discovery/item/{token}",
+        "看看【某用户{token}的作品】 https://v.douyin.com/{token}/",
+        "今天天气不错，大家注意安全",
+        "https://weibo.com/1234567/{token} 作者：博主{token}",
+    ]
+    events = []
+    for i in range(count):
+        token = f"{random.getrandbits(40):x}"
+        payload = {"event_type": 2000, "fromUserName": {"String": room or "10000@chatroom"}, "msgId": i}
+        if i % 7 == 0:
+            payload["content_xml"] = {"msg": {"appmsg": {
+                "title": random.choice(["G1212", "沈阳北", "收到"]),
+                "refermsg": {"content": random.choice(templates).format(token=token)},
+            }}}
+        else:
+            payload["real_content"] = random.choice(templates).format(token=token)
+        events.append((i / rate, json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+    return events
+
+
+# --------------------------------------------------------------------------------------
+# 回放
+# --------------------------------------------------------------------------------------
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(len(values) * pct / 100.0)) - 1))
+    return values[index]
+
+
+def reset_state():
+    """
+    清空去重缓存，保证不同倍速的回放互不影响。
+    """
+    from src.utils import deduplication
+    from src.wechat import msg_handler
+
+    deduplication.DEDUP_STORE.clear()
+    deduplication.NEAR_DUPLICATES.clear()
+    msg_handler.IP_VERDICTS.clear()
+    for flights in (msg_handler.SCREENSHOT_FLIGHTS, msg_handler.IP_CHECK_FLIGHTS, msg_handler.VIDEO_FLIGHTS):
+        flights.clear()
+
+
+async def run_once(app_module, events, speed: float, drain_timeout: float) -> dict:
+    import httpx
+
+    reset_state()
+    arrivals = {}
+    latencies = []
+    lane_latencies = {}
+    original_enqueue = app_module.enqueue_message
+    original_process = app_module.async_process_message
+
+    def tracked_enqueue(app, message):
+        arrivals[id(message)] = (time.monotonic(), app_module.classify_message(message))
+        return original_enqueue(app, message)
+
+    async def tracked_process(message, chat, dd_sender, **kwargs):
+        try:
+            await original_process(message=message, chat=chat, dd_sender=dd_sender, **kwargs)
+        finally:
+            arrived = arrivals.pop(id(message), None)
+            if arrived is not None:
+                latency = time.monotonic() - arrived[0]
+                latencies.append(latency)
+                lane_latencies.setdefault(arrived[1], []).append(latency)
+
+    app_module.enqueue_message = tracked_enqueue
+    app_module.async_process_message = tracked_process
+
+    depth_samples = []
+    statuses = {}
+    try:
+        async with app_module.lifespan(app_module.app):
+            work_queue = app_module.app.state.work_queue
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+
+                async def sampler():
+                    while True:
+                        depth_samples.append(work_queue.depth)
+                        await asyncio.sleep(0.1)
+
+                sampler_task = asyncio.create_task(sampler())
+                start = time.monotonic()
+
+                async def post(offset, body):
+                    delay = offset / speed - (time.monotonic() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    response = await client.post("/api/recvMsg", content=body)
+                    key = str(response.status_code)
+                    statuses[key] = statuses.get(key, 0) + 1
+
+                await asyncio.gather(*(post(offset, body) for offset, body in events))
+                send_elapsed = time.monotonic() - start
+                depth_after_send = work_queue.depth
+                try:
+                    await asyncio.wait_for(work_queue.join(), timeout=drain_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                total_elapsed = time.monotonic() - start
+                sampler_task.cancel()
+                queue_stats = work_queue.stats()
+    finally:
+        app_module.enqueue_message = original_enqueue
+        app_module.async_process_message = original_process
+
+    return {
+        "speed": speed,
+        "events": len(events),
+        "accepted": queue_stats["enqueued"],
+        "processed": len(latencies),
+        "dropped": queue_stats["dropped"],
+        "rejected": queue_stats["rejected"],
+        "http_status": statuses,
+        "offered_rate": len(events) / send_elapsed if send_elapsed else 0.0,
+        "throughput": len(latencies) / total_elapsed if total_elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max_depth": max(depth_samples) if depth_samples else 0,
+        "depth_after_send": depth_after_send,
+        "wait_p95_ms": queue_stats["wait_p95_ms"],
+        "lanes": {
+            lane: (len(values), percentile(values, 50), percentile(values, 95))
+            for lane, values in sorted(lane_latencies.items())
+        },
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"x{result['speed']:<6g} events={result['events']:<6d} accepted={result['accepted']:<6d} "
+        f"processed={result['processed']:<6d} dropped={result['dropped']:<5d} rejected={result['rejected']:<5d}"
+    )
+    print(
+        f"        offered={result['offered_rate']:.1f} msg/s  throughput={result['throughput']:.1f} msg/s  "
+        f"latency p50={result['p50'] * 1000:.0f}ms p95={result['p95'] * 1000:.0f}ms p99={result['p99'] * 1000:.0f}ms"
+    )
+    print(
+        f"        queue max_depth={result['max_depth']} depth_after_send={result['depth_after_send']} "
+        f"wait_p95={result['wait_p95_ms']:.0f}ms http={result['http_status']}"
+    )
+    for lane, (count, p50, p95) in result["lanes"].items():
+        print(f"        lane {lane:<7s} processed={count:<6d} latency p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms")
+
+
+async def main_async(args):
+    app_module = install_stubs(args)
+    if args.capture:
+        events = load_capture(args.capture)
+    else:
+        events = build_synthetic(args.synthetic, args.rate, args.room or "")
+    if not events:
+        print("没有可回放的事件")
+        return
+    if args.loop > 1:
+        span = events[-1][0] + (events[-1][0] / max(len(events) - 1, 1))
+        events = [(offset + span * i, body) for i in range(args.loop) for offset, body in events]
+
+    print(f"回放事件数: {len(events)}，原始时长: {events[-1][0]:.1f}s")
+    for speed in args.speeds:
+        result = await run_once(app_module, events, speed, args.drain_timeout)
+        print_report(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="vxhook 回调录制回放压测")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--capture", help="VXHOOK_CAPTURE_FILE 录制的 JSONL 文件")
+    source.add_argument("--synthetic", type=int, help="不使用录制文件，生成指定数量的模拟消息")
+    parser.add_argument("--rate", type=float, default=20.0, help="模拟消息的原始速率 (条/秒)")
+    parser.add_argument("--speeds", type=lambda v: [float(x) for x in v.split(",")], default=[1.0], help="回放倍速列表，如 1,5,20")
+    parser.add_argument("--loop", type=int, default=1, help="录制数据重复回放的次数")
+    parser.add_argument("--room", default=None, help="覆盖 WECHAT_LISTEN_ROOM_WXID，传空字符串表示不过滤群聊")
+    parser.add_argument("--max-age", type=float, default=0.0, help="覆盖 MESSAGE_MAX_AGE_SECONDS，默认 0 (不检查时效)")
+    parser.add_argument("--ip-latency", type=float, default=6.0, help="模拟 IP 检查 (浏览器访问) 耗时，秒")
+    parser.add_argument("--ip-match-ratio", type=float, default=0.2, help="IP 检查命中 IP 属地列表 (address.txt) 的比例")
+    parser.add_argument("--screenshot-latency", type=float, default=3.0, help="模拟截图耗时，秒")
+    parser.add_argument("--video-latency", type=float, default=1.0, help="模拟视频解析耗时，秒")
+    parser.add_argument("--send-latency", type=float, default=0.8, help="模拟钉钉发送耗时，秒")
+    parser.add_argument("--drain-timeout", type=float, default=300.0, help="回放结束后等待队列排空的最长时间，秒")
+    parser.add_argument("--log-level", default="ERROR", help="压测期间的日志级别")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()